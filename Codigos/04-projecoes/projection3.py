@@ -7,12 +7,15 @@
 
 
 import sys
+import math
 import ctypes
 import numpy as np
 import OpenGL.GL as gl
 import OpenGL.GLUT as glut
 sys.path.append('../lib/')
 import utils as ut
+import quaternion as qt
+import scenegraph as sg
 from ctypes import c_void_p
 
 
@@ -87,6 +90,32 @@ void main()
 } 
 """
 
+## Matrices of display, written in place every frame.
+frame_matrices = {name: ut.matIdentity() for name in ('view', 'projection')}
+
+## Scene: the pyramid, and the cube orbiting about the y axis through an
+# orbit node.
+scene = sg.SceneGraph()
+## Pyramid node.
+pyramid_node = scene.addNode(translation=(0.0, -0.0, -1.0), scale=(0.5, 0.5, 0.5))
+## Orbit node.
+orbit_node = scene.addNode(translation=(0.0, 0.0, -2.0))
+## Cube node, child of the orbit node.
+cube_node = scene.addNode(orbit_node, translation=(0.0, 0.0, -2.0), scale=(0.3, 0.3, 0.3))
+## Rotation written into by updateNodes.
+rotation = qt.quatIdentity()
+
+## Update nodes.
+#
+# Sets the rotations of the nodes from the angles.
+def updateNodes():
+    # Pyramid: x first, then y.
+    scene.setRotation(pyramid_node, qt.quatFromEuler(math.radians(px_angle), math.radians(py_angle), 0.0, 'xy', out=rotation))
+    scene.setRotation(orbit_node, qt.quatFromEuler(0.0, math.radians(cy_angle), 0.0, 'y', out=rotation))
+    # Cube: z first, then x.
+    scene.setRotation(cube_node, qt.quatFromEuler(math.radians(cx_angle), 0.0, math.radians(cz_angle), 'zx', out=rotation))
+
+
 ## Drawing function.
 #
 # Draws primitive.
@@ -97,38 +126,35 @@ def display():
     
     gl.glUseProgram(program)
 
+    # Matrices are written in place, and the model matrices come from the
+    # scene graph, which recomputes the nodes changed since the last frame.
+    m = frame_matrices
+    scene.update()
+    world = scene.worldMatrices()
+
     # Define view matrix.
-    view = ut.matTranslate(0.0, 0.0, -3.0)
+    view = ut.matTranslate(0.0, 0.0, -3.0, out=m['view'])
 
     # Retrieve location of view variable in shader.
     loc = gl.glGetUniformLocation(program, "view");
-    # Send matrix to shader.
-    gl.glUniformMatrix4fv(loc, 1, gl.GL_FALSE, view.transpose())
+    # Send matrix to shader (row-major, transposed by OpenGL).
+    ut.setUniformMatrix(loc, view)
     
     # Define projection matrix.
-    projection = ut.matPerspective(np.radians(60.0), win_width/win_height, 0.1, 100.0)
+    projection = ut.matPerspective(math.radians(60.0), win_width/win_height, 0.1, 100.0, out=m['projection'])
 
     # Retrieve location of projection variable in shader.
     loc = gl.glGetUniformLocation(program, "projection");
     # Send matrix to shader.
-    gl.glUniformMatrix4fv(loc, 1, gl.GL_FALSE, projection.transpose())
+    ut.setUniformMatrix(loc, projection)
 
     # Pyramid.
     gl.glBindVertexArray(VAO2)
 
-    # Define model matrix.
-    S = ut.matScale(0.5, 0.5, 0.5)
-    Rx = ut.matRotateX(np.radians(px_angle))
-    Ry = ut.matRotateY(np.radians(py_angle))
-    T  = ut.matTranslate(0.0, -0.0, -1.0)
-    model = np.matmul(Rx,S)
-    model = np.matmul(Ry,model)
-    model = np.matmul(T,model)
-
     # Retrieve location of model variable in shader.
     loc = gl.glGetUniformLocation(program, "model");
     # Send matrix to shader.
-    gl.glUniformMatrix4fv(loc, 1, gl.GL_FALSE, model.transpose())
+    ut.setUniformMatrix(loc, world[pyramid_node])
 
     gl.glDrawArrays(gl.GL_TRIANGLES, 0, 12)
 
@@ -136,22 +162,10 @@ def display():
     # Cube.
     gl.glBindVertexArray(VAO1)
 
-    # Define model matrix.
-    S = ut.matScale(0.3, 0.3, 0.3)
-    Rx = ut.matRotateX(np.radians(cx_angle))
-    Ry = ut.matRotateY(np.radians(cy_angle))
-    Rz = ut.matRotateZ(np.radians(cz_angle))
-    T  = ut.matTranslate(0.0, 0.0, -2.0)
-    model = np.matmul(Rz,S)
-    model = np.matmul(Rx,model)
-    model = np.matmul(T,model)
-    model = np.matmul(Ry,model)
-    model = np.matmul(T,model)
-
     # Retrieve location of model variable in shader.
     loc = gl.glGetUniformLocation(program, "model");
     # Send matrix to shader.
-    gl.glUniformMatrix4fv(loc, 1, gl.GL_FALSE, model.transpose())
+    ut.setUniformMatrix(loc, world[cube_node])
 
     gl.glDrawArrays(gl.GL_TRIANGLES, 0, 36)
 
@@ -207,6 +221,8 @@ def idle():
     cy_angle = cy_angle+cy_inc if (cy_angle+cy_inc) < 360.0 else (360.0-cy_angle+cy_inc)
     cz_angle = cz_angle+cz_inc if (cz_angle+cz_inc) < 360.0 else (360.0-cz_angle+cz_inc)
 
+    updateNodes()
+
     glut.glutPostRedisplay()
 
 
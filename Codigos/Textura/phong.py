@@ -7,33 +7,67 @@
 
 
 import sys
+import math
 import ctypes
+import time
 import numpy as np
 import OpenGL.GL as gl
 import OpenGL.GLUT as glut
-from PIL import Image
 sys.path.append('../lib/')
 import utils as ut
+import texcache as tc
+import bcn
+import atlas as at
+import streamtex as st
+import quaternion as qt
 from ctypes import c_void_p
 
 
-try:
-    PATH_TEXTURE = sys.argv[1]
-except:
-    PATH_TEXTURE = None
-
-texture = None
-
-angle_x = 0.0
+## Texture files, one cube is drawn with each.
+PATH_TEXTURES = sys.argv[1:]
+
+## Textures used by the draws.
+textures = []
+## Draws: texture, first vertex and number of vertices.
+draws = []
+## Pack the textures in an atlas, so cubes sharing a page are one draw.
+use_atlas = True
+## Border around each texture in the atlas, in texels.
+atlas_padding = 4
+## Block compression of the texture ('bc1', 'bc3'), None uploads it uncompressed.
+# Only used when the driver has GL_EXT_texture_compression_s3tc.
+texture_compression = 'bc1'
+## Live feed on the cubes instead of the textures: 'pbo' streams it through a
+# ring of pixel buffers, 'sync' uploads it from client memory, None disables it.
+live_feed = None
+## Size of the live feed frames.
+live_size = (1024, 1024)
+## Streaming texture of the live feed.
+stream = None
+## Frames of the live feed, played in a loop.
+live_frames = []
+## Time of each display call, for the frame intervals of the live feed.
+frame_times = []
+
+## Rotation per frame about each axis, in degrees.
 angle_x_inc = 0.02
-angle_y = 0
 angle_y_inc = -0.04
-angle_z = 0.0
 angle_z_inc = 0.06
+## Orientation of the cubes, turned by rotation_step every frame.
+orientation = qt.quatIdentity()
+## Rotation of one frame (y, then x, then z, as Rz*Rx*Ry).
+rotation_step = qt.quatFromEuler(np.radians(angle_x_inc), np.radians(angle_y_inc), np.radians(angle_z_inc), 'yxz')
 
 t_z = -5
 t_z_inc = 0.001
 
+## Frames drawn and their time in seconds (only with frame_timing).
+frame_stats = [0, 0.0]
+## Time frames and uploads (see utils.frameTiming).
+frame_timing = ut.frameTiming()
+## Draw calls and texture binds of the last frame.
+frame_calls = [0, 0]
+
 ## Window width.
 win_width  = 600
 ## Window height.
@@ -56,6 +90,7 @@ layout (location = 2) in vec2 texture;
 uniform mat4 model;
 uniform mat4 view;
 uniform mat4 projection;
+uniform mat3 normalMatrix;
 
 out vec3 vNormal;
 out vec3 fragPosition;
@@ -64,7 +99,7 @@ out vec2 aTexture;
 void main()
 {
     gl_Position = projection * view * model * vec4(position, 1.0);
-    vNormal = mat3(transpose(inverse(model))) * normal;
+    vNormal = normalMatrix * normal;
     // vNormal = normal;
     fragPosition = vec3(model * vec4(position, 1.0));
     aTexture = texture;
@@ -116,25 +151,98 @@ void main()
 """
 
 
-def read_texture():
-    global texture
-
-    img = Image.open(PATH_TEXTURE)
-    img_data = np.array(list(img.getdata()), np.int8)
+## Read texture.
+#
+# @param path Image file.
+# @return Texture name.
+def read_texture(path):
+    global texture_compression
+
+    # Decoded (and compressed) levels come from the texture cache after the first run.
+    start = time.perf_counter()
+    compression = texture_compression if texture_compression and bcn.supported() else None
+    # What is actually used, for the statistics.
+    texture_compression = compression
+    if compression:
+        levels, sizes, cached = tc.loadCompressedTexture(path, compression)
+    else:
+        levels, cached = tc.loadTexture(path)
+        sizes = [(level.shape[1], level.shape[0]) for level in levels]
+    loaded = time.perf_counter()
     texture = gl.glGenTextures(1)
     gl.glBindTexture(gl.GL_TEXTURE_2D, texture)
 
-    gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
     gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_BORDER)
     gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_BORDER)
     gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
     gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR_MIPMAP_LINEAR)
     # gl.glTexEnvf(gl.GL_TEXTURE_ENV, gl.GL_TEXTURE_ENV_MODE, gl.GL_DECAL)
 
-    format = gl.GL_RGB if img.mode == "RGB" else gl.GL_RGBA   # if the texture is jpg or png
-    gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_RGB, img.size[0], img.size[1], 0,
-                    format, gl.GL_UNSIGNED_BYTE, img_data)
-    gl.glGenerateMipmap(gl.GL_TEXTURE_2D)
+    gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAX_LEVEL, len(levels) - 1)
+    if compression:
+        bcn.compressedTexImageLevels(gl.GL_TEXTURE_2D, levels, sizes, compression)
+    else:
+        tc.texImageLevels(gl.GL_TEXTURE_2D, levels)
+    if frame_timing:
+        gl.glFinish()
+    print("texture: %s start, %d levels, loaded in %.3f s, %s in %.3f s"
+          % ("warm" if cached else "cold", len(levels), loaded - start,
+             "uploaded" if frame_timing else "submitted", time.perf_counter() - loaded))
+    print("texture memory: %s, %d bytes (%d as RGB)" % (compression or "uncompressed",
+          sum(level.nbytes for level in levels), sum(3*width*height for width, height in sizes)))
+    return texture
+
+## Read atlas.
+#
+# Packs the images in atlas pages (uncompressed, with the mip levels the
+# padding keeps apart).
+#
+# @param paths Image files.
+# @return Texture name of each page and the atlas rectangle of each image.
+def read_atlas(paths):
+    global texture_compression
+    texture_compression = None
+    images = [tc.loadTexture(path, mipmaps=False)[0][0] for path in paths]
+    atlas = at.buildAtlas(images, padding=atlas_padding)
+    pages = []
+    for page in atlas.pages:
+        levels = tc.mipChain(page)[:atlas.mipLevels()]
+        texture = gl.glGenTextures(1)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, texture)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_EDGE)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_EDGE)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR_MIPMAP_LINEAR)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAX_LEVEL, len(levels) - 1)
+        tc.texImageLevels(gl.GL_TEXTURE_2D, levels)
+        pages.append(texture)
+    print("atlas: %d textures in %d pages %s" % (len(paths), len(pages),
+          ["%dx%d" % (page.shape[1], page.shape[0]) for page in atlas.pages]))
+    return pages, atlas.rects
+
+
+## Live feed frames.
+#
+# Stands in for a camera or video: a pattern scrolling diagonally.
+#
+# @param width, height Size of the frames.
+# @param count Number of frames.
+# @return List of frames (height, width, 3), uint8.
+def feedFrames(width, height, count=16):
+    y, x = np.mgrid[0:height, 0:width]
+    frames = []
+    for k in range(count):
+        shift = k*width//count
+        r = ((x + shift) % width)*255//max(1, width - 1)
+        g = ((y + shift) % height)*255//max(1, height - 1)
+        b = (((x + y + 2*shift)//32) % 2)*255
+        frames.append(np.stack([r, g, b], axis=2).astype(np.uint8))
+    return frames
+
+
+## Matrices of display, written in place every frame.
+frame_matrices = {name: ut.matIdentity() for name in ('model', 'view', 'projection')}
+frame_matrices['normal'] = np.zeros((3,3), dtype='float32')
 
 
 ## Drawing function.
@@ -142,29 +250,34 @@ def read_texture():
 # Draws primitive.
 def display():
 
+    start = time.perf_counter()
+    if stream is not None:
+        frame_times.append(start)
+        stream.update(live_frames[stream.frames % len(live_frames)])
     gl.glClearColor(0.2, 0.3, 0.3, 1.0)
     gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
     
-    gl.glBindTexture(gl.GL_TEXTURE_2D, texture)
-    
     gl.glUseProgram(program)
     gl.glBindVertexArray(VAO)
 
-    Rx = ut.matRotateX(np.radians(angle_x))
-    Ry = ut.matRotateY(np.radians(angle_y))
-    Rz = ut.matRotateZ(np.radians(angle_z))
-    model=np.matmul(Rx,Ry)
-    model=np.matmul(Rz,model)
+    # Matrices are written in place, sent row-major (transposed by OpenGL).
+    m = frame_matrices
+    model = qt.quatToMatrix(orientation, out=m['model'])
     loc = gl.glGetUniformLocation(program, "model");
-    gl.glUniformMatrix4fv(loc, 1, gl.GL_FALSE, model.transpose())
+    ut.setUniformMatrix(loc, model)
+
+    # Normal matrix, once per draw instead of inverse(model) per vertex.
+    normal = ut.matNormal(model, out=m['normal'])
+    loc = gl.glGetUniformLocation(program, "normalMatrix");
+    ut.setUniformMatrix(loc, normal)
 
-    view = ut.matTranslate(0.0, 0.0, t_z)
+    view = ut.matTranslate(0.0, 0.0, t_z, out=m['view'])
     loc = gl.glGetUniformLocation(program, "view");
-    gl.glUniformMatrix4fv(loc, 1, gl.GL_FALSE, view.transpose())
+    ut.setUniformMatrix(loc, view)
     
-    projection = ut.matPerspective(np.radians(45.0), win_width/win_height, 0.1, 100.0)
+    projection = ut.matPerspective(math.radians(45.0), win_width/win_height, 0.1, 100.0, out=m['projection'])
     loc = gl.glGetUniformLocation(program, "projection");
-    gl.glUniformMatrix4fv(loc, 1, gl.GL_FALSE, projection.transpose())
+    ut.setUniformMatrix(loc, projection)
 
     # Object color.
     loc = gl.glGetUniformLocation(program, "objectColor")
@@ -179,10 +292,42 @@ def display():
     loc = gl.glGetUniformLocation(program, "cameraPosition")
     gl.glUniform3f(loc, 0.0, 0.0, 0.0)
 
-    gl.glDrawArrays(gl.GL_TRIANGLES, 0, 12*3)
+    # One bind per change of texture, one draw per range.
+    bound = None
+    frame_calls[:] = [0, 0]
+    for texture, first, count in draws:
+        if texture != bound:
+            gl.glBindTexture(gl.GL_TEXTURE_2D, texture)
+            bound = texture
+            frame_calls[1] += 1
+        gl.glDrawArrays(gl.GL_TRIANGLES, first, count)
+        frame_calls[0] += 1
 
     glut.glutSwapBuffers()
 
+    # Frame time includes the GPU work. The live feed is left pipelined, as
+    # that is what the pixel buffers are for; its jitter is measured instead.
+    frame_stats[0] += 1
+    if frame_timing and stream is None:
+        gl.glFinish()
+        frame_stats[1] += time.perf_counter() - start
+
+## Print frame statistics.
+def printFrameStats():
+    if frame_stats[0] > 0:
+        print("%s texture: %d frames" % (texture_compression or "uncompressed", frame_stats[0])
+              + (", %.2f ms per frame" % (1000*frame_stats[1]/frame_stats[0])
+                 if frame_timing and stream is None else ""))
+        print("%s: %d draw calls and %d texture binds per frame" % ("atlas" if use_atlas else "no atlas",
+              frame_calls[0], frame_calls[1]))
+    if stream is not None and len(frame_times) > 2:
+        intervals = 1000*np.diff(frame_times)
+        print("live feed (%s, %dx%d): %d frames, %.1f MB/s uploaded, %.2f ms waiting on fences"
+              % (live_feed, stream.width, stream.height, stream.frames, stream.throughput(),
+                 1000*stream.wait_seconds))
+        print("frame interval: %.2f ms mean, %.2f ms std, %.2f ms p99"
+              % (intervals.mean(), intervals.std(), np.percentile(intervals, 99)))
+
 
 ## Reshape function.
 # 
@@ -199,11 +344,11 @@ def reshape(width,height):
 
 
 def idle():
-    global angle_x, angle_y, angle_z, t_z, t_z_inc
+    global t_z, t_z_inc
 
-    angle_x = angle_x+angle_x_inc if (angle_x+angle_x_inc) < 360.0 else (360.0-angle_x+angle_x_inc)
-    angle_y = angle_y+angle_y_inc if (angle_y+angle_y_inc) < 360.0 else (360.0-angle_y+angle_y_inc)
-    angle_z = angle_z+angle_z_inc if (angle_z+angle_z_inc) < 360.0 else (360.0-angle_z+angle_z_inc)
+    # The orientation accumulates the step in place, renormalized against drift.
+    qt.quatMultiply(rotation_step, orientation, out=orientation)
+    qt.quatNormalize(orientation, out=orientation)
 
     t_z = t_z+t_z_inc
     if t_z > -3 or t_z < -5:
@@ -225,6 +370,7 @@ def keyboard(key, x, y):
     global mode
 
     if key == b'\x1b'or key == b'q':
+        printFrameStats()
         glut.glutLeaveMainLoop()
 
     glut.glutPostRedisplay()
@@ -236,7 +382,7 @@ def keyboard(key, x, y):
 def initData():
 
     # Uses vertex arrays.
-    global VAO, VBO
+    global VAO, VBO, textures, draws, stream, live_frames, texture_compression
 
     # Set triangle vertices.
     vertices = np.array([ 
@@ -279,6 +425,44 @@ def initData():
          0.5, -0.5,  0.5,   0.0, -1.0,  0.0,   0.5,  0.9
     ], dtype='float32') 
 
+    # One cube per texture, side by side, scaled to fit.
+    n = max(1, len(PATH_TEXTURES))
+    cube = vertices.reshape(-1, 8)
+    scale = 2.0/(n + 1)
+    cubes = []
+    for k in range(n):
+        part = cube.copy()
+        part[:, :3] *= scale
+        part[:, 0] += (k - (n - 1)/2)*1.5*scale
+        cubes.append(part)
+
+    # Live feed, textures, or atlas pages with the coordinates moved to each rectangle.
+    if live_feed:
+        live_frames = feedFrames(*live_size)
+        stream = st.StreamingTexture(live_size[0], live_size[1], 3, 3 if live_feed == 'pbo' else 0)
+        textures = [stream.texture]
+        texture_compression = None
+        page_of = [0]*n
+    elif use_atlas and n > 1:
+        textures, rects = read_atlas(PATH_TEXTURES)
+        for part, rect in zip(cubes, rects):
+            part[:, 6:8] = at.remapUVs(part[:, 6:8], rect)
+        page_of = [rect[0] for rect in rects]
+    else:
+        textures = [read_texture(path) for path in PATH_TEXTURES] or [0]
+        page_of = list(range(n))
+
+    # Cubes grouped by texture: consecutive cubes with the same one are one draw.
+    order = sorted(range(n), key=lambda k: page_of[k])
+    vertices = np.concatenate([cubes[k] for k in order]).ravel()
+    draws = []
+    for i, k in enumerate(order):
+        texture = textures[page_of[k]]
+        if draws and draws[-1][0] == texture:
+            draws[-1] = (texture, draws[-1][1], draws[-1][2] + len(cube))
+        else:
+            draws.append((texture, i*len(cube), len(cube)))
+
     # Vertex array.
     VAO = gl.glGenVertexArrays(1)
     gl.glBindVertexArray(VAO)
@@ -302,8 +486,6 @@ def initData():
 
     gl.glEnable(gl.GL_DEPTH_TEST)
 
-    read_texture()
-
     # gl.glEnable(gl.GL_TEXTURE_2D)
     # gl.glEnable(gl.GL_TEXTURE_GEN_S)
     # gl.glEnable(gl.GL_TEXTURE_GEN_T)
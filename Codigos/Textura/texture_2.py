@@ -4,22 +4,30 @@
 ##########################################################
 
 import sys
+import math
 import ctypes
 import numpy as np
 import OpenGL.GL as gl
 import OpenGL.GLUT as glut
 sys.path.append('../lib/')
 import utils as ut
-from PIL import Image
+import texcache as tc
+import bcn
 from ctypes import c_void_p
 import pywavefront
 import random
+import time
+import vertexpack as vp
+import quaternion as qt
 
 
 USE_COLORS = True
 
 texture_file = None
 texture = None
+## Block compression of the texture ('bc1', 'bc3'), None uploads it uncompressed.
+# Only used when the driver has GL_EXT_texture_compression_s3tc.
+texture_compression = 'bc1'
 
 ## Window setup
 win_width  = 800
@@ -51,12 +59,28 @@ angle_x = 0.0
 angle_y = 0.0
 angle_z = 0.0
 angle_inc = 1.0
+## Rotation of the angles above, rebuilt when they change.
+orientation = qt.quatIdentity()
 
 ## Modes
 transformacao = 0 #ROTACAO, TRANSLACAO, ESCALA
 visualizacao = "FACES" #FACES, WIREFRAME
 visualizacao_textura = 0.0 #(False) Iluminacao, (true) Iluminacao+Textura
 
+## Vertex format: 'float' (32-bit floats), vp.OCTAHEDRAL or vp.SNORM_1010102
+# (16-bit positions in the bounding box, packed normals and half float texture
+# coordinates, decoded in the shader).
+vertex_format = 'float'
+## Box the packed positions are quantized against.
+position_box = None
+## Bytes per vertex in the vertex buffer.
+vertex_bytes = 0
+## Number of vertices drawn.
+vertex_count = 0
+## Frames drawn and their time in seconds (only with frame_timing).
+frame_stats = [0, 0.0]
+## Time frames and uploads (see utils.frameTiming).
+frame_timing = ut.frameTiming()
 
 vertices = np.array([], dtype='float32')
 
@@ -64,12 +88,17 @@ vertices = np.array([], dtype='float32')
 vertex_code = """
 #version 330 core
 layout (location = 0) in vec3 position;
+#ifdef PACKED_OCTAHEDRAL
+layout (location = 1) in vec2 packedNormal;
+#else
 layout (location = 1) in vec3 normal;
+#endif
 layout (location = 2) in vec2 texture;
 
 uniform mat4 model;
 uniform mat4 view;
 uniform mat4 projection;
+uniform mat3 normalMatrix;
 
 out vec3 vNormal;
 out vec3 fragPosition;
@@ -77,9 +106,19 @@ out vec2 aTexture;
 
 void main()
 {
-    gl_Position = projection * view * model * vec4(position, 1.0);
-    vNormal = mat3(transpose(inverse(model))) * normal;
-    fragPosition = vec3(model * vec4(position, 1.0));
+#ifdef PACKED
+    vec3 p = decodePosition(position);
+#else
+    vec3 p = position;
+#endif
+#ifdef PACKED_OCTAHEDRAL
+    vec3 n = octDecode(packedNormal);
+#else
+    vec3 n = normal;
+#endif
+    gl_Position = projection * view * model * vec4(p, 1.0);
+    vNormal = normalMatrix * n;
+    fragPosition = vec3(model * vec4(p, 1.0));
     aTexture = texture;
 }
 """
@@ -131,29 +170,57 @@ void main()
 """
 
 def read_texture():
-    global texture
-
-    img = Image.open(texture_file)
-    img_data = np.array(list(img.getdata()), np.int8)
+    global texture, texture_compression
+
+    # Decoded (and compressed) levels come from the texture cache after the first run.
+    start = time.perf_counter()
+    compression = texture_compression if texture_compression and bcn.supported() else None
+    # What is actually used, for the statistics.
+    texture_compression = compression
+    if compression:
+        levels, sizes, cached = tc.loadCompressedTexture(texture_file, compression)
+    else:
+        levels, cached = tc.loadTexture(texture_file)
+        sizes = [(level.shape[1], level.shape[0]) for level in levels]
+    loaded = time.perf_counter()
     texture = gl.glGenTextures(1)
     gl.glBindTexture(gl.GL_TEXTURE_2D, texture)
 
-    gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
     gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_BORDER)
     gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_BORDER)
     gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
     gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR_MIPMAP_LINEAR)
     # gl.glTexEnvf(gl.GL_TEXTURE_ENV, gl.GL_TEXTURE_ENV_MODE, gl.GL_DECAL)
 
-    format = gl.GL_RGB if img.mode == "RGB" else gl.GL_RGBA   # if the texture is jpg or png
-    gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_RGB, img.size[0], img.size[1], 0,
-                    format, gl.GL_UNSIGNED_BYTE, img_data)
-    gl.glGenerateMipmap(gl.GL_TEXTURE_2D)
+    gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAX_LEVEL, len(levels) - 1)
+    if compression:
+        bcn.compressedTexImageLevels(gl.GL_TEXTURE_2D, levels, sizes, compression)
+    else:
+        tc.texImageLevels(gl.GL_TEXTURE_2D, levels)
+    if frame_timing:
+        gl.glFinish()
+    print("texture: %s start, %d levels, loaded in %.3f s, %s in %.3f s"
+          % ("warm" if cached else "cold", len(levels), loaded - start,
+             "uploaded" if frame_timing else "submitted", time.perf_counter() - loaded))
+    print("texture memory: %s, %d bytes (%d as RGB)" % (compression or "uncompressed",
+          sum(level.nbytes for level in levels), sum(3*width*height for width, height in sizes)))
+
+## Matrices of display, written in place every frame.
+frame_matrices = {name: ut.matIdentity() for name in ('T', 'R', 'S', 'M', 'tmp', 'view', 'projection')}
+frame_matrices['normal'] = np.zeros((3,3), dtype='float32')
+
+## Update orientation.
+#
+# Rebuilds the rotation quaternion from the angles (x applied first, then y
+# and z), in place.
+def updateOrientation():
+    qt.quatFromEuler(math.radians(angle_x), math.radians(angle_y), math.radians(angle_z), 'xyz', out=orientation)
 
 ## Display function
 def display():
 
     global vertices
+    start = time.perf_counter()
     gl.glClearColor(0.2, 0.3, 0.3, 1.0)
     gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
 
@@ -162,32 +229,36 @@ def display():
     gl.glUseProgram(program)
     gl.glBindVertexArray(VAO)
 
+    # Matrices are written in place and products alternate between two
+    # buffers, so a frame allocates no arrays.
+    m = frame_matrices
     # Translation. 
-    T  = ut.matTranslate(translation_x, translation_y, translation_z)
-    # Rotation around z-axis.
-    Rx = ut.matRotateX(np.radians(angle_x)) 
-    Ry = ut.matRotateY(np.radians(angle_y)) 
-    Rz = ut.matRotateZ(np.radians(angle_z)) 
+    T  = ut.matTranslate(translation_x, translation_y, translation_z, out=m['T'])
+    # Rotation, in one step from the quaternion.
+    R  = qt.quatToMatrix(orientation, out=m['R'])
     # Scale.
-    S  = ut.matScale(scale_x, scale_y, scale_z)
+    S  = ut.matScale(scale_x, scale_y, scale_z, out=m['S'])
     
-    M = np.matmul(Ry,Rx)
-    M = np.matmul(Rz,M)
-    M = np.matmul(S, M)
-    M = np.matmul(T,M)
+    M = np.matmul(S, R, out=m['M'])
+    M = np.matmul(T, M, out=m['tmp'])
     
     # Retrieve locatiovisualizacao_texturan of tranform variable in shader.
     loc = gl.glGetUniformLocation(program, "model")
-    # Send matrix to shader.
-    gl.glUniformMatrix4fv(loc, 1, gl.GL_FALSE, M.transpose())
+    # Send matrix to shader (row-major, transposed by OpenGL).
+    ut.setUniformMatrix(loc, M)
+    
+    # Normal matrix, once per draw instead of inverse(model) per vertex.
+    N = ut.matNormal(M, out=m['normal'])
+    loc = gl.glGetUniformLocation(program, "normalMatrix")
+    ut.setUniformMatrix(loc, N)
     
-    view = ut.matTranslate(0.0, 0.0, t_z)
+    view = ut.matTranslate(0.0, 0.0, t_z, out=m['view'])
     loc = gl.glGetUniformLocation(program, "view")
-    gl.glUniformMatrix4fv(loc, 1, gl.GL_FALSE, view.transpose())
+    ut.setUniformMatrix(loc, view)
     
-    projection = ut.matPerspective(np.radians(45.0), win_width/win_height, 0.1, 100.0)
+    projection = ut.matPerspective(math.radians(45.0), win_width/win_height, 0.1, 100.0, out=m['projection'])
     loc = gl.glGetUniformLocation(program, "projection")
-    gl.glUniformMatrix4fv(loc, 1, gl.GL_FALSE, projection.transpose())
+    ut.setUniformMatrix(loc, projection)
 
     # Object color.
     loc = gl.glGetUniformLocation(program, "objectColor")
@@ -210,9 +281,22 @@ def display():
     #elif (visualizacao == "WIREFRAME"):
         #gl.glPolygonMode(gl.GL_FRONT_AND_BACK, gl.GL_LINE)
         
-    gl.glDrawArrays(gl.GL_TRIANGLES, 0, len(vertices))
+    gl.glDrawArrays(gl.GL_TRIANGLES, 0, vertex_count)
     glut.glutSwapBuffers()
 
+    frame_stats[0] += 1
+    if frame_timing:
+        # Frame time includes the GPU work.
+        gl.glFinish()
+        frame_stats[1] += time.perf_counter() - start
+
+def printFrameStats():
+    print("Vertex format: %s, %d bytes per vertex, %s texture" % (vertex_format, vertex_bytes,
+          texture_compression or "uncompressed"))
+    if frame_stats[0] > 0:
+        print("%d frames" % frame_stats[0]
+              + (", %.2f ms per frame" % (1000*frame_stats[1]/frame_stats[0]) if frame_timing else ""))
+
 ## Reshape function.
 def reshape(width,height):
 
@@ -228,6 +312,7 @@ def printInformation():
         print("Iluminacao selecionada: Textura")
     else:
         print("Iluminacao selecionada: Cor")
+    printFrameStats()
 
     if(transformacao == "TRANSLACAO"):
         print("translacao x: ", translation_x)
@@ -314,6 +399,7 @@ def keyboard(key, x, y):
     global type_primitive, transformacao, visualizacao
     
     if key == b'\x1b' or key == b'q':
+        printFrameStats()
         glut.glutLeaveMainLoop()
     
     print("key:", key)
@@ -334,6 +420,7 @@ def keyboard(key, x, y):
         
     if(hasTransformation):
         aplyTransfromation(key)
+        updateOrientation()
     
     printInformation()
     glut.glutPostRedisplay()
@@ -401,10 +488,20 @@ def loadObject(object_file, texture_file):
 def initData(object_file, texture_file):
 
     # Uses vertex arrays.
-    global VAO, VBO, vertices
+    global VAO, VBO, vertices, vertex_count, vertex_bytes, position_box
 
     # Set vertices.
-    vertices = loadObject(object_file, texture_file) 
+    vertices = loadObject(object_file, texture_file).reshape(-1, 8)
+    vertex_count = len(vertices)
+
+    # Packed vertices, against the bounding box of the normalized positions.
+    layout = None
+    if vertex_format != 'float':
+        position_box = (vertices[:, :3].min(axis=0), vertices[:, :3].max(axis=0))
+        vertices, layout = vp.packVertices(vertices[:, :3], vertices[:, 3:6], *position_box,
+                                           texcoords=vertices[:, 6:8], normal_format=vertex_format)
+    vertex_bytes = vertices.itemsize*vertices.shape[1]
+    print("Vertex format: %s, %d bytes per vertex, %d bytes" % (vertex_format, vertex_bytes, vertices.nbytes))
     
     # Vertex array.
     VAO = gl.glGenVertexArrays(1)
@@ -416,13 +513,16 @@ def initData(object_file, texture_file):
     gl.glBufferData(gl.GL_ARRAY_BUFFER, vertices.nbytes, vertices, gl.GL_STATIC_DRAW)
     
     # Set attributes.
-    gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, gl.GL_FALSE, 8*vertices.itemsize, None)
-    gl.glEnableVertexAttribArray(0)
-    gl.glVertexAttribPointer(1, 3, gl.GL_FLOAT, gl.GL_FALSE, 8*vertices.itemsize, c_void_p(3*vertices.itemsize))
-    gl.glEnableVertexAttribArray(1)
-    # texture coord attribute
-    gl.glVertexAttribPointer(2, 2, gl.GL_FLOAT, gl.GL_FALSE, 8*vertices.itemsize, c_void_p(6*vertices.itemsize))
-    gl.glEnableVertexAttribArray(2)
+    if layout is not None:
+        vp.setAttributes(layout, vertex_bytes)
+    else:
+        gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, gl.GL_FALSE, 8*vertices.itemsize, None)
+        gl.glEnableVertexAttribArray(0)
+        gl.glVertexAttribPointer(1, 3, gl.GL_FLOAT, gl.GL_FALSE, 8*vertices.itemsize, c_void_p(3*vertices.itemsize))
+        gl.glEnableVertexAttribArray(1)
+        # texture coord attribute
+        gl.glVertexAttribPointer(2, 2, gl.GL_FLOAT, gl.GL_FALSE, 8*vertices.itemsize, c_void_p(6*vertices.itemsize))
+        gl.glEnableVertexAttribArray(2)
          
     
     # Unbind Vertex Array Object.
@@ -435,11 +535,19 @@ def initData(object_file, texture_file):
 ## Create program (shaders).
 def initShaders():
     global program
-    program = ut.createShaderProgram(vertex_code, fragment_code)
+    code = vertex_code
+    if vertex_format == vp.OCTAHEDRAL:
+        code = vp.shaderDefines(vertex_code, ['PACKED', 'PACKED_OCTAHEDRAL'])
+    elif vertex_format == vp.SNORM_1010102:
+        code = vp.shaderDefines(vertex_code, ['PACKED'])
+    program = ut.createShaderProgram(code, fragment_code)
+    if position_box is not None:
+        gl.glUseProgram(program)
+        vp.setPositionBox(program, *position_box)
 
 ## Main function.
 def main():
-    global texture_file
+    global texture_file, vertex_format
 
     glut.glutInit()
     glut.glutInitContextVersion(3, 3)
@@ -454,6 +562,10 @@ def main():
     
     texture_file = sys.argv[2]
     print("texture_file: ", texture_file)
+
+    # Optional vertex format: float, oct16 or 1010102.
+    if len(sys.argv) > 3:
+        vertex_format = sys.argv[3]
     
     initData(object_file, texture_file)
     
@@ -0,0 +1,62 @@
+## @file bench_atlas.py
+# Texture atlas packing.
+#
+# Packs the textures of Codigos/Textura and sets of random sized textures
+# with atlas.buildAtlas, and prints the pages, how much of them the textures
+# fill and the packing time, with the draw calls and texture binds per frame
+# of one object per texture with and without the atlas (phong.py prints the
+# same counts for its cubes). Checks that gray, RGB and RGBA images pack
+# together and that texture coordinates outside [0,1] are rejected.
+#
+# Usage: python bench_atlas.py [<page size>]
+
+import sys
+import time
+import numpy as np
+sys.path.append('../lib/')
+import textures as tex
+import atlas as at
+
+def run(name, images, page_size):
+    start = time.perf_counter()
+    atlas = at.buildAtlas(images, page_size=page_size)
+    seconds = time.perf_counter() - start
+    filled = sum(image.shape[0]*image.shape[1] for image in images)
+    area = sum(page.shape[0]*page.shape[1] for page in atlas.pages)
+    print("%s: %d textures in %d pages, %.0f%% filled, %d mip levels, packed in %.3f s"
+          % (name, len(images), len(atlas.pages), 100.0*filled/area, atlas.mipLevels(), seconds))
+    print("  draw calls and binds per frame: %d and %d without atlas, %d and %d with it"
+          % (len(images), len(images), len(atlas.pages), len(atlas.pages)))
+
+def main():
+    page_size = int(sys.argv[1]) if len(sys.argv) > 1 else 2048
+    run("marrom + verde", [tex.readImage('../Textura/marrom.jpeg'), tex.readImage('../Textura/verde.jpeg')], page_size)
+
+    # Mixed channels go to RGBA pages, each image found back in its rectangle.
+    images = [np.full((32, 16, 3), 200, dtype=np.uint8), np.full((16, 16, 4), 100, dtype=np.uint8),
+              np.full((8, 24), 50, dtype=np.uint8)]
+    atlas = at.buildAtlas(images, page_size=page_size)
+    found = []
+    for image, (p, u0, v0, u1, v1) in zip(images, atlas.rects):
+        page = atlas.pages[p]
+        h, w = page.shape[:2]
+        found.append(page[round(v0*h):round(v1*h), round(u0*w):round(u1*w)])
+    same = all(np.array_equal(part[:, :, 0], image[:, :, 0] if image.ndim == 3 else image)
+               for part, image in zip(found, images))
+    alpha = [int(part[0, 0, 3]) for part in found]
+    try:
+        at.remapUVs([[0.5, 0.5], [1.5, 0.25]], atlas.rects[0])
+        rejected = False
+    except ValueError:
+        rejected = True
+    print("gray + RGB + RGBA: pages of %d channels, pixels kept %s, alpha %s, UVs outside [0,1] rejected %s"
+          % (atlas.pages[0].shape[2], same, alpha, rejected))
+
+    rng = np.random.default_rng(0)
+    for count in (16, 64, 256):
+        sizes = 2**rng.integers(4, 9, (count, 2))
+        images = [np.zeros((h, w, 3), dtype=np.uint8) for w, h in sizes]
+        run("%d textures of 16 to 256 px" % count, images, page_size)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+## @file bench_bcn.py
+# BC1/BC3 encoder of bcn.py.
+#
+# For each image (by default the textures of Codigos/Textura and a random
+# 2048x2048 JPEG), prints the memory of the whole mip chain uncompressed
+# (as RGB and RGBA, which drivers often pad RGB to) and block-compressed, the
+# encode time with 1 and with all CPUs, and the PSNR of the decoded first
+# level. Frame times with and without compression are printed by phong.py and
+# texture_2.py (texture_compression).
+#
+# Usage: python bench_bcn.py [<image> ...]
+
+import sys
+import os
+import time
+import tempfile
+import numpy as np
+from PIL import Image
+sys.path.append('../lib/')
+import textures as tex
+import texcache as tc
+import bcn
+
+## PSNR of the RGB channels, in dB.
+def psnr(a, b):
+    mse = ((a[:, :, :3].astype(np.float64) - b[:, :, :3])**2).mean()
+    return float('inf') if mse == 0 else 10*np.log10(255.0**2/mse)
+
+def main():
+    tmp = None
+    images = sys.argv[1:]
+    if not images:
+        images = ['../Textura/marrom.jpeg', '../Textura/verde.jpeg']
+        tmp = os.path.join(tempfile.gettempdir(), 'bench_bcn_2048.jpg')
+        small = np.random.default_rng(0).integers(0, 256, (128, 128, 3), dtype=np.uint8)
+        Image.fromarray(small).resize((2048, 2048), Image.BILINEAR).save(tmp, quality=90)
+        images.append(tmp)
+    workers = os.cpu_count() or 1
+
+    try:
+        for image in images:
+            levels = tc.mipChain(tex.readImage(image))
+            height, width = levels[0].shape[:2]
+            pixels = sum(level.shape[0]*level.shape[1] for level in levels)
+            print("%s: %dx%d, %d levels, RGB %.2f MB, RGBA %.2f MB"
+                  % (os.path.basename(image), width, height, len(levels), 3*pixels/2**20, 4*pixels/2**20))
+            for format in ('bc1', 'bc3'):
+                start = time.perf_counter()
+                encoded = [bcn.compress(level, format) for level in levels]
+                t_serial = time.perf_counter() - start
+                start = time.perf_counter()
+                bcn.compress(levels[0], format, workers)
+                t_first = time.perf_counter() - start
+                size = sum(level.nbytes for level in encoded)
+                decoded = bcn.decompress(encoded[0], width, height, format)
+                print("  %s: %.2f MB (%.1fx smaller than RGBA), chain encoded in %.2f s, "
+                      "first level %.2f s with %d processes, PSNR %.2f dB"
+                      % (format, size/2**20, 4*pixels/size, t_serial, t_first, workers, psnr(decoded, levels[0])))
+    finally:
+        if tmp is not None:
+            os.remove(tmp)
+
+if __name__ == '__main__':
+    main()
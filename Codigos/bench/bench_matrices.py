@@ -0,0 +1,67 @@
+## @file bench_matrices.py
+# Batched matrix constructors of utils.py.
+#
+# Builds the model matrix (translation, rotations about x, y and z, scale)
+# of N instances with the scalar constructors, five calls and four
+# np.matmul per instance, and with the batched ones, one call each and a
+# composition of the stacks. Prints the cost per instance and checks that
+# both give the same matrices. The composition is also timed with np.einsum.
+#
+# Usage: python bench_matrices.py [<instances>]
+
+import sys
+import time
+import numpy as np
+sys.path.append('../lib/')
+import utils as ut
+
+def scalar(t, angles, s):
+    out = np.empty((len(t), 4, 4), dtype='float32')
+    for k in range(len(t)):
+        T = ut.matTranslate(*t[k])
+        Rx = ut.matRotateX(angles[k, 0])
+        Ry = ut.matRotateY(angles[k, 1])
+        Rz = ut.matRotateZ(angles[k, 2])
+        S = ut.matScale(*s[k])
+        out[k] = np.matmul(T, np.matmul(Rz, np.matmul(Ry, np.matmul(Rx, S))))
+    return out
+
+def batched(t, angles, s):
+    return ut.matComposeBatch(ut.matTranslateBatch(t[:, 0], t[:, 1], t[:, 2]),
+                              ut.matRotateZBatch(angles[:, 2]), ut.matRotateYBatch(angles[:, 1]),
+                              ut.matRotateXBatch(angles[:, 0]), ut.matScaleBatch(s[:, 0], s[:, 1], s[:, 2]))
+
+def best(f, runs=3):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = f()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = np.random.default_rng(0)
+    t = rng.uniform(-10, 10, (n, 3))
+    angles = rng.uniform(0, 2*np.pi, (n, 3))
+    s = rng.uniform(0.5, 2, (n, 3))
+
+    # The scalar path is timed on a slice, it takes seconds for 100k instances.
+    m = min(n, 10000)
+    t_scalar, reference = best(lambda: scalar(t[:m], angles[:m], s[:m]), 1)
+    t_batched, result = best(lambda: batched(t, angles, s))
+    print("%d instances" % n)
+    print("  scalar:  %.2f us per instance (%.3f s per frame)" % (1e6*t_scalar/m, t_scalar*n/m))
+    print("  batched: %.3f us per instance (%.4f s per frame), x%.0f, max difference %.1e"
+          % (1e6*t_batched/n, t_batched, (t_scalar/m)/(t_batched/n), np.abs(result[:m] - reference).max()))
+
+    A = ut.matRotateYBatch(angles[:, 1])
+    B = ut.matTranslateBatch(t[:, 0], t[:, 1], t[:, 2])
+    t_matmul, _ = best(lambda: np.matmul(A, B))
+    t_einsum, _ = best(lambda: np.einsum('nij,njk->nik', A, B))
+    print("  one composition: np.matmul %.4f s, np.einsum %.4f s" % (t_matmul, t_einsum))
+    t_instance, _ = best(lambda: ut.matInstanceData(result))
+    print("  instance buffer data (column-major): %.4f s, %.1f MB" % (t_instance, result.nbytes/2**20))
+
+if __name__ == '__main__':
+    main()
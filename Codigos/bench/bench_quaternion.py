@@ -0,0 +1,86 @@
+## @file bench_quaternion.py
+# Quaternion rotations of quaternion.py against Euler matrix products.
+#
+# For one object per frame, times the rotation of display() built as
+# Rz*Ry*Rx (three matRotate calls and two products, in place), from the
+# Euler angles through a quaternion, and from a quaternion kept up to date
+# (what mesh2.py and texture_2.py do, rebuilding it only when the angles
+# change), plus the incremental step of phong.py's idle(). Then the same for
+# a batch of instances against the batched matrix constructors, and a batched
+# slerp. Checks that the matrices agree.
+#
+# Usage: python bench_quaternion.py [<instances>]
+
+import sys
+import math
+import time
+import numpy as np
+sys.path.append('../lib/')
+import utils as ut
+import quaternion as qt
+
+def best(f, repeat=5, number=1000):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            result = f()
+        times.append((time.perf_counter() - start)/number)
+    return min(times), result
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    ax, ay, az = math.radians(30.0), math.radians(-20.0), math.radians(10.0)
+
+    m = {name: ut.matIdentity() for name in ('Rx', 'Ry', 'Rz', 'tmp', 'R')}
+    def euler():
+        Rx = ut.matRotateX(ax, out=m['Rx'])
+        Ry = ut.matRotateY(ay, out=m['Ry'])
+        Rz = ut.matRotateZ(az, out=m['Rz'])
+        R = np.matmul(Ry, Rx, out=m['tmp'])
+        return np.matmul(Rz, R, out=m['R'])
+    q = qt.quatIdentity()
+    R = ut.matIdentity()
+    def fromEuler():
+        return qt.quatToMatrix(qt.quatFromEuler(ax, ay, az, out=q), out=R)
+    orientation = qt.quatFromEuler(ax, ay, az)
+    def fromQuaternion():
+        return qt.quatToMatrix(orientation, out=R)
+    step = qt.quatFromEuler(0.001, 0.002, 0.003)
+    animated = qt.quatIdentity()
+    def incremental():
+        qt.quatMultiply(step, animated, out=animated)
+        return qt.quatNormalize(animated, out=animated)
+
+    t_euler, reference = best(euler)
+    reference = reference.copy()
+    print("one rotation per frame:")
+    print("  3 matRotate + 2 matmul:     %6.2f us" % (1e6*t_euler))
+    for name, f in (("quatFromEuler + quatToMatrix", fromEuler), ("quatToMatrix (kept quaternion)", fromQuaternion)):
+        seconds, result = best(f)
+        print("  %-29s %6.2f us (x%.1f), max difference %.1e"
+              % (name + ":", 1e6*seconds, t_euler/seconds, np.abs(result - reference).max()))
+    seconds, _ = best(incremental)
+    print("  incremental step (multiply + normalize): %.2f us" % (1e6*seconds))
+
+    rng = np.random.default_rng(0)
+    angles = rng.uniform(-np.pi, np.pi, (n, 3)).astype('float32')
+    def eulerBatch():
+        return ut.matComposeBatch(ut.matRotateZBatch(angles[:, 2]), ut.matRotateYBatch(angles[:, 1]),
+                                  ut.matRotateXBatch(angles[:, 0]))
+    def quatBatch():
+        return qt.quatToMatrix(qt.quatFromEuler(angles[:, 0], angles[:, 1], angles[:, 2]))
+    t_batch, reference = best(eulerBatch, 3, 1)
+    seconds, result = best(quatBatch, 3, 1)
+    print("%d instances:" % n)
+    print("  3 batched matRotate + compose: %.2f us per instance" % (1e6*t_batch/n))
+    print("  quatFromEuler + quatToMatrix:  %.2f us per instance (x%.1f), max difference %.1e"
+          % (1e6*seconds/n, t_batch/seconds, np.abs(result - reference).max()))
+    a = qt.quatFromEuler(angles[:, 0], angles[:, 1], angles[:, 2])
+    b = qt.quatFromEuler(angles[:, 1], angles[:, 2], angles[:, 0])
+    t = rng.uniform(0, 1, n)
+    seconds, _ = best(lambda: qt.quatSlerp(a, b, t), 3, 1)
+    print("  quatSlerp: %.2f us per instance" % (1e6*seconds/n))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+## @file bench_scenegraph.py
+# World matrix updates of scenegraph.py.
+#
+# Builds a tree of nodes (by default 100000, each with 8 children, random
+# transformations) and times one frame of world matrices computed three
+# ways: node by node in Python from matTranslate, quatToMatrix and matScale,
+# as the example scripts do; every node with SceneGraph.update(full=True);
+# and with a few percent of the nodes changed per frame, where update()
+# recomputes only their subtrees. Checks the incremental update against the
+# full one.
+#
+# Usage: python bench_scenegraph.py [<nodes>] [<children per node>]
+
+import sys
+import time
+import numpy as np
+sys.path.append('../lib/')
+import utils as ut
+import quaternion as qt
+import scenegraph as sg
+
+def randomRotations(rng, count):
+    return qt.quatNormalize(rng.normal(size=(count, 4)).astype('float32'))
+
+## Frame of a script: every matrix rebuilt, node by node.
+def perNode(graph):
+    world = graph.world
+    for i in range(graph.count):
+        M = np.matmul(qt.quatToMatrix(graph.rotation[i]), ut.matScale(*graph.scale[i].tolist()))
+        M = np.matmul(ut.matTranslate(*graph.translation[i].tolist()), M)
+        parent = graph.parent[i]
+        world[i] = M if parent < 0 else np.matmul(world[parent], M)
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    branching = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    rng = np.random.default_rng(0)
+
+    graph = sg.SceneGraph()
+    parents = (np.arange(n) - 1)//branching
+    graph.addNodes(parents, rng.uniform(-1, 1, (n, 3)), randomRotations(rng, n), rng.uniform(0.9, 1.1, (n, 3)))
+    print("%d nodes, %d children per node, %d levels, world matrices %.1f MB"
+          % (n, branching, graph.depth[:n].max() + 1, graph.worldMatrices().nbytes/2**20))
+
+    start = time.perf_counter()
+    perNode(graph)
+    t_node = time.perf_counter() - start
+    print("  per node in Python:   %8.2f ms" % (1000*t_node))
+    graph.update(full=True)
+    t_full = float('inf')
+    for _ in range(5):
+        start = time.perf_counter()
+        graph.update(full=True)
+        t_full = min(t_full, time.perf_counter() - start)
+    print("  full update:          %8.2f ms (x%.0f)" % (1000*t_full, t_node/t_full))
+
+    for percent in (1, 2, 5):
+        changed = n*percent//100
+        best = float('inf')
+        for _ in range(5):
+            nodes = rng.choice(n, changed, replace=False)
+            graph.setRotation(nodes, randomRotations(rng, changed))
+            start = time.perf_counter()
+            recomputed = graph.update()
+            best = min(best, time.perf_counter() - start)
+        incremental = graph.worldMatrices().copy()
+        graph.update(full=True)
+        diff = np.abs(incremental - graph.worldMatrices()).max()
+        print("  %d%% changed (%5d):   %8.2f ms (x%.1f against full), %d nodes recomputed, max difference %.1e"
+              % (percent, changed, 1000*best, t_full/best, recomputed, diff))
+
+if __name__ == '__main__':
+    main()
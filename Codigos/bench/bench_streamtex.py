@@ -0,0 +1,91 @@
+## @file bench_streamtex.py
+# Streaming texture uploads of streamtex.py.
+#
+# Opens a GLUT window and, for each frame size, plays a live feed on a
+# full-window quad uploading it from client memory (synchronous path) and
+# through rings of 2 and 3 pixel buffers. Prints the upload throughput in
+# MB/s, the time waiting on fences and the mean, standard deviation and 99th
+# percentile of the frame time (update, draw and swap, without glFinish, so
+# the GPU work overlaps the next frame as in a real render loop). phong.py
+# prints the same figures for its cubes (live_feed).
+#
+# Usage: python bench_streamtex.py [<frames>]
+
+import sys
+import time
+import numpy as np
+import OpenGL.GL as gl
+import OpenGL.GLUT as glut
+sys.path.append('../lib/')
+import utils as ut
+import streamtex as st
+
+vertex_code = """
+#version 330 core
+out vec2 uv;
+void main()
+{
+    uv = vec2(gl_VertexID & 1, gl_VertexID >> 1);
+    gl_Position = vec4(2.0*uv - 1.0, 0.0, 1.0);
+}
+"""
+
+fragment_code = """
+#version 330 core
+in vec2 uv;
+out vec4 fragColor;
+uniform sampler2D feed;
+void main()
+{
+    fragColor = texture(feed, uv);
+}
+"""
+
+## Play a feed.
+#
+# @param program Program drawing the quad.
+# @param frames Frames of the feed.
+# @param count Number of frames to draw.
+# @param ring_size Pixel buffers, 0 for the synchronous path.
+def run(program, frames, count, ring_size):
+    height, width = frames[0].shape[:2]
+    stream = st.StreamingTexture(width, height, 3, ring_size)
+    vao = gl.glGenVertexArrays(1)
+    times = []
+    for k in range(count + 1):
+        start = time.perf_counter()
+        stream.update(frames[k % len(frames)])
+        gl.glUseProgram(program)
+        gl.glBindVertexArray(vao)
+        gl.glDrawArrays(gl.GL_TRIANGLE_STRIP, 0, 4)
+        glut.glutSwapBuffers()
+        times.append(time.perf_counter() - start)
+    gl.glFinish()
+    # The first frame allocates the driver's copy of the texture.
+    times = 1000*np.array(times[1:])
+    name = "ring of %d PBOs" % ring_size if ring_size else "synchronous"
+    print("  %-16s %7.1f MB/s, %7.2f ms on fences, frame %6.2f ms mean, %5.2f ms std, %6.2f ms p99"
+          % (name, stream.throughput(), 1000*stream.wait_seconds, times.mean(), times.std(),
+             np.percentile(times, 99)))
+    gl.glDeleteVertexArrays(1, [vao])
+    stream.delete()
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    glut.glutInit()
+    glut.glutInitContextVersion(3, 3)
+    glut.glutInitContextProfile(glut.GLUT_CORE_PROFILE)
+    glut.glutInitDisplayMode(glut.GLUT_DOUBLE | glut.GLUT_RGBA)
+    glut.glutInitWindowSize(640, 480)
+    glut.glutCreateWindow('Streaming texture')
+    program = ut.createShaderProgram(vertex_code, fragment_code)
+
+    rng = np.random.default_rng(0)
+    for width, height in ((640, 480), (1280, 720), (1920, 1080)):
+        frames = [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(8)]
+        print("%dx%d RGB, %.2f MB per frame, %d frames" % (width, height, frames[0].nbytes/2**20, count))
+        for ring_size in (0, 2, 3):
+            run(program, frames, count, ring_size)
+
+if __name__ == '__main__':
+    main()
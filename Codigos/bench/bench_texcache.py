@@ -0,0 +1,57 @@
+## @file bench_texcache.py
+# Cold and warm texture loads through texcache.
+#
+# For each image (by default marrom.jpeg, verde.jpeg and random JPEGs of
+# 1024 to 4096 pixels a side), times a cold load (decode, mip chain with the
+# box filter, store) and a warm one (memory-mapped entry, every level read
+# once as glTexImage2D would), in a temporary cache directory. The examples
+# print their own cold and warm times including the upload.
+#
+# Usage: python bench_texcache.py [<image> ...]
+
+import sys
+import os
+import time
+import shutil
+import tempfile
+import numpy as np
+from PIL import Image
+sys.path.append('../lib/')
+import texcache as tc
+
+def main():
+    tmp = tempfile.mkdtemp()
+    images = sys.argv[1:]
+    if not images:
+        images = ['../Textura/marrom.jpeg', '../Textura/verde.jpeg']
+        rng = np.random.default_rng(0)
+        for size in (1024, 2048, 4096):
+            path = os.path.join(tmp, 'random_%d.jpg' % size)
+            small = rng.integers(0, 256, (size//16, size//16, 3), dtype=np.uint8)
+            Image.fromarray(small).resize((size, size), Image.BILINEAR).save(path, quality=90)
+            images.append(path)
+    cache_dir = os.path.join(tmp, 'cache')
+
+    try:
+        print("%-24s %12s %7s %10s %10s %10s" % ("image", "size", "levels", "MB", "cold s", "warm s"))
+        for image in images:
+            start = time.perf_counter()
+            levels, cached = tc.loadTexture(image, cache_dir=cache_dir)
+            t_cold = time.perf_counter() - start
+            assert not cached
+
+            start = time.perf_counter()
+            levels, cached = tc.loadTexture(image, cache_dir=cache_dir)
+            # Touch every byte, as the upload would.
+            total = sum(int(level.sum(dtype=np.uint64) & 1) for level in levels)
+            t_warm = time.perf_counter() - start
+            assert cached
+
+            size = "%dx%d" % (levels[0].shape[1], levels[0].shape[0])
+            print("%-24s %12s %7d %10.1f %10.3f %10.3f" % (os.path.basename(image), size, len(levels),
+                  sum(level.nbytes for level in levels)/2**20, t_cold, t_warm))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
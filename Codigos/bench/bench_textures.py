@@ -0,0 +1,68 @@
+## @file bench_textures.py
+# Texture decoding, list(img.getdata()) versus textures.readImage.
+#
+# Writes random RGB JPEGs from 256x256 to 8192x8192 and times decoding them
+# into the array given to glTexImage2D, both ways, with the peak memory
+# allocated meanwhile (tracemalloc, which sees numpy and Python objects). The
+# original conversion needs a Python tuple per pixel, so it only runs up to
+# legacy_max pixels a side.
+#
+# Usage: python bench_textures.py [<size> ...]
+
+import sys
+import os
+import time
+import tempfile
+import tracemalloc
+import warnings
+import numpy as np
+from PIL import Image
+sys.path.append('../lib/')
+import textures as tex
+
+## Largest side for the original conversion.
+legacy_max = 2048
+
+## The original read_texture conversion. Its int8 dtype wrapped values above
+# 127 with numpy 1 and raises OverflowError with numpy 2, so uint8 is used here.
+def legacyRead(path):
+    img = Image.open(path)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        return np.array(list(img.getdata()), np.uint8)
+
+## Time and peak traced memory of a call.
+def measure(function, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+def main():
+    sizes = [int(n) for n in sys.argv[1:]] or [256, 512, 1024, 2048, 4096, 8192]
+    rng = np.random.default_rng(0)
+
+    print("%6s %12s %12s %12s %12s" % ("size", "legacy s", "legacy MB", "new s", "new MB"))
+    for size in sizes:
+        path = os.path.join(tempfile.gettempdir(), "bench_texture_%d.jpg" % size)
+        # Smooth noise, so the JPEG has a realistic size.
+        small = rng.integers(0, 256, (size//16 + 1, size//16 + 1, 3), dtype=np.uint8)
+        Image.fromarray(small).resize((size, size), Image.BILINEAR).save(path, quality=90)
+        try:
+            data, t_new, m_new = measure(tex.readImage, path)
+            legacy = "%12s %12s" % ("-", "-")
+            if size <= legacy_max:
+                old, t_old, m_old = measure(legacyRead, path)
+                assert np.array_equal(old.reshape(data.shape), data)
+                del old
+                legacy = "%12.3f %12.1f" % (t_old, m_old/2**20)
+            print("%6d %s %12.3f %12.1f" % (size, legacy, t_new, m_new/2**20))
+            del data
+        finally:
+            os.remove(path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+## @file bench_transforms.py
+# Per-frame matrix allocations of display().
+#
+# Replays the matrix work of a display() like the ones of mesh2.py and
+# texture_2.py (five constructors, four products, three uploads) the old way,
+# allocating every matrix and the transposed copy PyOpenGL makes of
+# M.transpose(), and with the out= constructors of utils.py writing into
+# preallocated matrices, sent row-major with GL_TRUE (no copy). With
+# tracemalloc it prints the memory allocated at the peak of a frame and the
+# blocks left over after it, then the time per frame.
+#
+# Usage: python bench_transforms.py [<frames>]
+
+import sys
+import gc
+import math
+import time
+import tracemalloc
+import numpy as np
+sys.path.append('../lib/')
+import utils as ut
+
+## Stand-in for glUniformMatrix4fv: PyOpenGL makes a contiguous copy of
+# non-contiguous arrays, and passes contiguous float32 ones as they are.
+def upload(M):
+    return np.ascontiguousarray(M, dtype='float32')
+
+def frameAllocating(angle):
+    T  = ut.matTranslate(0.1, 0.2, 0.3)
+    Rx = ut.matRotateX(np.radians(angle))
+    Ry = ut.matRotateY(np.radians(2*angle))
+    Rz = ut.matRotateZ(np.radians(3*angle))
+    S  = ut.matScale(1.0, 2.0, 1.0)
+    M = np.matmul(Ry,Rx)
+    M = np.matmul(Rz,M)
+    M = np.matmul(S, M)
+    M = np.matmul(T,M)
+    upload(M.transpose())
+    view = ut.matTranslate(0.0, 0.0, -5.0)
+    upload(view.transpose())
+    projection = ut.matPerspective(np.radians(45.0), 1.0, 0.1, 100.0)
+    upload(projection.transpose())
+    return M
+
+frame_matrices = {name: ut.matIdentity() for name in ('T', 'Rx', 'Ry', 'Rz', 'S', 'M', 'tmp', 'view', 'projection')}
+
+def frameInPlace(angle):
+    m = frame_matrices
+    T  = ut.matTranslate(0.1, 0.2, 0.3, out=m['T'])
+    Rx = ut.matRotateX(math.radians(angle), out=m['Rx'])
+    Ry = ut.matRotateY(math.radians(2*angle), out=m['Ry'])
+    Rz = ut.matRotateZ(math.radians(3*angle), out=m['Rz'])
+    S  = ut.matScale(1.0, 2.0, 1.0, out=m['S'])
+    M = np.matmul(Ry, Rx, out=m['M'])
+    M = np.matmul(Rz, M, out=m['tmp'])
+    M = np.matmul(S, M, out=m['M'])
+    M = np.matmul(T, M, out=m['tmp'])
+    upload(M)
+    view = ut.matTranslate(0.0, 0.0, -5.0, out=m['view'])
+    upload(view)
+    projection = ut.matPerspective(math.radians(45.0), 1.0, 0.1, 100.0, out=m['projection'])
+    upload(projection)
+    return M
+
+def measure(name, frame, frames):
+    for k in range(100):
+        frame(k)
+    gc.collect()
+    gc.disable()
+    peaks = np.zeros(frames, dtype=np.int64)
+    tracemalloc.start()
+    start_blocks = tracemalloc.take_snapshot()
+    for k in range(frames):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        frame(k)
+        peaks[k] = tracemalloc.get_traced_memory()[1] - current
+    left = sum(stat.count_diff for stat in tracemalloc.take_snapshot().compare_to(start_blocks, 'filename')
+               if stat.traceback[0].filename != tracemalloc.__file__)
+    tracemalloc.stop()
+    gc.enable()
+
+    start = time.perf_counter()
+    for k in range(frames):
+        frame(k)
+    seconds = (time.perf_counter() - start)/frames
+    print("  %-11s %5d bytes allocated at the peak of a frame, %d blocks left after %d frames, %.1f us per frame"
+          % (name, int(np.median(peaks)), left, frames, 1e6*seconds))
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    print("matrices of one display() (5 constructors, 4 products, 3 uploads)")
+    measure("allocating", frameAllocating, frames)
+    measure("in place", frameInPlace, frames)
+    a, b = frameAllocating(7.0), frameInPlace(7.0)
+    print("  same model matrix: %s" % np.array_equal(a, b))
+
+if __name__ == '__main__':
+    main()
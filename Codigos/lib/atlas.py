@@ -0,0 +1,176 @@
+## @file atlas.py
+# Texture atlas.
+#
+# Packs several images in one or more pages with the skyline algorithm: each
+# page keeps the top edge of the packed rectangles as a list of horizontal
+# segments, and every image (largest first) goes where its bottom lands
+# lowest. Images are surrounded by a border repeating their edge texels, and
+# placed on a grid of that size, so bilinear filtering and the first mip
+# levels do not mix neighbours. Images are converted to the channels they
+# need together (gray or RGB, with alpha if any has it). Texture coordinates
+# in [0,1] of an image are mapped to its rectangle in the page; coordinates
+# outside would read the neighbours, so they are rejected.
+
+import numpy as np
+
+## Atlas.
+class Atlas:
+    def __init__(self):
+        ## Pixels of each page (height, width, channels).
+        self.pages = []
+        ## Page and (u0, v0, u1, v1) rectangle of each image, in page coordinates.
+        self.rects = []
+        ## Border around each image, in texels.
+        self.padding = 0
+
+    ## Mip levels usable without the images mixing (the border halves at each level).
+    def mipLevels(self):
+        return max(1, int(np.log2(max(1, self.padding))) + 1)
+
+## Skyline page.
+class _Skyline:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        ## Segments (x, y, width) of the top edge, left to right.
+        self.segments = [(0, 0, width)]
+
+    ## Lowest position for a rectangle, or None if it does not fit.
+    #
+    # @return (y, x, index of the first segment) of the best position.
+    def find(self, width, height):
+        best = None
+        for i, (x, _, _) in enumerate(self.segments):
+            if x + width > self.width:
+                break
+            # Height of the skyline under the rectangle.
+            y = 0
+            covered = 0
+            j = i
+            while covered < width:
+                y = max(y, self.segments[j][1])
+                covered += self.segments[j][2] - (x - self.segments[j][0] if j == i else 0)
+                j += 1
+            if y + height <= self.height and (best is None or (y, x) < best[:2]):
+                best = (y, x, i)
+        return best
+
+    ## Place a rectangle at a position returned by find.
+    def place(self, width, height, position):
+        y, x, i = position
+        top = (x, y + height, width)
+        # Drop the segments under the rectangle, keep what sticks out to the right.
+        j = i
+        while j < len(self.segments) and self.segments[j][0] < x + width:
+            j += 1
+        last = self.segments[j - 1]
+        right = []
+        if last[0] + last[2] > x + width:
+            right = [(x + width, last[1], last[0] + last[2] - x - width)]
+        segments = self.segments[:i] + [top] + right + self.segments[j:]
+
+        # Merge neighbours at the same height.
+        merged = [segments[0]]
+        for segment in segments[1:]:
+            if segment[1] == merged[-1][1]:
+                merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + segment[2])
+            else:
+                merged.append(segment)
+        self.segments = merged
+
+    ## Highest point of the skyline.
+    def top(self):
+        return max(y for _, y, _ in self.segments)
+
+## Pack rectangles.
+#
+# @param sizes (width, height) of each rectangle.
+# @param page_width, page_height Size of a page.
+# @param align Positions and sizes are rounded up to multiples of it.
+# @return (page, x, y) of each rectangle and the used (width, height) of each page.
+def packSkyline(sizes, page_width, page_height, align=1):
+    rounded = [(-(-w//align)*align, -(-h//align)*align) for w, h in sizes]
+    pages = []
+    placements = [None]*len(sizes)
+    for k in sorted(range(len(sizes)), key=lambda k: (-rounded[k][1], -rounded[k][0])):
+        width, height = rounded[k]
+        if width > page_width or height > page_height:
+            raise ValueError("Image of %dx%d does not fit in a %dx%d page"
+                             % (sizes[k][0], sizes[k][1], page_width, page_height))
+        for p, page in enumerate(pages):
+            position = page.find(width, height)
+            if position is not None:
+                break
+        else:
+            pages.append(_Skyline(page_width, page_height))
+            p, page = len(pages) - 1, pages[-1]
+            position = page.find(width, height)
+        page.place(width, height, position)
+        placements[k] = (p, position[1], position[0])
+
+    used = []
+    for p, page in enumerate(pages):
+        right = max(x + rounded[k][0] for k, (q, x, y) in enumerate(placements) if q == p)
+        used.append((right, page.top()))
+    return placements, used
+
+## Convert an image to gray or RGB, with or without alpha.
+#
+# @param image Pixels (height, width) or (height, width, 1 to 4 channels).
+# @param channels 1, 2 (gray, alpha), 3 or 4 (RGB, alpha).
+# @return Pixels (height, width, channels), the image itself if it has them.
+def _convertChannels(image, channels):
+    if image.ndim == 2:
+        image = image[:, :, None]
+    if image.shape[2] == channels:
+        return image
+    if image.shape[2] >= 3:
+        color = image[:, :, :3]
+    else:
+        color = np.repeat(image[:, :, :1], 3 if channels >= 3 else 1, axis=2)
+    if channels % 2 == 1:
+        return np.ascontiguousarray(color)
+    alpha = image[:, :, -1:] if image.shape[2] % 2 == 0 else np.full(image.shape[:2] + (1,), 255, dtype=np.uint8)
+    return np.concatenate((color, alpha), axis=2)
+
+## Build an atlas.
+#
+# @param images Pixels of each image (height, width, channels).
+# @param page_size Largest side of a page.
+# @param padding Border repeated around each image, in texels.
+# @return Atlas, with each page cropped to the area used.
+def buildAtlas(images, page_size=2048, padding=4):
+    padding = max(1, padding)
+    sizes = [(image.shape[1] + 2*padding, image.shape[0] + 2*padding) for image in images]
+    placements, used = packSkyline(sizes, page_size, page_size, align=padding)
+
+    atlas = Atlas()
+    atlas.padding = padding
+    # Color if any image has it, alpha if any image has it.
+    counts = [1 if image.ndim == 2 else image.shape[2] for image in images]
+    channels = (3 if max(counts) >= 3 else 1) + (1 if any(count % 2 == 0 for count in counts) else 0)
+    images = [_convertChannels(image, channels) for image in images]
+    atlas.pages = [np.zeros((height, width, channels), dtype=np.uint8) for width, height in used]
+    for image, (p, x, y) in zip(images, placements):
+        height, width = image.shape[:2]
+        page = atlas.pages[p]
+        page[y:y + height + 2*padding, x:x + width + 2*padding] = np.pad(
+            image, ((padding, padding), (padding, padding), (0, 0)), mode='edge')
+        page_height, page_width = page.shape[:2]
+        atlas.rects.append((p, (x + padding)/page_width, (y + padding)/page_height,
+                            (x + padding + width)/page_width, (y + padding + height)/page_height))
+    return atlas
+
+## Remap texture coordinates to the atlas.
+#
+# @param uvs Texture coordinates of one image, (n,2), in [0,1]. Repeating
+#        textures cannot be packed, so coordinates outside raise ValueError.
+# @param rect Rectangle of the image, as in Atlas.rects.
+# @return Coordinates in its page.
+def remapUVs(uvs, rect):
+    _, u0, v0, u1, v1 = rect
+    uvs = np.asarray(uvs, dtype=np.float32)
+    if uvs.size and (uvs.min() < 0.0 or uvs.max() > 1.0):
+        raise ValueError("Texture coordinates in [%g, %g] are outside the [0, 1] of an atlas image"
+                         % (uvs.min(), uvs.max()))
+    return np.stack([u0 + uvs[:, 0]*(u1 - u0), v0 + uvs[:, 1]*(v1 - v0)], axis=1).astype(np.float32)
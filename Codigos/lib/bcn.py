@@ -0,0 +1,239 @@
+## @file bcn.py
+# Block compression of textures (BC1 and BC3, also known as DXT1 and DXT5).
+#
+# Images are cut in 4x4 blocks. BC1 stores each block in 8 bytes: two RGB565
+# end points and a 2-bit index per texel into the palette e0, e1, 2/3 e0 +
+# 1/3 e1, 1/3 e0 + 2/3 e1. BC3 adds 8 bytes of alpha: two 8-bit end points
+# and a 3-bit index per texel into 8 interpolated values. End points come
+# from the principal axis of the block colors (power iteration on the
+# covariance) and are refined once by least squares for the chosen indexes.
+# Every block of a chunk is encoded at once with numpy; chunks can be spread
+# over worker processes.
+
+import numpy as np
+import OpenGL.GL as gl
+from OpenGL.GL.EXT.texture_compression_s3tc import (GL_COMPRESSED_RGB_S3TC_DXT1_EXT,
+                                                     GL_COMPRESSED_RGBA_S3TC_DXT5_EXT)
+from concurrent.futures import ProcessPoolExecutor
+
+## Bytes per block of each format.
+BLOCK_BYTES = {'bc1': 8, 'bc3': 16}
+
+## GL internal format of each format.
+GL_FORMATS = {'bc1': GL_COMPRESSED_RGB_S3TC_DXT1_EXT, 'bc3': GL_COMPRESSED_RGBA_S3TC_DXT5_EXT}
+
+## Blocks encoded at once (bounds the temporary arrays).
+CHUNK_BLOCKS = 1 << 15
+
+## Interpolation weight of e0 for each BC1 index.
+_COLOR_WEIGHTS = np.array([1.0, 0.0, 2.0/3.0, 1.0/3.0], dtype=np.float32)
+
+## Index of each step from a0 (0) to a1 (7) of the BC3 alpha ramp.
+_ALPHA_INDEX = np.array([0, 2, 3, 4, 5, 6, 7, 1], dtype=np.uint64)
+
+## Cut an image in blocks.
+#
+# @param data Pixels (height, width, channels), padded by repeating the edges.
+# @return Texels of each block (rows of blocks, columns of blocks, 16, channels),
+#         in row-major order inside a block.
+def toBlocks(data):
+    if data.ndim == 2:
+        data = data[:, :, None]
+    height, width, channels = data.shape
+    data = np.pad(data, ((0, -height % 4), (0, -width % 4), (0, 0)), mode='edge')
+    rows, columns = data.shape[0]//4, data.shape[1]//4
+    return data.reshape(rows, 4, columns, 4, channels).transpose(0, 2, 1, 3, 4).reshape(rows, columns, 16, channels)
+
+## Quantize colors to RGB565.
+#
+# @param colors Colors in [0,255], (n,3).
+# @return 16-bit codes and the colors they decode to.
+def _to565(colors):
+    q = np.rint(np.clip(colors, 0, 255)*(np.array([31, 63, 31])/255.0)).astype(np.uint16)
+    codes = (q[:, 0] << 11) | (q[:, 1] << 5) | q[:, 2]
+    decoded = np.stack([(q[:, 0] << 3) | (q[:, 0] >> 2),
+                        (q[:, 1] << 2) | (q[:, 1] >> 4),
+                        (q[:, 2] << 3) | (q[:, 2] >> 2)], axis=1).astype(np.float32)
+    return codes, decoded
+
+## Nearest BC1 indexes.
+#
+# @param texels Block colors (n,16,3).
+# @param e0, e1 Decoded end points (n,3).
+# @return Index of each texel (n,16).
+def _colorIndexes(texels, e0, e1):
+    palette = _COLOR_WEIGHTS[None, :, None]*e0[:, None] + (1.0 - _COLOR_WEIGHTS)[None, :, None]*e1[:, None]
+    distance = ((texels[:, :, None, :] - palette[:, None, :, :])**2).sum(axis=3)
+    return distance.argmin(axis=2)
+
+## Encode color blocks.
+#
+# @param texels Block colors (n,16,3), float32.
+# @return BC1 blocks (n,8).
+def _encodeColor(texels):
+    n = len(texels)
+    mean = texels.mean(axis=1)
+    centered = texels - mean[:, None]
+    covariance = np.einsum('nki,nkj->nij', centered, centered)
+
+    # Principal axis, starting from the extent of the block.
+    axis = texels.max(axis=1) - texels.min(axis=1)
+    for _ in range(4):
+        axis = np.einsum('nij,nj->ni', covariance, axis)
+        length = np.linalg.norm(axis, axis=1, keepdims=True)
+        axis = np.divide(axis, length, out=np.full_like(axis, 3**-0.5), where=length > 1e-12)
+    projection = np.einsum('nki,ni->nk', centered, axis)
+    e0 = mean + projection.max(axis=1)[:, None]*axis
+    e1 = mean + projection.min(axis=1)[:, None]*axis
+
+    # One least squares refinement of the end points for the chosen indexes.
+    _, d0 = _to565(e0)
+    _, d1 = _to565(e1)
+    w = _COLOR_WEIGHTS[_colorIndexes(texels, d0, d1)]
+    a, b, c = (w*w).sum(axis=1), (w*(1 - w)).sum(axis=1), ((1 - w)**2).sum(axis=1)
+    x = np.einsum('nk,nki->ni', w, texels)
+    y = np.einsum('nk,nki->ni', 1 - w, texels)
+    det = a*c - b*b
+    solvable = (np.abs(det) > 1e-6)[:, None]
+    safe = np.where(np.abs(det) > 1e-6, det, 1.0)[:, None]
+    e0 = np.where(solvable, (c[:, None]*x - b[:, None]*y)/safe, e0)
+    e1 = np.where(solvable, (a[:, None]*y - b[:, None]*x)/safe, e1)
+
+    # e0 > e1 selects the 4 color mode.
+    c0, d0 = _to565(e0)
+    c1, d1 = _to565(e1)
+    swap = c0 < c1
+    c0, c1 = np.where(swap, c1, c0), np.where(swap, c0, c1)
+    d0, d1 = np.where(swap[:, None], d1, d0), np.where(swap[:, None], d0, d1)
+    indexes = _colorIndexes(texels, d0, d1).astype(np.uint32)
+    indexes[c0 == c1] = 0
+
+    bits = (indexes << (2*np.arange(16, dtype=np.uint32))).sum(axis=1, dtype=np.uint32)
+    blocks = np.empty((n, 8), dtype=np.uint8)
+    blocks[:, 0:2] = c0.astype('<u2').view(np.uint8).reshape(n, 2)
+    blocks[:, 2:4] = c1.astype('<u2').view(np.uint8).reshape(n, 2)
+    blocks[:, 4:8] = bits.astype('<u4').view(np.uint8).reshape(n, 4)
+    return blocks
+
+## Encode alpha blocks.
+#
+# @param alpha Block alpha values (n,16), float32.
+# @return BC3 alpha blocks (n,8).
+def _encodeAlpha(alpha):
+    n = len(alpha)
+    a0 = np.rint(alpha.max(axis=1))
+    a1 = np.rint(alpha.min(axis=1))
+    span = np.where(a0 > a1, a0 - a1, 1.0)
+    steps = np.clip(np.rint((a0[:, None] - alpha)/span[:, None]*7), 0, 7).astype(np.int64)
+    indexes = _ALPHA_INDEX[steps]
+    indexes[a0 == a1] = 0
+
+    bits = (indexes << (3*np.arange(16, dtype=np.uint64))).sum(axis=1, dtype=np.uint64)
+    blocks = np.empty((n, 8), dtype=np.uint8)
+    blocks[:, 0] = a0
+    blocks[:, 1] = a1
+    blocks[:, 2:8] = bits.astype('<u8').view(np.uint8).reshape(n, 8)[:, :6]
+    return blocks
+
+## Encode blocks.
+#
+# @param blocks Texels of the blocks (n,16,channels), uint8.
+# @param format 'bc1' or 'bc3'.
+# @return Encoded blocks (n, BLOCK_BYTES[format]).
+def encodeBlocks(blocks, format):
+    out = np.empty((len(blocks), BLOCK_BYTES[format]), dtype=np.uint8)
+    for start in range(0, len(blocks), CHUNK_BLOCKS):
+        texels = blocks[start:start + CHUNK_BLOCKS].astype(np.float32)
+        if texels.shape[2] < 3:
+            texels = np.concatenate([texels[:, :, :1]]*3 + [texels[:, :, 1:]], axis=2)
+        color = _encodeColor(texels[:, :, :3])
+        if format == 'bc1':
+            out[start:start + len(texels)] = color
+        else:
+            alpha = texels[:, :, 3] if texels.shape[2] > 3 else np.full(texels.shape[:2], 255.0, np.float32)
+            out[start:start + len(texels), :8] = _encodeAlpha(alpha)
+            out[start:start + len(texels), 8:] = color
+    return out
+
+## Compress an image.
+#
+# @param data Pixels (height, width, channels), uint8.
+# @param format 'bc1' or 'bc3'.
+# @param workers Processes, 1 encodes on the calling process.
+# @return Encoded blocks (rows of blocks, columns of blocks, BLOCK_BYTES[format]).
+def compress(data, format='bc1', workers=1):
+    if format not in BLOCK_BYTES:
+        raise ValueError("Unknown block format: " + str(format))
+    blocks = toBlocks(data)
+    rows, columns = blocks.shape[:2]
+    blocks = blocks.reshape(rows*columns, 16, -1)
+    if workers <= 1 or len(blocks) <= CHUNK_BLOCKS:
+        encoded = encodeBlocks(blocks, format)
+    else:
+        parts = np.array_split(blocks, workers)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            encoded = np.concatenate(list(pool.map(encodeBlocks, parts, [format]*len(parts))))
+    return encoded.reshape(rows, columns, BLOCK_BYTES[format])
+
+## Decompress an image (for checking the encoder).
+#
+# @param encoded Encoded blocks as returned by compress.
+# @param width, height Size of the image.
+# @param format 'bc1' or 'bc3'.
+# @return Pixels (height, width, 3 or 4), uint8.
+def decompress(encoded, width, height, format='bc1'):
+    rows, columns = encoded.shape[:2]
+    encoded = encoded.reshape(rows*columns, -1)
+    color = encoded[:, -8:]
+    c0 = color[:, 0:2].copy().view('<u2')[:, 0]
+    c1 = color[:, 2:4].copy().view('<u2')[:, 0]
+    bits = color[:, 4:8].copy().view('<u4')[:, 0]
+
+    def decode565(c):
+        r, g, b = (c >> 11) & 31, (c >> 5) & 63, c & 31
+        return np.stack([(r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)], axis=1).astype(np.float32)
+    e0, e1 = decode565(c0), decode565(c1)
+    four = (c0 > c1)[:, None] | (format == 'bc3')
+    palette = np.stack([e0, e1,
+                        np.where(four, (2*e0 + e1)/3, (e0 + e1)/2),
+                        np.where(four, (e0 + 2*e1)/3, 0)], axis=1)
+    indexes = (bits[:, None] >> (2*np.arange(16, dtype=np.uint32))) & 3
+    texels = np.take_along_axis(palette, indexes[:, :, None].astype(np.int64), axis=1)
+
+    if format == 'bc3':
+        a0 = encoded[:, 0].astype(np.float32)
+        a1 = encoded[:, 1].astype(np.float32)
+        abits = np.zeros(len(encoded), dtype=np.uint64)
+        for i in range(6):
+            abits |= encoded[:, 2 + i].astype(np.uint64) << np.uint64(8*i)
+        k = np.arange(1, 7, dtype=np.float32)
+        eight = np.stack([a0, a1] + [((7 - i)*a0 + i*a1)/7 for i in k], axis=1)
+        six = np.stack([a0, a1] + [((5 - i)*a0 + i*a1)/5 for i in k[:4]] +
+                       [np.zeros_like(a0), np.full_like(a0, 255)], axis=1)
+        ramp = np.where((a0 > a1)[:, None], eight, six)
+        aindexes = ((abits[:, None] >> (3*np.arange(16, dtype=np.uint64))) & np.uint64(7)).astype(np.int64)
+        texels = np.concatenate([texels, np.take_along_axis(ramp, aindexes, axis=1)[:, :, None]], axis=2)
+
+    channels = texels.shape[2]
+    image = texels.reshape(rows, columns, 4, 4, channels).transpose(0, 2, 1, 3, 4).reshape(rows*4, columns*4, channels)
+    return np.rint(image[:height, :width]).astype(np.uint8)
+
+## Whether the current GL context can sample the formats.
+def supported():
+    count = gl.glGetIntegerv(gl.GL_NUM_EXTENSIONS)
+    extensions = {gl.glGetStringi(gl.GL_EXTENSIONS, i) for i in range(int(count))}
+    return b'GL_EXT_texture_compression_s3tc' in extensions
+
+## Upload compressed levels.
+#
+# Calls glCompressedTexImage2D for every level of the texture bound to the target.
+#
+# @param target Texture target (GL_TEXTURE_2D or a cube map face).
+# @param levels Encoded blocks of each level.
+# @param sizes (width, height) of each level.
+# @param format 'bc1' or 'bc3'.
+def compressedTexImageLevels(target, levels, sizes, format):
+    for level, (data, (width, height)) in enumerate(zip(levels, sizes)):
+        data = np.ascontiguousarray(data)
+        # PyOpenGL computes the image size from the array.
+        gl.glCompressedTexImage2D(target, level, GL_FORMATS[format], width, height, 0, data)
@@ -0,0 +1,198 @@
+## @file quaternion.py
+# Quaternions.
+#
+# Rotations as unit quaternions stored in NumPy arrays of shape (..., 4),
+# components (w, x, y, z). Every function takes a single quaternion or a
+# stack of them and broadcasts like NumPy; the ones that build a result
+# accept an out= array to write into, so a frame can reuse its quaternions
+# and matrices. quatToMatrix builds the rotation matrix in one step, instead
+# of multiplying one matrix per Euler angle. A single quaternion is handled
+# with Python floats, as NumPy operations on scalars cost more than the
+# arithmetic itself.
+
+import math
+import numpy as np
+
+## Components of quaternions.
+#
+# @param q Quaternions (..., 4).
+# @return w, x, y, z (floats for a single quaternion).
+def _components(q):
+    if np.ndim(q) == 1:
+        return tuple(q.tolist() if isinstance(q, np.ndarray) else q)
+    q = np.asarray(q)
+    return q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+
+## Array to fill.
+#
+# @param out Array to fill or None.
+# @param shape Shape of a new array.
+# @return out, or a new float32 array.
+def _quatOut(out, shape):
+    return np.empty(shape, dtype='float32') if out is None else out
+
+## Identity quaternions.
+#
+# @param n Number of quaternions, None for a single one.
+# @return (4,) or (n,4) float32 array.
+def quatIdentity(n=None):
+    q = np.zeros((4,) if n is None else (n, 4), dtype='float32')
+    q[..., 0] = 1.0
+
+    return q
+
+## Quaternions from axis and angle.
+#
+# @param axis Rotation axes (..., 3), normalized here.
+# @param angle Rotation angles in radians (...).
+# @param out Array to write into.
+# @return Quaternions (..., 4).
+def quatFromAxisAngle(axis, angle, out=None):
+    axis = np.asarray(axis, dtype='float32')
+    angle = np.asarray(angle, dtype='float32')
+    shape = np.broadcast_shapes(axis.shape[:-1], angle.shape)
+    q = _quatOut(out, shape + (4,))
+
+    s = np.sin(angle/2)/np.linalg.norm(axis, axis=-1)
+    q[..., 0] = np.cos(angle/2)
+    q[..., 1] = axis[..., 0]*s
+    q[..., 2] = axis[..., 1]*s
+    q[..., 3] = axis[..., 2]*s
+
+    return q
+
+## Product of quaternion components.
+#
+# @param a, b Components (w, x, y, z), floats or arrays.
+# @return Components of a*b.
+def _multiply(a, b):
+    aw, ax, ay, az = a
+    bw, bx, by, bz = b
+    return (aw*bw - ax*bx - ay*by - az*bz,
+            aw*bx + ax*bw + ay*bz - az*by,
+            aw*by - ax*bz + ay*bw + az*bx,
+            aw*bz + ax*by - ay*bx + az*bw)
+
+## Multiply quaternions.
+#
+# The product a*b rotates by b, then by a (as the matrix product A*B).
+#
+# @param a, b Quaternions (..., 4).
+# @param out Array to write into, may be a or b.
+# @return Quaternions (..., 4).
+def quatMultiply(a, b, out=None):
+    w, x, y, z = _multiply(_components(a), _components(b))
+    if isinstance(w, float):
+        q = _quatOut(out, (4,))
+        q[...] = (w, x, y, z)
+        return q
+    q = _quatOut(out, np.broadcast_shapes(np.shape(a), np.shape(b)))
+
+    q[..., 0] = w
+    q[..., 1] = x
+    q[..., 2] = y
+    q[..., 3] = z
+
+    return q
+
+## Normalize quaternions.
+#
+# Incremental rotations drift from unit length in float32, so they are
+# normalized after being multiplied.
+#
+# @param q Quaternions (..., 4).
+# @param out Array to write into, may be q.
+# @return Unit quaternions (..., 4).
+def quatNormalize(q, out=None):
+    if np.ndim(q) == 1:
+        w, x, y, z = _components(q)
+        norm = math.sqrt(w*w + x*x + y*y + z*z)
+        q = _quatOut(out, (4,))
+        q[...] = (w/norm, x/norm, y/norm, z/norm)
+        return q
+    q = np.asarray(q)
+    return np.divide(q, np.linalg.norm(q, axis=-1, keepdims=True), out=out)
+
+## Quaternions from Euler angles.
+#
+# @param x, y, z Rotation angles about each axis in radians (...).
+# @param order Axes in the order they are applied: 'xyz' gives the same
+#        rotation as matRotateZ(z)*matRotateY(y)*matRotateX(x).
+# @param out Array to write into.
+# @return Quaternions (..., 4).
+def quatFromEuler(x, y, z, order='xyz', out=None):
+    if all(isinstance(a, (int, float, np.number)) for a in (x, y, z)):
+        angles = {'x': float(x), 'y': float(y), 'z': float(z)}
+        q = (1.0, 0.0, 0.0, 0.0)
+        for axis in order:
+            r = [math.cos(angles[axis]/2), 0.0, 0.0, 0.0]
+            r[1 + 'xyz'.index(axis)] = math.sin(angles[axis]/2)
+            q = _multiply(r, q)
+        out = _quatOut(out, (4,))
+        out[...] = q
+        return out
+
+    angles = {'x': np.asarray(x, dtype='float32'), 'y': np.asarray(y, dtype='float32'),
+              'z': np.asarray(z, dtype='float32')}
+    shape = np.broadcast_shapes(*(a.shape for a in angles.values()))
+    q = _quatOut(out, shape + (4,))
+    q[...] = quatIdentity()
+    for axis in order:
+        # Half angle rotation about one axis: only w and that component.
+        r = np.zeros(shape + (4,), dtype='float32')
+        r[..., 0] = np.cos(angles[axis]/2)
+        r[..., 1 + 'xyz'.index(axis)] = np.sin(angles[axis]/2)
+        quatMultiply(r, q, out=q)
+
+    return q
+
+## Rotation matrices.
+#
+# @param q Unit quaternions (..., 4).
+# @param out (..., 4, 4) array to write into.
+# @return (4,4) or (n,4,4) float32 rotation matrices.
+def quatToMatrix(q, out=None):
+    w, x, y, z = _components(q)
+    rows = ((1 - 2*(y*y + z*z), 2*(x*y - w*z), 2*(x*z + w*y)),
+            (2*(x*y + w*z), 1 - 2*(x*x + z*z), 2*(y*z - w*x)),
+            (2*(x*z - w*y), 2*(y*z + w*x), 1 - 2*(x*x + y*y)))
+    if isinstance(w, float):
+        M = _quatOut(out, (4, 4))
+        M[...] = (rows[0] + (0.0,), rows[1] + (0.0,), rows[2] + (0.0,), (0.0, 0.0, 0.0, 1.0))
+        return M
+    M = _quatOut(out, np.shape(q)[:-1] + (4, 4))
+
+    for i in range(3):
+        for j in range(3):
+            M[..., i, j] = rows[i][j]
+    M[..., :3, 3] = 0.0
+    M[..., 3, :3] = 0.0
+    M[..., 3, 3] = 1.0
+
+    return M
+
+## Spherical linear interpolation.
+#
+# Interpolates along the shorter arc, with a linear interpolation when the
+# quaternions are almost equal.
+#
+# @param a, b Unit quaternions (..., 4).
+# @param t Interpolation parameters in [0,1] (...).
+# @return Unit quaternions (..., 4).
+def quatSlerp(a, b, t):
+    a = np.asarray(a, dtype='float32')
+    b = np.asarray(b, dtype='float32')
+    t = np.asarray(t, dtype='float32')[..., None]
+    dot = np.sum(a*b, axis=-1, keepdims=True)
+    # q and -q are the same rotation.
+    b = np.where(dot < 0, -b, b)
+    dot = np.abs(dot)
+
+    theta = np.arccos(np.clip(dot, -1.0, 1.0))
+    sin = np.sin(theta)
+    close = sin < 1e-4
+    safe = np.where(close, 1.0, sin)
+    wa = np.where(close, 1 - t, np.sin((1 - t)*theta)/safe)
+    wb = np.where(close, t, np.sin(t*theta)/safe)
+
+    return quatNormalize(wa*a + wb*b).astype('float32')
@@ -0,0 +1,250 @@
+## @file scenegraph.py
+# Scene graph.
+#
+# Nodes with a local transformation (translation, rotation quaternion and
+# scale) and a parent, stored as arrays indexed by node: a node is an integer.
+# Local and world matrices are cached. Changing a node only flags it, and
+# update() recomputes the local matrices of the flagged nodes and the world
+# matrices of their subtrees, one batched product per tree level, parents
+# before children. The world matrices are one contiguous (n,4,4) float32
+# array, row-major as the other matrices of utils.py, ready for a bulk upload.
+#
+# A parent is always added before its children, so a node's index is greater
+# than its parent's.
+
+import numpy as np
+import quaternion as qt
+
+## Changed nodes up to which local matrices are built one at a time: array
+# operations on a few quaternions cost more than the arithmetic.
+SMALL_UPDATE = 16
+
+## Scene graph.
+class SceneGraph:
+    ## Create an empty graph.
+    #
+    # @param capacity Nodes allocated up front; the arrays grow as needed.
+    def __init__(self, capacity=64):
+        ## Number of nodes.
+        self.count = 0
+        ## Nodes recomputed by the last update.
+        self.updated = 0
+        self._allocate(capacity)
+        # Children of each node and nodes by level, built when first needed
+        # after nodes are added.
+        self._children = None
+        self._levels = None
+
+    ## Allocate the arrays, keeping the existing nodes.
+    #
+    # @param capacity Number of nodes.
+    def _allocate(self, capacity):
+        n = self.count
+        def resize(name, shape, dtype):
+            array = np.empty((capacity,) + shape, dtype=dtype)
+            if n:
+                array[:n] = getattr(self, name)[:n]
+            setattr(self, name, array)
+        ## Parent of each node, -1 for a root.
+        resize('parent', (), np.int32)
+        ## Depth of each node, 0 for a root.
+        resize('depth', (), np.int32)
+        ## Local translation, rotation (unit quaternion w, x, y, z) and scale.
+        resize('translation', (3,), 'float32')
+        resize('rotation', (4,), 'float32')
+        resize('scale', (3,), 'float32')
+        ## Cached local (T*R*S) and world matrices.
+        resize('local', (4,4), 'float32')
+        resize('world', (4,4), 'float32')
+        ## Nodes whose local transformation changed since the last update.
+        resize('dirty', (), np.bool_)
+        self._marked = np.zeros(capacity, dtype=np.bool_)
+
+    ## Add nodes.
+    #
+    # @param parents Parent of each node, -1 for a root. A parent is an
+    #        existing node or one that comes before in the list.
+    # @param translations Translations (k,3), zero by default.
+    # @param rotations Unit quaternions (k,4), identity by default.
+    # @param scales Scales (k,3), one by default.
+    # @return Indices of the new nodes.
+    def addNodes(self, parents, translations=None, rotations=None, scales=None):
+        parents = np.asarray(parents, dtype=np.int32).reshape(-1)
+        nodes = np.arange(self.count, self.count + len(parents))
+        if np.any(parents >= nodes) or np.any(parents < -1):
+            raise ValueError("A parent must be added before its children")
+        if nodes.size > len(self.parent) - self.count:
+            self._allocate(max(self.count + nodes.size, 2*len(self.parent)))
+
+        self.parent[nodes] = parents
+        self.translation[nodes] = 0.0 if translations is None else translations
+        self.rotation[nodes] = qt.quatIdentity() if rotations is None else rotations
+        self.scale[nodes] = 1.0 if scales is None else scales
+        self.dirty[nodes] = True
+
+        # Depths, a level at a time for parents among the new nodes.
+        roots = parents < 0
+        self.depth[nodes] = 0
+        while True:
+            depth = np.where(roots, 0, self.depth[parents] + 1)
+            if np.array_equal(depth, self.depth[nodes]):
+                break
+            self.depth[nodes] = depth
+
+        self.count += nodes.size
+        self._children = None
+        self._levels = None
+
+        return nodes
+
+    ## Add a node.
+    #
+    # @param parent Parent node, -1 for a root.
+    # @param translation Translation (x, y, z).
+    # @param rotation Unit quaternion (w, x, y, z).
+    # @param scale Scale (x, y, z).
+    # @return Index of the node.
+    def addNode(self, parent=-1, translation=(0.0, 0.0, 0.0), rotation=(1.0, 0.0, 0.0, 0.0),
+                scale=(1.0, 1.0, 1.0)):
+        return int(self.addNodes([parent], [translation], [rotation], [scale])[0])
+
+    ## Set translations.
+    #
+    # @param nodes A node or an array of nodes.
+    # @param translation Translations (3,) or (k,3).
+    def setTranslation(self, nodes, translation):
+        self.translation[nodes] = translation
+        self.dirty[nodes] = True
+
+    ## Set rotations.
+    #
+    # @param nodes A node or an array of nodes.
+    # @param rotation Unit quaternions (4,) or (k,4).
+    def setRotation(self, nodes, rotation):
+        self.rotation[nodes] = rotation
+        self.dirty[nodes] = True
+
+    ## Set scales.
+    #
+    # @param nodes A node or an array of nodes.
+    # @param scale Scales (3,) or (k,3).
+    def setScale(self, nodes, scale):
+        self.scale[nodes] = scale
+        self.dirty[nodes] = True
+
+    ## Children of every node.
+    #
+    # @return Start of each node's children in the list (n+1,), and the list.
+    def _childLists(self):
+        if self._children is None:
+            n = self.count
+            parent = self.parent[:n]
+            # Sorted by parent, the roots (-1) come first and the children of
+            # a node are consecutive.
+            order = np.argsort(parent, kind='stable')
+            roots = np.count_nonzero(parent < 0)
+            start = np.zeros(n + 1, dtype=np.intp)
+            np.cumsum(np.bincount(parent[parent >= 0], minlength=n), out=start[1:])
+            self._children = (start, order[roots:])
+        return self._children
+
+    ## Nodes by level.
+    #
+    # @return List of node arrays, one per depth.
+    def _levelLists(self):
+        if self._levels is None:
+            depth = self.depth[:self.count]
+            order = np.argsort(depth, kind='stable')
+            bounds = np.flatnonzero(np.diff(depth[order])) + 1
+            self._levels = np.split(order, bounds)
+        return self._levels
+
+    ## Subtrees of nodes.
+    #
+    # Walks down from the nodes a level at a time, visiting only their
+    # descendants.
+    #
+    # @param nodes Array of nodes.
+    # @return The nodes and all their descendants, each once.
+    def _subtrees(self, nodes):
+        start, children = self._childLists()
+        marked = self._marked
+        marked[:self.count] = False
+        marked[nodes] = True
+        found = [nodes]
+        frontier = nodes
+        while frontier.size:
+            first = start[frontier]
+            counts = start[frontier + 1] - first
+            total = int(counts.sum())
+            if total == 0:
+                break
+            # Positions first[i], ..., first[i] + counts[i] - 1 of each frontier node.
+            offsets = np.repeat(first - (np.cumsum(counts) - counts), counts) + np.arange(total)
+            frontier = children[offsets]
+            # Changed nodes below other changed nodes are already there.
+            frontier = frontier[~marked[frontier]]
+            marked[frontier] = True
+            found.append(frontier)
+        return np.concatenate(found)
+
+    ## Compute local matrices.
+    #
+    # @param nodes Array of nodes.
+    def _localMatrices(self, nodes):
+        if nodes.size <= SMALL_UPDATE:
+            for i in nodes.tolist():
+                M = qt.quatToMatrix(self.rotation[i], out=self.local[i])
+                M[:3, :3] *= self.scale[i]
+                M[:3, 3] = self.translation[i]
+            return
+        M = qt.quatToMatrix(self.rotation[nodes])
+        # T*R*S: the columns of the rotation scaled, and the translation.
+        M[:, :3, :3] *= self.scale[nodes][:, None, :]
+        M[:, :3, 3] = self.translation[nodes]
+        self.local[nodes] = M
+
+    ## Update the world matrices.
+    #
+    # Recomputes the local matrices of the nodes changed since the last
+    # update, and the world matrices of their subtrees.
+    #
+    # @param full Recompute every node.
+    # @return Number of world matrices recomputed.
+    def update(self, full=False):
+        n = self.count
+        if full:
+            changed = np.arange(n)
+        else:
+            changed = np.flatnonzero(self.dirty[:n])
+        if changed.size == 0:
+            self.updated = 0
+            return 0
+        self._localMatrices(changed)
+        self.dirty[:n] = False
+
+        if full or changed.size == n:
+            levels = self._levelLists()
+            self.updated = n
+        else:
+            nodes = self._subtrees(changed)
+            nodes = nodes[np.argsort(self.depth[nodes], kind='stable')]
+            bounds = np.flatnonzero(np.diff(self.depth[nodes])) + 1
+            levels = np.split(nodes, bounds)
+            self.updated = nodes.size
+
+        # Parents before children, one product per level.
+        for level in levels:
+            parents = self.parent[level]
+            if parents[0] < 0:
+                self.world[level] = self.local[level]
+            else:
+                self.world[level] = np.matmul(self.world[parents], self.local[level])
+
+        return self.updated
+
+    ## World matrices.
+    #
+    # @return (n,4,4) contiguous view of the world matrices, valid until nodes are added.
+    def worldMatrices(self):
+        return self.world[:self.count]
@@ -0,0 +1,112 @@
+## @file streamtex.py
+# Streaming textures.
+#
+# A texture whose content changes every frame (video, camera or sensor feeds)
+# is updated through a ring of pixel buffer objects. Each frame is copied into
+# the next buffer of the ring and glTexSubImage2D reads from that buffer, so
+# the call returns at once and the copy to the texture runs on the GPU while
+# the CPU goes on writing the following frame. A fence after each transfer
+# keeps a buffer from being rewritten while the GPU still reads it.
+# The synchronous path (glTexSubImage2D from client memory) is kept for
+# comparison.
+
+import ctypes
+import time
+import numpy as np
+import OpenGL.GL as gl
+import textures as tex
+
+## Streaming texture.
+class StreamingTexture:
+    ## Create the texture and the ring of pixel buffers.
+    #
+    # @param width, height Size of the frames.
+    # @param channels Channels of the frames (3 or 4).
+    # @param ring_size Number of pixel buffers, 0 uploads from client memory.
+    def __init__(self, width, height, channels=3, ring_size=3):
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.frame_bytes = width*height*channels
+        ## Frames uploaded, their bytes, seconds spent in update and in fence waits.
+        self.frames = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.wait_seconds = 0.0
+
+        self.texture = gl.glGenTextures(1)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_EDGE)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_EDGE)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, tex.unpackAlignment(width*channels))
+        gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, tex.FORMATS[channels], width, height, 0,
+                        tex.FORMATS[channels], gl.GL_UNSIGNED_BYTE, None)
+
+        self.buffers = list(np.atleast_1d(gl.glGenBuffers(ring_size))) if ring_size > 0 else []
+        self.fences = [None]*len(self.buffers)
+        self.next = 0
+        for buffer in self.buffers:
+            gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, buffer)
+            gl.glBufferData(gl.GL_PIXEL_UNPACK_BUFFER, self.frame_bytes, None, gl.GL_STREAM_DRAW)
+        gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, 0)
+
+    ## Upload a frame.
+    #
+    # @param frame Pixels (height, width, channels), uint8.
+    def update(self, frame):
+        start = time.perf_counter()
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        if frame.nbytes != self.frame_bytes:
+            raise ValueError("Frame of %d bytes for a %dx%dx%d texture"
+                             % (frame.nbytes, self.width, self.height, self.channels))
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.texture)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, tex.unpackAlignment(self.width*self.channels))
+        format = tex.FORMATS[self.channels]
+
+        if not self.buffers:
+            gl.glTexSubImage2D(gl.GL_TEXTURE_2D, 0, 0, 0, self.width, self.height, format, gl.GL_UNSIGNED_BYTE, frame)
+        else:
+            slot = self.next
+            self.next = (slot + 1) % len(self.buffers)
+
+            # Wait until the GPU is done with the transfer that used this buffer.
+            if self.fences[slot] is not None:
+                wait = time.perf_counter()
+                while gl.glClientWaitSync(self.fences[slot], gl.GL_SYNC_FLUSH_COMMANDS_BIT,
+                                          10**8) == gl.GL_TIMEOUT_EXPIRED:
+                    pass
+                gl.glDeleteSync(self.fences[slot])
+                self.fences[slot] = None
+                self.wait_seconds += time.perf_counter() - wait
+
+            gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, self.buffers[slot])
+            pointer = gl.glMapBufferRange(gl.GL_PIXEL_UNPACK_BUFFER, 0, self.frame_bytes,
+                                          gl.GL_MAP_WRITE_BIT | gl.GL_MAP_INVALIDATE_BUFFER_BIT)
+            ctypes.memmove(pointer, frame.ctypes.data, self.frame_bytes)
+            gl.glUnmapBuffer(gl.GL_PIXEL_UNPACK_BUFFER)
+            # With a pixel buffer bound, the data argument is an offset into it.
+            gl.glTexSubImage2D(gl.GL_TEXTURE_2D, 0, 0, 0, self.width, self.height, format, gl.GL_UNSIGNED_BYTE,
+                               ctypes.c_void_p(0))
+            self.fences[slot] = gl.glFenceSync(gl.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+            gl.glBindBuffer(gl.GL_PIXEL_UNPACK_BUFFER, 0)
+
+        self.frames += 1
+        self.bytes += self.frame_bytes
+        self.seconds += time.perf_counter() - start
+
+    ## Throughput of update, in MB/s.
+    def throughput(self):
+        return self.bytes/2**20/self.seconds if self.seconds > 0 else 0.0
+
+    ## Free the texture, the buffers and the fences.
+    def delete(self):
+        for fence in self.fences:
+            if fence is not None:
+                gl.glDeleteSync(fence)
+        if self.buffers:
+            gl.glDeleteBuffers(len(self.buffers), self.buffers)
+        gl.glDeleteTextures([self.texture])
+        self.buffers = []
+        self.fences = []
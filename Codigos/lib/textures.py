@@ -0,0 +1,89 @@
+## @file textures.py
+# Texture loading.
+#
+# Images are read into contiguous uint8 arrays through the buffer protocol
+# (np.asarray on the PIL image), without a Python object per pixel, and handed
+# to OpenGL with the unpack alignment that matches their rows. Pillow releases
+# the GIL while decoding, so several images decode in parallel on threads;
+# uploads stay on the thread that owns the GL context.
+
+import numpy as np
+import OpenGL.GL as gl
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+
+## GL pixel format of each number of channels.
+FORMATS = {1: gl.GL_RED, 2: gl.GL_RG, 3: gl.GL_RGB, 4: gl.GL_RGBA}
+
+## Read image.
+#
+# Modes other than RGB and RGBA (palette, grayscale, CMYK, ...) are converted
+# to RGBA when they have transparency and to RGB otherwise.
+#
+# @param path Image file.
+# @return Pixels as a contiguous uint8 array (height, width, channels).
+def readImage(path):
+    with Image.open(path) as img:
+        if img.mode not in ('RGB', 'RGBA'):
+            transparent = 'A' in img.mode or 'transparency' in img.info
+            img = img.convert('RGBA' if transparent else 'RGB')
+        data = np.asarray(img)
+    return np.ascontiguousarray(data, dtype=np.uint8)
+
+## Read images.
+#
+# @param paths Image files.
+# @param workers Decoding threads, 1 decodes in order on the calling thread.
+# @return Pixels of each image, as returned by readImage.
+def readImages(paths, workers=None):
+    paths = list(paths)
+    workers = len(paths) if workers is None else workers
+    if workers <= 1 or len(paths) <= 1:
+        return [readImage(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        return list(pool.map(readImage, paths))
+
+## Check cube map faces.
+#
+# Reads only the headers, so a bad face fails before any decoding.
+#
+# @param paths Files of the six faces.
+# @return Side of the faces in pixels.
+def checkCubemap(paths):
+    if len(paths) != 6:
+        raise ValueError("A cube map needs 6 faces, got %d" % len(paths))
+    sizes = []
+    for path in paths:
+        with Image.open(path) as img:
+            if img.size[0] != img.size[1]:
+                raise ValueError("Cube map face %s is not square: %dx%d" % (path, img.size[0], img.size[1]))
+            sizes.append((img.size[0], img.mode))
+    if len(set(sizes)) > 1:
+        raise ValueError("Cube map faces differ in size or mode: " +
+                         ", ".join("%s %dpx %s" % (path, size, mode) for path, (size, mode) in zip(paths, sizes)))
+    return sizes[0][0]
+
+## Unpack alignment.
+#
+# @param row_bytes Bytes per row of pixels.
+# @return Largest alignment accepted by OpenGL that divides the rows.
+def unpackAlignment(row_bytes):
+    for alignment in (8, 4, 2):
+        if row_bytes % alignment == 0:
+            return alignment
+    return 1
+
+## Upload image.
+#
+# Calls glTexImage2D for the texture bound to the target.
+#
+# @param target Texture target (GL_TEXTURE_2D or a cube map face).
+# @param data Pixels (height, width, channels) as returned by readImage.
+# @param level Mipmap level.
+def texImage2D(target, data, level=0):
+    data = np.ascontiguousarray(data, dtype=np.uint8)
+    height, width = data.shape[:2]
+    channels = data.shape[2] if data.ndim == 3 else 1
+    gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, unpackAlignment(width*channels))
+    gl.glTexImage2D(target, level, FORMATS[channels], width, height, 0,
+                    FORMATS[channels], gl.GL_UNSIGNED_BYTE, data)
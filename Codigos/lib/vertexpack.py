@@ -0,0 +1,159 @@
+## @file vertexpack.py
+# Packed vertex formats.
+#
+# Positions are quantized to 16 bits per coordinate against a bounding box,
+# normals are stored octahedral-encoded in two 16-bit snorms (or as 10:10:10:2
+# snorms) and texture coordinates as half floats. The GPU turns the integers
+# back into [0,1] or [-1,1] floats (normalized attributes), and the vertex
+# shader applies the box and decodes the octahedral normal (see DECODE_GLSL).
+
+import numpy as np
+import OpenGL.GL as gl
+from ctypes import c_void_p
+
+## Normal formats.
+OCTAHEDRAL = 'oct16'
+SNORM_1010102 = '1010102'
+
+## GLSL that decodes packed attributes, defined when a PACKED_* macro is set.
+DECODE_GLSL = """
+#ifdef PACKED
+uniform vec3 positionOffset;
+uniform vec3 positionScale;
+
+vec3 decodePosition(vec3 p)
+{
+    return positionOffset + p*positionScale;
+}
+#endif
+
+#ifdef PACKED_OCTAHEDRAL
+vec3 octDecode(vec2 e)
+{
+    vec3 n = vec3(e, 1.0 - abs(e.x) - abs(e.y));
+    float t = max(-n.z, 0.0);
+    n.x += n.x >= 0.0 ? -t : t;
+    n.y += n.y >= 0.0 ? -t : t;
+    return normalize(n);
+}
+#endif
+"""
+
+## Quantize positions.
+#
+# @param positions Positions, (N,3).
+# @param lo, hi Corners of a box holding every position.
+# @return Coordinates as 16-bit fractions of the box, (N,4) (w is unused padding).
+def quantizePositions(positions, lo, hi):
+    lo = np.asarray(lo, dtype=np.float64)
+    extent = np.asarray(hi, dtype=np.float64) - lo
+    extent[extent == 0] = 1.0
+    quantized = np.zeros((len(positions), 4), dtype=np.uint16)
+    quantized[:, :3] = np.clip(np.rint((positions - lo)/extent*65535.0), 0, 65535)
+    return quantized
+
+## Octahedral encoding.
+#
+# Projects unit vectors on the octahedron |x| + |y| + |z| = 1 and folds the
+# lower half over the upper one.
+#
+# @param normals Normals, (N,3).
+# @return Two snorm16 per normal, (N,2).
+def octEncode(normals):
+    normals = np.asarray(normals, dtype=np.float64)
+    l1 = np.abs(normals).sum(axis=1, keepdims=True)
+    e = np.divide(normals[:, :2], l1, out=np.zeros((len(normals), 2)), where=l1 > 0)
+    lower = (normals[:, 2] < 0)[:, None]
+    sign = np.where(e >= 0, 1.0, -1.0)
+    e = np.where(lower, (1.0 - np.abs(e[:, ::-1]))*sign, e)
+    return np.rint(np.clip(e, -1.0, 1.0)*32767.0).astype(np.int16)
+
+## Octahedral decoding (same as the GLSL one).
+#
+# @param encoded Two snorm16 per normal, (N,2).
+# @return Unit normals, (N,3).
+def octDecode(encoded):
+    e = np.maximum(np.asarray(encoded, dtype=np.float64)/32767.0, -1.0)
+    n = np.empty((len(e), 3))
+    n[:, :2] = e
+    n[:, 2] = 1.0 - np.abs(e).sum(axis=1)
+    t = np.maximum(-n[:, 2], 0.0)[:, None]
+    n[:, :2] += np.where(n[:, :2] >= 0, -t, t)
+    return n/np.linalg.norm(n, axis=1, keepdims=True)
+
+## Pack normals in 10:10:10:2 snorms.
+#
+# @param normals Normals, (N,3).
+# @return One GL_INT_2_10_10_10_REV word per normal, (N,).
+def pack1010102(normals):
+    normals = np.asarray(normals, dtype=np.float64)
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    n = np.divide(normals, length, out=np.zeros_like(normals), where=length > 0)
+    q = np.rint(np.clip(n, -1.0, 1.0)*511.0).astype(np.int64) & 0x3ff
+    return (q[:, 0] | (q[:, 1] << 10) | (q[:, 2] << 20)).astype(np.uint32)
+
+## Pack vertices.
+#
+# @param positions Positions, (N,3).
+# @param normals Normals, (N,3).
+# @param lo, hi Box holding every position.
+# @param texcoords Optional texture coordinates, (N,2).
+# @param normal_format OCTAHEDRAL or SNORM_1010102.
+# @return Interleaved vertices as bytes (N, stride) and the attribute layout,
+#         a list of (location, components, GL type, normalized, offset).
+def packVertices(positions, normals, lo, hi, texcoords=None, normal_format=OCTAHEDRAL):
+    fields = [('position', np.uint16, (4,))]
+    if normal_format == OCTAHEDRAL:
+        fields.append(('normal', np.int16, (2,)))
+    elif normal_format == SNORM_1010102:
+        fields.append(('normal', np.uint32))
+    else:
+        raise ValueError("Unknown normal format: " + str(normal_format))
+    if texcoords is not None:
+        fields.append(('texcoord', np.float16, (2,)))
+
+    packed = np.empty(len(positions), dtype=np.dtype(fields))
+    packed['position'] = quantizePositions(positions, lo, hi)
+    if normal_format == OCTAHEDRAL:
+        packed['normal'] = octEncode(normals)
+        layout = [(0, 3, gl.GL_UNSIGNED_SHORT, gl.GL_TRUE, 0), (1, 2, gl.GL_SHORT, gl.GL_TRUE, 8)]
+    else:
+        packed['normal'] = pack1010102(normals)
+        layout = [(0, 3, gl.GL_UNSIGNED_SHORT, gl.GL_TRUE, 0), (1, 4, gl.GL_INT_2_10_10_10_REV, gl.GL_TRUE, 8)]
+    if texcoords is not None:
+        packed['texcoord'] = texcoords
+        layout.append((2, 2, gl.GL_HALF_FLOAT, gl.GL_FALSE, 12))
+
+    return packed.view(np.uint8).reshape(len(positions), packed.itemsize), layout
+
+## Set attributes.
+#
+# Points the attributes of the bound vertex array at the bound buffer.
+#
+# @param layout Attribute layout returned by packVertices.
+# @param stride Bytes per vertex.
+def setAttributes(layout, stride):
+    for location, components, type_, normalized, offset in layout:
+        gl.glVertexAttribPointer(location, components, type_, normalized, stride, c_void_p(offset))
+        gl.glEnableVertexAttribArray(location)
+
+## Shader defines.
+#
+# @param code Shader code starting with a #version line.
+# @param defines Macro names to define after it.
+# @return Code with the macros and DECODE_GLSL after the #version line.
+def shaderDefines(code, defines):
+    version, rest = code.lstrip().split('\n', 1)
+    header = ''.join('#define %s\n' % name for name in defines)
+    return version + '\n' + header + DECODE_GLSL + rest
+
+## Uniforms of the position box.
+#
+# @param program Shader program (in use).
+# @param lo, hi Box the positions were quantized against.
+def setPositionBox(program, lo, hi):
+    lo = np.asarray(lo, dtype=np.float64)
+    extent = np.asarray(hi, dtype=np.float64) - lo
+    extent[extent == 0] = 1.0
+    gl.glUniform3f(gl.glGetUniformLocation(program, "positionOffset"), *lo)
+    gl.glUniform3f(gl.glGetUniformLocation(program, "positionScale"), *extent)
@@ -264,52 +264,29 @@ def keyboard(key, x, y):
 
 ## Init data.
 def loadColors(tam):
-    object_ = []
-    global colors_
-    for i in range(int(tam/3)):
-        object_.append(colors_[(i*3)%len(colors_)])
-        object_.append(colors_[(i*3+1)%len(colors_)])
-        object_.append(colors_[(i*3+2)%len(colors_)])
-        
-    return object_ 
+    return np.resize(colors_.reshape(-1, 3), (tam, 3))
     
 def normalizeObj(obj, max_coord):
-    for i in range(len(obj)):
-        obj[i] = obj[i] / max_coord
+    obj /= max_coord
     return obj
 
     
 def loadObject(object_file):
     print("loading ", object_file)
     scene = pywavefront.Wavefront(object_file, collect_faces=True)
-    object_ = []
-    max_coord = 0
-    for mesh in scene.mesh_list:
-        for face in mesh.faces:
-            for vertex_i in face:
-                x, y, z = scene.vertices[vertex_i]
-                object_.append(x)
-                object_.append(y)
-                object_.append(z)
-                max_coord = max(max_coord, x, y, z)
+    faces = np.concatenate([np.asarray(mesh.faces, dtype=np.int64).ravel() for mesh in scene.mesh_list])
+    object_ = np.asarray(scene.vertices, dtype=np.float64)[faces]
+    max_coord = max(0, object_.max())
     
     object_ = normalizeObj(object_, max_coord)
     
     if(not USE_COLORS):
-        return np.array(object_, dtype='float32')  
+        return np.ascontiguousarray(object_, dtype='float32')
     
     colors = loadColors(len(object_))
-    obj_colored = []
-    
-    for i in range (int(len(object_)/3)):
-        obj_colored.append(object_[i*3])
-        obj_colored.append(object_[i*3+1])
-        obj_colored.append(object_[i*3+2])
-        obj_colored.append(colors[i*3])
-        obj_colored.append(colors[i*3+1])
-        obj_colored.append(colors[i*3+2])
-        
-    object_np = np.array(obj_colored, dtype='float32')
+    object_np = np.empty((len(object_), 6), dtype='float32')
+    object_np[:, :3] = object_
+    object_np[:, 3:] = colors
 
     return object_np 
 
@@ -4,20 +4,42 @@
 ##########################################################
 
 import sys
+import os
 import ctypes
 import numpy as np
 import OpenGL.GL as gl
 import OpenGL.GLUT as glut
 sys.path.append('../lib/')
 import utils as ut
-from PIL import Image
+import textures as tex
+import texcache as tc
+import residency as res
+import envmap as em
 from ctypes import c_void_p
-import pywavefront
+import objloader as objl
+import meshcache as mcache
+import normals as nrm
+import simplify as simp
+import reorder as ro
+import vertexpack as vp
+import quaternion as qt
 import random
 import math
+import time
+import threading
+import queue
+import traceback
 
 texture_file = None
-texture = None
+## Cube map directories or equirectangular panoramas (argv[2], separated by
+# commas), 'c' switches between them.
+texture_files = []
+## Cube map shown.
+current_cubemap = 0
+## Video memory the cube maps may use, in bytes.
+texture_budget = 256*1024**2
+## Texture manager of the cube maps.
+texture_manager = None
 
 ## Window setup
 win_width  = 800
@@ -29,6 +51,8 @@ program = None
 VAO = None
 ## Vertex buffer object.
 VBO = None
+## Element buffer object.
+EBO = None
 
 #Translation
 translation_x = 0.0
@@ -49,23 +73,93 @@ angle_x = 0.0
 angle_y = 0.0
 angle_z = 0.0
 angle_inc = 1.0
+## Rotation of the angles above, rebuilt when they change.
+orientation = qt.quatIdentity()
 
 ## Modes
 transformacao = 0 #ROTACAO, TRANSLACAO, ESCALA
 visualizacao = "FACES" #FACES, WIREFRAME
 modo = 0.0 # 0.0 - Nada, 1.0 - Iluminacao, 2.0 - Textura
 
+## Background loading: the object is loaded on a worker thread and its buffers
+# are queued in slices of stream_slice bytes, uploaded by the GL thread every
+# upload_interval milliseconds for at most upload_budget seconds.
+stream_slice = 1 << 20
+upload_interval = 10
+upload_budget = 0.004
+## Messages from the loading thread.
+load_queue = queue.Queue(maxsize=16)
+## True until every slice is uploaded.
+loading = False
+## True while the drawn buffers are being filled.
+growing = False
+## Vertices and indexes uploaded so far.
+loaded_vertices = 0
+loaded_indices = 0
+## Buffers being filled (vertex array, vertex and element buffers) and
+# their 'begin' message.
+upload_buffers = None
+upload_begin = None
+## Largest vertex used by each triangle of the full level and those before it.
+ready_vertices = np.array([], dtype='uint32')
+## Time the loading started.
+load_start = 0.0
+
+## Normals generated for objects without normals.
+normal_weighting = 'angle' # 'area', 'angle'
+crease_angle = None # degrees, None to smooth every edge
+
+## Reorder triangles and vertices for the vertex cache and overdraw (see
+# reorder.py; meshes above reorder.TIPSIFY_MAX_TRIANGLES get a faster
+# spatial order). Done once, on the first load of a file, and kept in the
+# mesh cache; MESH_REORDER=0 skips it.
+reorder_faces = os.environ.get('MESH_REORDER', '1') != '0'
+
+## Levels of detail, fraction of the triangles of each simplified level, ()
+# or None to draw the full mesh only. Simplifying takes tens of seconds per
+# million triangles, so the levels are built once, on the first load of a
+# file, and kept in the mesh cache with the vertex buffer; later loads read
+# them back. Large meshes can be cached ahead of time by calling loadObject
+# from a script.
+lod_ratios = (0.5, 0.25, 0.1, 0.02)
+## Screen area per triangle used to pick a level, in pixels.
+lod_pixels_per_triangle = 8.0
+## Forced level, -1 picks it from the screen size.
+lod_forced = -1
+## Number of indexes of each level (the first one is the full mesh).
+lod_counts = []
+## Bounding sphere radius of the normalized mesh.
+radius = 1.0
+## Frames and seconds drawn with each level (seconds only with frame_timing).
+lod_stats = {}
+## Time frames and uploads (see utils.frameTiming).
+frame_timing = ut.frameTiming()
+
+## Vertex format: 'float' (32-bit floats), vp.OCTAHEDRAL or vp.SNORM_1010102
+# (16-bit positions in the bounding box and packed normals, decoded in the shader).
+vertex_format = 'float'
+## Box the packed positions are quantized against (normalized coordinates).
+position_box = None
+## Bytes per vertex in the vertex buffer.
+vertex_bytes = 0
+
 vertices = np.array([], dtype='float32')
+indices = np.array([], dtype='uint32')
 
 ## Vertex shader.
 vertex_code = """
 #version 330 core
 layout (location = 0) in vec3 position;
+#ifdef PACKED_OCTAHEDRAL
+layout (location = 1) in vec2 packedNormal;
+#else
 layout (location = 1) in vec3 normal;
+#endif
 
 uniform mat4 model;
 uniform mat4 view;
 uniform mat4 projection;
+uniform mat3 normalMatrix;
 
 out vec3 vNormal;
 out vec3 fragPosition;
@@ -73,10 +167,20 @@ out vec3 aTexture;
 
 void main()
 {
-    gl_Position = projection * view * model * vec4(position, 1.0);
-    vNormal = mat3(transpose(inverse(model))) * normal;
-    fragPosition = vec3(model * vec4(position, 1.0));
-    aTexture = normal;//vNormal;
+#ifdef PACKED
+    vec3 p = decodePosition(position);
+#else
+    vec3 p = position;
+#endif
+#ifdef PACKED_OCTAHEDRAL
+    vec3 n = octDecode(packedNormal);
+#else
+    vec3 n = normal;
+#endif
+    gl_Position = projection * view * model * vec4(p, 1.0);
+    vNormal = normalMatrix * n;
+    fragPosition = vec3(model * vec4(p, 1.0));
+    aTexture = n;//vNormal;
 }
 """
 
@@ -129,83 +233,142 @@ void main()
 }
 """
 
+## Cube map faces: target and file of each one.
+cubemap_faces = [
+    (gl.GL_TEXTURE_CUBE_MAP_POSITIVE_X, "right.jpg"),
+    (gl.GL_TEXTURE_CUBE_MAP_NEGATIVE_X, "left.jpg"),
+    (gl.GL_TEXTURE_CUBE_MAP_POSITIVE_Y, "top.jpg"),
+    (gl.GL_TEXTURE_CUBE_MAP_NEGATIVE_Y, "bottom.jpg"),
+    (gl.GL_TEXTURE_CUBE_MAP_POSITIVE_Z, "front.jpg"),
+    (gl.GL_TEXTURE_CUBE_MAP_NEGATIVE_Z, "back.jpg"),
+]
+
+## Threads decoding the cube map faces, 1 decodes them in order.
+texture_workers = min(6, os.cpu_count() or 1)
+
+## Side of the faces converted from a panorama, None for a quarter of its width.
+panorama_face_size = None
+
+## Time main started, and whether a frame was drawn since.
+start_time = 0.0
+first_frame = False
+
+## Read cube map.
+#
+# @param texture_file Directory of the faces, or equirectangular panorama.
+# @return Texture name.
 def read_texture(texture_file):
-    global texture
+    # Faces are checked, decoded in parallel (or read from the texture
+    # cache), then uploaded on this thread. Panoramas are converted to faces
+    # on the same threads, and the faces cached.
+    start = time.perf_counter()
+    if os.path.isfile(texture_file):
+        faces, cached = em.loadEquirectCubemap(texture_file, panorama_face_size, texture_workers)
+        faces = [([face], cached) for face in faces]
+    else:
+        paths = [texture_file + "/" + name for target, name in cubemap_faces]
+        tex.checkCubemap(paths)
+        faces = tc.loadTextures(paths, texture_workers, mipmaps=False)
+    size = faces[0][0][0].shape[0]
+    loaded = time.perf_counter()
 
-    img1 = Image.open(texture_file + "/right.jpg")
-    img_data1 = np.array(list(img1.getdata()), np.int8)
-    
-    img2 = Image.open(texture_file + "/left.jpg")
-    img_data2 = np.array(list(img2.getdata()), np.int8)
-    
-    img3 = Image.open(texture_file + "/top.jpg")
-    img_data3 = np.array(list(img3.getdata()), np.int8)
-    
-    img4 = Image.open(texture_file + "/bottom.jpg")
-    img_data4 = np.array(list(img4.getdata()), np.int8)
-    
-    img5 = Image.open(texture_file + "/front.jpg")
-    img_data5 = np.array(list(img5.getdata()), np.int8)
-    
-    img6 = Image.open(texture_file + "/back.jpg")
-    img_data6 = np.array(list(img6.getdata()), np.int8)
-    
     texture = gl.glGenTextures(1)
     gl.glBindTexture(gl.GL_TEXTURE_CUBE_MAP, texture)
 
-    format = gl.GL_RGB if img1.mode == "RGB" else gl.GL_RGBA   # if the texture is jpg or png
-    
-    gl.glTexImage2D(gl.GL_TEXTURE_CUBE_MAP_POSITIVE_X, 0, gl.GL_RGB, img1.size[0], img1.size[1], 0, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, img_data1)
-    gl.glTexImage2D(gl.GL_TEXTURE_CUBE_MAP_NEGATIVE_X, 0, gl.GL_RGB, img1.size[0], img1.size[1], 0, format, gl.GL_UNSIGNED_BYTE, img_data2)
-    gl.glTexImage2D(gl.GL_TEXTURE_CUBE_MAP_POSITIVE_Y, 0, gl.GL_RGB, img1.size[0], img1.size[1], 0, format, gl.GL_UNSIGNED_BYTE, img_data3)
-    gl.glTexImage2D(gl.GL_TEXTURE_CUBE_MAP_NEGATIVE_Y, 0, gl.GL_RGB, img1.size[0], img1.size[1], 0, format, gl.GL_UNSIGNED_BYTE, img_data4)
-    gl.glTexImage2D(gl.GL_TEXTURE_CUBE_MAP_POSITIVE_Z, 0, gl.GL_RGB, img1.size[0], img1.size[1], 0, format, gl.GL_UNSIGNED_BYTE, img_data5)
-    gl.glTexImage2D(gl.GL_TEXTURE_CUBE_MAP_NEGATIVE_Z, 0, gl.GL_RGB, img1.size[0], img1.size[1], 0, format, gl.GL_UNSIGNED_BYTE, img_data6)
+    for (target, name), (levels, cached) in zip(cubemap_faces, faces):
+        tc.texImageLevels(target, levels)
+    if frame_timing:
+        gl.glFinish()
+    print("cube map: 6 faces of %d px, %s start, loaded in %.3f s (%d threads), %s in %.3f s"
+          % (size, "warm" if all(cached for levels, cached in faces) else "cold", loaded - start,
+             texture_workers, "uploaded" if frame_timing else "submitted", time.perf_counter() - loaded))
     
     gl.glTexParameteri(gl.GL_TEXTURE_CUBE_MAP, gl.GL_TEXTURE_MAG_FILTER, gl.GL_LINEAR)
     gl.glTexParameteri(gl.GL_TEXTURE_CUBE_MAP, gl.GL_TEXTURE_MIN_FILTER, gl.GL_LINEAR)
     gl.glTexParameteri(gl.GL_TEXTURE_CUBE_MAP, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_EDGE)
     gl.glTexParameteri(gl.GL_TEXTURE_CUBE_MAP, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_EDGE)
     gl.glTexParameteri(gl.GL_TEXTURE_CUBE_MAP, gl.GL_TEXTURE_WRAP_R, gl.GL_CLAMP_TO_EDGE)
-    
+    return texture
+
+## Register cube maps.
+#
+# Faces are only checked here, each cube map is loaded when first shown and
+# may be evicted and reloaded (from the texture cache) later.
+#
+# @param directories Directories of the faces or panorama files.
+def addCubemaps(directories):
+    global texture_manager
+    texture_manager = res.TextureManager(texture_budget)
+    for directory in directories:
+        if os.path.isfile(directory):
+            size = em.faceSize(directory, panorama_face_size)
+        else:
+            size = tex.checkCubemap([directory + "/" + name for target, name in cubemap_faces])
+        texture_manager.add(directory, lambda directory=directory: read_texture(directory),
+                            res.estimateBytes(size, size, 3, faces=6))
+
+## Matrices of display, written in place every frame.
+frame_matrices = {name: ut.matIdentity() for name in ('T', 'R', 'S', 'M', 'tmp', 'view', 'projection')}
+frame_matrices['normal'] = np.zeros((3,3), dtype='float32')
+
+## Update orientation.
+#
+# Rebuilds the rotation quaternion from the angles (x applied first, then y
+# and z), in place.
+def updateOrientation():
+    qt.quatFromEuler(math.radians(angle_x), math.radians(angle_y), math.radians(angle_z), 'xyz', out=orientation)
+
 ## Display function
 def display():
 
-    global vertices
+    global indices, first_frame
+    start = time.perf_counter()
     gl.glClearColor(0.2, 0.3, 0.3, 1.0)
     gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
+    if not first_frame:
+        if frame_timing:
+            gl.glFinish()
+        first_frame = True
+        print("first frame after %.3f s" % (time.perf_counter() - start_time))
+    if VAO is None:
+        glut.glutSwapBuffers()
+        return
 
-    gl.glBindTexture(gl.GL_TEXTURE_CUBE_MAP, texture)
+    texture_manager.bind(texture_files[current_cubemap], gl.GL_TEXTURE_CUBE_MAP)
 
     gl.glUseProgram(program)
     gl.glBindVertexArray(VAO)
 
+    # Matrices are written in place and products alternate between two
+    # buffers, so a frame allocates no arrays.
+    m = frame_matrices
     # Translation. 
-    T  = ut.matTranslate(translation_x, translation_y, translation_z)
-    # Rotation around z-axis.
-    Rx = ut.matRotateX(np.radians(angle_x)) 
-    Ry = ut.matRotateY(np.radians(angle_y)) 
-    Rz = ut.matRotateZ(np.radians(angle_z)) 
+    T  = ut.matTranslate(translation_x, translation_y, translation_z, out=m['T'])
+    # Rotation, in one step from the quaternion.
+    R  = qt.quatToMatrix(orientation, out=m['R'])
     # Scale.
-    S  = ut.matScale(scale_x, scale_y, scale_z)
+    S  = ut.matScale(scale_x, scale_y, scale_z, out=m['S'])
     
-    M = np.matmul(Ry,Rx)
-    M = np.matmul(Rz,M)
-    M = np.matmul(S, M)
-    M = np.matmul(T,M)
+    M = np.matmul(S, R, out=m['M'])
+    M = np.matmul(T, M, out=m['tmp'])
     
     # Retrieve locatiovisualizacao_texturan of tranform variable in shader.
     loc = gl.glGetUniformLocation(program, "model")
-    # Send matrix to shader.
-    gl.glUniformMatrix4fv(loc, 1, gl.GL_FALSE, M.transpose())
+    # Send matrix to shader (row-major, transposed by OpenGL).
+    ut.setUniformMatrix(loc, M)
+    
+    # Normal matrix, once per draw instead of inverse(model) per vertex.
+    N = ut.matNormal(M, out=m['normal'])
+    loc = gl.glGetUniformLocation(program, "normalMatrix")
+    ut.setUniformMatrix(loc, N)
     
-    view = ut.matTranslate(0.0, 0.0, t_z)
+    view = ut.matTranslate(0.0, 0.0, t_z, out=m['view'])
     loc = gl.glGetUniformLocation(program, "view")
-    gl.glUniformMatrix4fv(loc, 1, gl.GL_FALSE, view.transpose())
+    ut.setUniformMatrix(loc, view)
     
-    projection = ut.matPerspective(np.radians(45.0), win_width/win_height, 0.1, 100.0)
+    projection = ut.matPerspective(math.radians(45.0), win_width/win_height, 0.1, 100.0, out=m['projection'])
     loc = gl.glGetUniformLocation(program, "projection")
-    gl.glUniformMatrix4fv(loc, 1, gl.GL_FALSE, projection.transpose())
+    ut.setUniformMatrix(loc, projection)
 
     # Object color.
     loc = gl.glGetUniformLocation(program, "objectColor")
@@ -228,9 +391,44 @@ def display():
     elif (visualizacao == "WIREFRAME"):
         gl.glPolygonMode(gl.GL_FRONT_AND_BACK, gl.GL_LINE)
         
-    gl.glDrawArrays(gl.GL_TRIANGLES, 0, len(vertices))
+    if growing:
+        # Triangles of the full level whose vertices and indexes are uploaded.
+        level = 0
+        count = 3*min(loaded_indices//3, int(np.searchsorted(ready_vertices, loaded_vertices)))
+    else:
+        level = lod_forced if lod_forced >= 0 else selectLod(M, view, projection)
+        count = lod_counts[level]
+    index_type = gl.GL_UNSIGNED_SHORT if indices.dtype == np.uint16 else gl.GL_UNSIGNED_INT
+    offset = sum(lod_counts[:level])*indices.itemsize
+    gl.glDrawElements(gl.GL_TRIANGLES, count, index_type, c_void_p(offset))
     glut.glutSwapBuffers()
 
+    if loading:
+        return
+    frames, seconds = lod_stats.get(level, (0, 0.0))
+    if frame_timing:
+        # Frame time includes the GPU work.
+        gl.glFinish()
+        seconds += time.perf_counter() - start
+    lod_stats[level] = (frames + 1, seconds)
+
+## Select level of detail.
+#
+# Projects the bounding sphere of the mesh with the current matrices.
+def selectLod(M, view, projection):
+    # Depth of the object origin and largest axis scale, without temporary arrays.
+    depth = -float(np.dot(view[2], M[:, 3]))
+    scale = max(math.sqrt(M[0, k]*M[0, k] + M[1, k]*M[1, k] + M[2, k]*M[2, k]) for k in range(3))
+    pixels = simp.projectedRadius(radius*scale, depth, projection, win_height)
+    return simp.selectLod([count//3 for count in lod_counts], pixels, lod_pixels_per_triangle)
+
+def printLodStats():
+    print("Vertex format: %s, %d bytes per vertex" % (vertex_format, vertex_bytes))
+    for level in sorted(lod_stats):
+        frames, seconds = lod_stats[level]
+        print("LOD %d: %d triangles, %d frames" % (level, lod_counts[level]//3, frames)
+              + (", %.2f ms per frame" % (1000*seconds/frames) if frame_timing else ""))
+
 ## Reshape function.
 def reshape(width,height):
 
@@ -248,6 +446,10 @@ def printInformation():
         print("Iluminacao selecionada: Iluminacao")
     elif(modo == 2):
         print("Iluminacao selecionada: Textura")
+    print("LOD: ", "auto" if lod_forced < 0 else lod_forced)
+    printLodStats()
+    print("cube map: %s" % texture_files[current_cubemap])
+    print(texture_manager.stats())
 
     if(transformacao == "TRANSLACAO"):
         print("translacao x: ", translation_x)
@@ -333,9 +535,11 @@ def applyTransfromation(key):
       
 def keyboard(key, x, y):
 
-    global type_primitive, transformacao, visualizacao
+    global type_primitive, transformacao, visualizacao, lod_forced, current_cubemap
     
     if key == b'\x1b' or key == b'q':
+        printLodStats()
+        print(texture_manager.stats())
         glut.glutLeaveMainLoop()
     
     print("key:", key)
@@ -348,6 +552,12 @@ def keyboard(key, x, y):
     elif key == b'e':
         transformacao = "ESCALA"    
         
+    if key == b'c':
+        current_cubemap = (current_cubemap + 1) % len(texture_files)
+
+    if key == b'l':
+        lod_forced = lod_forced + 1 if lod_forced + 1 < len(lod_counts) else -1
+
     if key == b'v':
         if(visualizacao == "FACES"):
             visualizacao = "WIREFRAME"
@@ -356,161 +566,349 @@ def keyboard(key, x, y):
         
     if(hasTransformation):
         applyTransfromation(key)
+        updateOrientation()
     
     printInformation()
     glut.glutPostRedisplay()
 
 ## Init data.
-def normalizeObject(obj, max_coord, x_medio, y_medio, z_medio):
-    for i in range(int(len(obj)/3)):
-        obj[i*3] = (obj[i*3] - x_medio) / max_coord
-        obj[i*3+1] = (obj[i*3+1] - y_medio) / max_coord
-        obj[i*3+2] = (obj[i*3+2] - z_medio) / max_coord
+def normalizeObject(obj, max_coord, center):
+    obj -= center
+    obj /= max_coord
     return obj
 
-def getIndexes(object_file):
-    faces = []
-    with open(object_file) as f:
-        lines = f.readlines()
-        for line in lines:
-            if line[0] == 'f':
-                space_split = line.split(' ')
-
-                faces.append([int(space_split[1]) - 1,
-                                int(space_split[2]) - 1,
-                                int(space_split[3]) - 1])
-                
-                if len(space_split) == 5:
-                    faces.append([int(space_split[1].split('/')[0]) - 1,
-                                    int(space_split[3].split('/')[0]) - 1,
-                                    int(space_split[4].split('/')[0]) - 1])
-    
-    return faces
-
-def getIndexesAndNormals(object_file):
-    faces = []
-    normals = []
-    with open(object_file) as f:
-        lines = f.readlines()
-        for line in lines:
-            if line[0] == 'f':
-                space_split = line.split(' ')
-
-                faces.append([int(space_split[1].split('/')[0]) - 1,
-                                int(space_split[2].split('/')[0]) - 1,
-                                int(space_split[3].split('/')[0]) - 1])
-                
-                normals.append([int(space_split[1].split('/')[2]) - 1,
-                                int(space_split[2].split('/')[2]) - 1,
-                                int(space_split[3].split('/')[2]) - 1])
-
-                if len(space_split) == 5:
-                    faces.append([int(space_split[1].split('/')[0]) - 1,
-                                    int(space_split[3].split('/')[0]) - 1,
-                                    int(space_split[4].split('/')[0]) - 1])
-
-                    normals.append([int(space_split[1].split('/')[2]) - 1,
-                                    int(space_split[3].split('/')[2]) - 1,
-                                    int(space_split[4].split('/')[2]) - 1])
-    return faces, normals
-
-def getIndexesFromObject(scene, object_file):
-    normals = []
-    if scene.parser.normals != []:
-        face_indexes, normal_indexes = getIndexesAndNormals(object_file)
-        normals = scene.parser.normals
+def getIndexesFromObject(mesh):
+    if len(mesh.normals) > 0 and mesh.normal_indexes is not None:
+        return mesh.face_indexes, mesh.normal_indexes, mesh.normals
+    # No normals in the file, smooth normals are generated.
+    crease = None if crease_angle is None else np.radians(crease_angle)
+    normals, normal_indexes = nrm.generateNormals(mesh.positions, mesh.face_indexes, normal_weighting, crease)
+    return mesh.face_indexes, normal_indexes, normals
+    
+## Interleaved vertex buffer.
+#
+# Normals read from the file are shifted and scaled like the positions, as
+# the original loader did (the cube map is looked up with them), generated
+# normals are kept as they are.
+#
+# @param face_indexes Position index of each corner, (T,3).
+# @param normal_indexes Normal index of each corner, (T,3).
+# @param positions Positions, (P,3).
+# @param normals Normals, (N,3).
+# @param shift_normals Shift and scale the normals like the positions.
+# @return Vertices (V,6), indexes and metadata.
+def getObject(face_indexes, normal_indexes, positions, normals, shift_normals=True):
+    # One vertex per distinct (position, normal) pair.
+    vertex_positions, vertex_normals, indices = objl.indexVertices(face_indexes, normal_indexes)
+
+    # Bounding box of the vertices used by the faces.
+    xyz = positions[vertex_positions]
+    xyz_min = xyz.min(axis=0)
+    xyz_max = xyz.max(axis=0)
+    center = (xyz_max + xyz_min)/2
+    max_coord = np.abs(xyz_max - xyz_min).max()/2
+
+    # Normalize the tables before gathering (same values, fewer operations).
+    positions = normalizeObject(np.array(positions, dtype=np.float64), max_coord, center)
+    if shift_normals:
+        normals = normalizeObject(np.array(normals, dtype=np.float64), max_coord, center)
     else:
-        face_indexes = getIndexes(object_file)
-        normal_indexes = face_indexes
-        normals = scene.vertices 
-    return face_indexes, normal_indexes, normals 
-    
-def getObject(face_indexes, normal_indexes, scene, normals):
-    object_ = []
-    max_coord = 0
-    x_max = scene.vertices[0][0]
-    x_min = scene.vertices[0][0]
-    y_max = scene.vertices[0][1]
-    y_min = scene.vertices[0][1]
-    z_max = scene.vertices[0][2]
-    z_min = scene.vertices[0][2]
-    
-    for face, normal in zip(face_indexes, normal_indexes):
-        for v_face, v_normal in zip(face, normal):
-            x, y, z = scene.vertices[v_face]    
-            n1, n2, n3 = normals[v_normal]
-            object_.append(x)
-            object_.append(y)
-            object_.append(z)
-            #normal
-            object_.append(n1)
-            object_.append(n2)
-            object_.append(n3)
-            
-            x_max = max(x_max, x)
-            x_min = min(x_min, x)
-            y_max = max(y_max, y)
-            y_min = min(y_min, y)
-            z_max = max(z_max, z)
-            z_min = min(z_min, z)
-            
-    x_medio = (x_max + x_min)/2
-    y_medio = (y_max + y_min)/2
-    z_medio = (z_max + z_min)/2
-    
-    max_coord = max(abs(x_max - x_min), abs(y_max - y_min), abs(z_max - z_min))/2
-    object_ = normalizeObject(object_, max_coord, x_medio, y_medio, z_medio)
-    return object_
-    
+        normals = np.asarray(normals, dtype=np.float64)
+
+    # Interleave (x, y, z, n1, n2, n3) for every vertex.
+    object_ = np.empty((len(vertex_positions), 6), dtype='float32')
+    object_[:, :3] = positions.take(vertex_positions, axis=0)
+    object_[:, 3:] = normals.take(vertex_normals, axis=0)
+
+    # 16-bit indexes whenever they are enough.
+    indices = indices.astype(np.uint16 if len(object_) <= 65536 else np.uint32)
+
+    meta = {
+        'stride': 6,
+        'attributes': [['position', 0, 3], ['normal', 3, 3]],
+        'aabb_min': xyz_min.tolist(),
+        'aabb_max': xyz_max.tolist(),
+        'center': center.tolist(),
+        'scale': float(max_coord),
+    }
+    return object_, indices, meta
+    
+
+## Mesh cache key of an object with the current options.
+def objectKey(object_file):
+    reorder = 'c%d_%d' % (ro.CACHE_SIZE, ro.TIPSIFY_MAX_TRIANGLES) if reorder_faces else 'c0'
+    return mcache.cacheKey(object_file, variant='n%s%s-lod%s-%s' % (normal_weighting, crease_angle,
+                                                                   '_'.join(map(str, lod_ratios or ())), reorder))
+
+## Vertex buffer of a parsed object, ready to draw: one level, file order.
+def buildObject(mesh):
+    face_indexes, normal_indexes, normals = getIndexesFromObject(mesh)
+    generated = normals is not mesh.normals
+    object_, indices, meta = getObject(face_indexes, normal_indexes, mesh.positions, normals,
+                                       shift_normals=not generated)
+    meta['generated_normals'] = generated
+    meta['acmr'] = None
+    meta['lod_counts'] = [indices.size]
+    meta['radius'] = float(np.linalg.norm(object_[:, :3], axis=1).max())
+
+    # Vertices in order of first use, so the buffers can be drawn as they fill.
+    vertex_order, remap = ro.fetchOrder(indices, len(object_))
+    return object_[vertex_order], remap[indices].astype(indices.dtype), meta
+
+## Optimized vertex buffer: levels of detail and cache order.
+#
+# @return New vertices, indexes and metadata (the arguments are not changed).
+def optimizeObject(object_, indices, meta):
+    meta = dict(meta)
+
+    # Triangles in vertex cache and overdraw order, for every level (ACMR
+    # estimated from the first triangles).
+    faces = indices.reshape(-1, 3)
+    if reorder_faces:
+        faces = ro.optimizeFaces(object_[:, :3], faces)
+        meta['acmr'] = [ro.acmr(indices, max_triangles=ro.TIPSIFY_MAX_TRIANGLES),
+                        ro.acmr(faces, max_triangles=ro.TIPSIFY_MAX_TRIANGLES)]
+
+    # Simplified levels use the same vertices, their indexes follow the full mesh.
+    lods = simp.lodChain(object_[:, :3], faces, lod_ratios)
+    if reorder_faces:
+        lods = [ro.optimizeFaces(object_[:, :3], lod) for lod in lods]
+    meta['lod_counts'] = [faces.size] + [lod.size for lod in lods]
+
+    # Vertices in order of first use.
+    vertex_order, remap = ro.fetchOrder(faces, len(object_))
+    object_ = object_[vertex_order]
+    indices = np.concatenate([remap[level].ravel().astype(indices.dtype) for level in [faces] + lods])
+    return object_, indices, meta
 
 def loadObject(object_file):
     print("loading ", object_file)
-    scene = pywavefront.Wavefront(object_file, create_materials=True, collect_faces=True)
-       
-    face_indexes, normal_indexes, normals = getIndexesFromObject(scene, object_file)
-    object_ = getObject(face_indexes, normal_indexes, scene, normals)
-        
-    return np.array(object_, dtype='float32')  
-
-def initData(object_file, texture_file):
-
-    # Uses vertex arrays.
-    global VAO, VBO, vertices
-
-    # Set vertices.
-    vertices = loadObject(object_file) 
-    
+    key = objectKey(object_file)
+    cached = mcache.load(key)
+    if cached is not None:
+        print("cached ", key)
+        arrays, meta = cached
+        return arrays['vertices'], arrays['indices'], meta
+
+    mesh = objl.loadObjParallel(object_file)
+    object_, indices, meta = optimizeObject(*buildObject(mesh))
+    mcache.store(key, {'vertices': object_, 'indices': indices}, meta)
+    return object_, indices, meta
+
+## Queue the buffers of an object.
+#
+# A 'begin' message with the sizes and layout, then slices of vertices and
+# indexes in drawing order, then 'swap'.
+def queueObject(vertices, indices, meta):
+    # Packed vertices, against the normalized bounding box.
+    layout = None
+    box = None
+    if vertex_format != 'float':
+        scale = meta['scale'] if meta['scale'] > 0 else 1.0
+        box = [(np.array(meta[corner]) - meta['center'])/scale for corner in ('aabb_min', 'aabb_max')]
+        vertices, layout = vp.packVertices(vertices[:, :3], vertices[:, 3:6], *box, normal_format=vertex_format)
+    stride = vertices.itemsize*vertices.shape[1]
+
+    # Vertices are in order of first use, so a prefix of them is enough for
+    # the triangles of the full level up to the first one using a later vertex.
+    full = indices[:meta['lod_counts'][0]].reshape(-1, 3)
+    ready = np.maximum.accumulate(full.max(axis=1)) if len(full) > 0 else full[:, 0]
+
+    load_queue.put(('begin', meta, vertices.nbytes, stride, indices.dtype, indices.nbytes, layout, box, ready))
+
+    # Matching fractions of both buffers, so the mesh grows evenly.
+    n_slices = max(1, -(-max(vertices.nbytes, indices.nbytes) // stream_slice))
+    vertex_step = -(-len(vertices) // n_slices)
+    index_step = 3*-(-len(indices) // (3*n_slices))
+    for k in range(n_slices):
+        part = np.ascontiguousarray(vertices[k*vertex_step:(k + 1)*vertex_step])
+        load_queue.put(('vertices', k*vertex_step, part))
+        part = np.ascontiguousarray(indices[k*index_step:(k + 1)*index_step])
+        load_queue.put(('indices', k*index_step, part))
+    load_queue.put(('swap',))
+
+## Load worker.
+#
+# Loads the object on the loading thread and queues its buffers for the GL
+# thread (see queueObject), then 'end' (or 'error'). Without a cached copy,
+# the parsed mesh is queued first and drawn while the levels of detail and
+# the cache order are computed, then the optimized buffers replace it.
+def loadWorker(object_file):
+    try:
+        print("loading ", object_file)
+        key = objectKey(object_file)
+        cached = mcache.load(key)
+        if cached is not None:
+            print("cached ", key)
+            arrays, meta = cached
+            queueObject(arrays['vertices'], arrays['indices'], meta)
+        else:
+            mesh = objl.loadObjParallel(object_file)
+            vertices, indices, meta = buildObject(mesh)
+            queueObject(vertices, indices, meta)
+            vertices, indices, meta = optimizeObject(vertices, indices, meta)
+            mcache.store(key, {'vertices': vertices, 'indices': indices}, meta)
+            queueObject(vertices, indices, meta)
+        load_queue.put(('end',))
+    except Exception as error:
+        load_queue.put(('error', error))
+
+## Create the buffers of an object.
+#
+# Allocates the buffers and sets the vertex array from the 'begin' message.
+#
+# @return Vertex array, vertex buffer and element buffer.
+def createBuffers(meta, vertex_nbytes, stride, index_dtype, index_nbytes, layout, box, ready):
     # Vertex array.
-    VAO = gl.glGenVertexArrays(1)
-    gl.glBindVertexArray(VAO)
+    vao = gl.glGenVertexArrays(1)
+    gl.glBindVertexArray(vao)
 
     # Vertex buffer
-    VBO = gl.glGenBuffers(1)
-    gl.glBindBuffer(gl.GL_ARRAY_BUFFER, VBO)
-    gl.glBufferData(gl.GL_ARRAY_BUFFER, vertices.nbytes, vertices, gl.GL_STATIC_DRAW)
-    
+    vbo = gl.glGenBuffers(1)
+    gl.glBindBuffer(gl.GL_ARRAY_BUFFER, vbo)
+    gl.glBufferData(gl.GL_ARRAY_BUFFER, vertex_nbytes, None, gl.GL_STATIC_DRAW)
+
+    # Element buffer
+    ebo = gl.glGenBuffers(1)
+    gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, ebo)
+    gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, index_nbytes, None, gl.GL_STATIC_DRAW)
+
     # Set attributes.
-    gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, gl.GL_FALSE, 6*vertices.itemsize, None)
-    gl.glEnableVertexAttribArray(0)
-    # Set normals
-    gl.glVertexAttribPointer(1, 3, gl.GL_FLOAT, gl.GL_FALSE, 6*vertices.itemsize, c_void_p(3*vertices.itemsize))
-    gl.glEnableVertexAttribArray(1)
-         
-    read_texture(texture_file)
-    # Unbind Vertex Array Object.
+    if layout is not None:
+        vp.setAttributes(layout, stride)
+    else:
+        gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, gl.GL_FALSE, stride, None)
+        gl.glEnableVertexAttribArray(0)
+        # Set normals
+        gl.glVertexAttribPointer(1, 3, gl.GL_FLOAT, gl.GL_FALSE, stride, c_void_p(stride//2))
+        gl.glEnableVertexAttribArray(1)
     gl.glBindVertexArray(0)
-    
+    return vao, vbo, ebo
+
+## Draw the buffers of an object.
+#
+# @param begin The 'begin' message of the buffers.
+# @param buffers Vertex array, vertex buffer and element buffer.
+# @param complete The buffers are filled, else they are drawn as they fill.
+def showObject(begin, buffers, complete):
+    global VAO, VBO, EBO, indices, lod_counts, radius, position_box, vertex_bytes, ready_vertices
+    global growing, loaded_vertices, loaded_indices
+
+    meta, vertex_nbytes, stride, index_dtype, index_nbytes, layout, box, ready = begin
+    VAO, VBO, EBO = buffers
+    lod_counts = meta['lod_counts']
+    radius = meta['radius']
+    position_box = box
+    vertex_bytes = stride
+    ready_vertices = ready
+    # Only the type of the indexes is used by display.
+    indices = np.array([], dtype=index_dtype)
+    growing = not complete
+    loaded_vertices = vertex_nbytes//stride if complete else 0
+    loaded_indices = index_nbytes//indices.itemsize if complete else 0
+    print("Vertex format: %s, %d bytes per vertex" % (vertex_format, vertex_bytes))
+    print("VBO bytes: %d without indexes, %d with indexes (%d vertices + %d indexes)"
+          % (lod_counts[0]*vertex_bytes, vertex_nbytes + lod_counts[0]*indices.itemsize,
+             vertex_nbytes, lod_counts[0]*indices.itemsize))
+    print("LOD triangles: ", [count//3 for count in lod_counts])
+    if meta['acmr'] is not None:
+        print("ACMR: %.3f in file order, %.3f optimized" % tuple(meta['acmr']))
+
+    if position_box is not None:
+        gl.glUseProgram(program)
+        vp.setPositionBox(program, *position_box)
+
+## Upload pending slices.
+#
+# Timer callback of the GL thread: uploads queued slices for at most
+# upload_budget seconds, then redraws and waits for the next interval. The
+# first buffers are drawn as they fill, later ones replace them once filled.
+def uploadPending(value):
+    global loading, loaded_vertices, loaded_indices, growing, upload_begin, upload_buffers
+
+    deadline = time.perf_counter() + upload_budget
+    changed = False
+    while loading and time.perf_counter() < deadline:
+        try:
+            message = load_queue.get_nowait()
+        except queue.Empty:
+            break
+        changed = True
+        if message[0] == 'begin':
+            upload_begin = message[1:]
+            upload_buffers = createBuffers(*upload_begin)
+            if VAO is None:
+                showObject(upload_begin, upload_buffers, False)
+        elif message[0] == 'vertices':
+            first, part = message[1:]
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, upload_buffers[1])
+            gl.glBufferSubData(gl.GL_ARRAY_BUFFER, first*upload_begin[2], part.nbytes, part)
+            if upload_buffers[0] == VAO:
+                loaded_vertices = first + len(part)
+        elif message[0] == 'indices':
+            first, part = message[1:]
+            gl.glBindVertexArray(upload_buffers[0])
+            gl.glBufferSubData(gl.GL_ELEMENT_ARRAY_BUFFER, first*part.itemsize, part.nbytes, part)
+            gl.glBindVertexArray(0)
+            if upload_buffers[0] == VAO:
+                loaded_indices = first + len(part)
+        elif message[0] == 'swap':
+            if upload_buffers[0] == VAO:
+                growing = False
+            else:
+                gl.glDeleteVertexArrays(1, [VAO])
+                gl.glDeleteBuffers(2, [VBO, EBO])
+                showObject(upload_begin, upload_buffers, True)
+                print("optimized buffers after %.2f s" % (time.perf_counter() - load_start))
+            upload_buffers = None
+        elif message[0] == 'end':
+            loading = False
+            print("loaded in %.2f s" % (time.perf_counter() - load_start))
+        else:
+            # The window keeps running with what is drawn.
+            loading = False
+            error = message[1]
+            print("loading failed:")
+            traceback.print_exception(type(error), error, error.__traceback__)
+            if upload_buffers is not None and upload_buffers[0] != VAO:
+                gl.glDeleteVertexArrays(1, [upload_buffers[0]])
+                gl.glDeleteBuffers(2, list(upload_buffers[1:]))
+            upload_buffers = None
+
+    if changed:
+        glut.glutPostRedisplay()
+    if loading:
+        glut.glutTimerFunc(upload_interval, uploadPending, 0)
+
+def initData(object_file, texture_files):
+
+    # Uses vertex arrays.
+    global loading, load_start
+
+    addCubemaps(texture_files)
     gl.glEnable(gl.GL_DEPTH_TEST)
+
+    # The object is loaded in the background, the window keeps drawing meanwhile.
+    loading = True
+    load_start = time.perf_counter()
+    threading.Thread(target=loadWorker, args=(object_file,), daemon=True).start()
+    glut.glutTimerFunc(upload_interval, uploadPending, 0)
     
 ## Create program (shaders).
 def initShaders():
     global program
-    program = ut.createShaderProgram(vertex_code, fragment_code)
+    code = vertex_code
+    if vertex_format == vp.OCTAHEDRAL:
+        code = vp.shaderDefines(vertex_code, ['PACKED', 'PACKED_OCTAHEDRAL'])
+    elif vertex_format == vp.SNORM_1010102:
+        code = vp.shaderDefines(vertex_code, ['PACKED'])
+    program = ut.createShaderProgram(code, fragment_code)
 
 ## Main function.
 def main():
-    global texture_file
+    global texture_file, texture_files, vertex_format, start_time
 
+    start_time = time.perf_counter()
     glut.glutInit()
     glut.glutInitContextVersion(3, 3)
     glut.glutInitContextProfile(glut.GLUT_CORE_PROFILE)
@@ -524,13 +922,18 @@ def main():
     
     if(sys.argv[2]):
         texture_file = sys.argv[2]
+        texture_files = texture_file.split(',')
         print("texture_file: ", texture_file)
-    
-    initData(object_file, texture_file)
+
+    # Optional vertex format: float, oct16 or 1010102.
+    if len(sys.argv) > 3:
+        vertex_format = sys.argv[3]
     
     # Create shaders.
     initShaders()
 
+    initData(object_file, texture_files)
+
     glut.glutReshapeFunc(reshape)
     glut.glutDisplayFunc(display)
     glut.glutKeyboardFunc(keyboard)
@@ -0,0 +1,41 @@
+## @file bench_cubemap.py
+# Cube map decoding of mesh2.py, serial versus a thread pool.
+#
+# Decodes the six faces of a skybox as mesh2.read_texture does, in order and
+# with 2, 3 and 6 threads, best of a few runs. The decode is what separates
+# the start of mesh2.py from its first frame, which mesh2.py prints itself
+# (set mesh2.texture_workers to 1 for the serial time).
+#
+# Usage: python bench_cubemap.py [<skybox dir>] [<runs>]
+
+import sys
+import os
+import time
+sys.path.append('../lib/')
+sys.path.append('../Trabalho2/')
+import textures as tex
+import mesh2
+
+def main():
+    skybox = sys.argv[1] if len(sys.argv) > 1 else '../Trabalho2/skybox'
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    paths = [os.path.join(skybox, name) for target, name in mesh2.cubemap_faces]
+
+    start = time.perf_counter()
+    size = tex.checkCubemap(paths)
+    print("%s: 6 faces of %d px, checked in %.4f s, %d CPUs"
+          % (skybox, size, time.perf_counter() - start, os.cpu_count()))
+
+    serial = None
+    for workers in (1, 2, 3, 6):
+        best = float('inf')
+        for _ in range(runs):
+            start = time.perf_counter()
+            faces = tex.readImages(paths, workers)
+            best = min(best, time.perf_counter() - start)
+            del faces
+        serial = serial or best
+        print("  %d threads: %.3f s (x%.2f)" % (workers, best, serial/best))
+
+if __name__ == '__main__':
+    main()
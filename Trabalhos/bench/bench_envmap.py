@@ -0,0 +1,87 @@
+## @file bench_envmap.py
+# Equirectangular to cube map conversion of envmap.py.
+#
+# Converts a panorama (by default a random 2048x1024 one) with a per-texel
+# loop, timed on a few texels and extrapolated, and with
+# envmap.equirectToCubemap for every face at once and one face per thread,
+# checking that both agree. Then loads it through the texture cache cold and
+# warm, as mesh2.py does for panoramas.
+#
+# Usage: python bench_envmap.py [<panorama>] [<face size>]
+
+import sys
+import os
+import math
+import time
+import tempfile
+import numpy as np
+from PIL import Image
+sys.path.append('../lib/')
+import textures as tex
+import envmap as em
+
+## Convert one texel, the way a per-pixel script does.
+def texel(pano, face, i, j, size):
+    center, s_axis, t_axis = em.FACE_AXES[face].tolist()
+    a = (j + 0.5)*2.0/size - 1.0
+    b = (i + 0.5)*2.0/size - 1.0
+    d = [center[k] + a*s_axis[k] + b*t_axis[k] for k in range(3)]
+    norm = math.sqrt(sum(c*c for c in d))
+    x, y, z = (c/norm for c in d)
+    height, width = pano.shape[:2]
+    px = (math.atan2(x, -z)/(2*math.pi) + 0.5)*width - 0.5
+    py = math.acos(max(-1.0, min(1.0, y)))/math.pi*height - 0.5
+    x0, y0 = math.floor(px), math.floor(py)
+    fx, fy = px - x0, py - y0
+    def at(yy, xx):
+        return pano[min(max(yy, 0), height - 1), xx % width].astype(np.float64)
+    value = ((at(y0, x0)*(1 - fx) + at(y0, x0 + 1)*fx)*(1 - fy)
+             + (at(y0 + 1, x0)*(1 - fx) + at(y0 + 1, x0 + 1)*fx)*fy)
+    return np.clip(value + 0.5, 0, 255).astype(np.uint8)
+
+def main():
+    tmp = None
+    if len(sys.argv) > 1:
+        image = sys.argv[1]
+    else:
+        tmp = image = os.path.join(tempfile.gettempdir(), 'bench_envmap_2048.jpg')
+        small = np.random.default_rng(0).integers(0, 256, (64, 128, 3), dtype=np.uint8)
+        Image.fromarray(small).resize((2048, 1024), Image.BILINEAR).save(tmp, quality=90)
+    cache_dir = tempfile.mkdtemp(prefix='bench_envmap_')
+
+    try:
+        pano = tex.readImage(image)
+        size = int(sys.argv[2]) if len(sys.argv) > 2 else pano.shape[1]//4
+        print("%s: %dx%d, faces of %d px, %d CPUs" % (os.path.basename(image), pano.shape[1], pano.shape[0],
+              size, os.cpu_count()))
+
+        rng = np.random.default_rng(1)
+        samples = [(int(f), int(i), int(j)) for f, i, j in zip(rng.integers(0, 6, 2000),
+                   rng.integers(0, size, 2000), rng.integers(0, size, 2000))]
+        start = time.perf_counter()
+        reference = [texel(pano, f, i, j, size) for f, i, j in samples]
+        per_texel = (time.perf_counter() - start)/len(samples)
+        print("  per texel loop: %.1f s (extrapolated from %d texels)" % (per_texel*6*size*size, len(samples)))
+
+        for workers in (1, 2, 6):
+            start = time.perf_counter()
+            faces = em.equirectToCubemap(pano, size, workers)
+            seconds = time.perf_counter() - start
+            diff = max(int(np.abs(faces[f][i, j].astype(int) - r).max()) for (f, i, j), r in zip(samples, reference))
+            print("  vectorized, %s: %.2f s (x%.0f), max difference %d"
+                  % ("all faces at once" if workers == 1 else "%d threads" % workers, seconds,
+                     per_texel*6*size*size/seconds, diff))
+
+        for run in ("cold", "warm"):
+            start = time.perf_counter()
+            faces, cached = em.loadEquirectCubemap(image, size, os.cpu_count() or 1, cache_dir)
+            print("  texture cache, %s: %.3f s (cached: %s)" % (run, time.perf_counter() - start, cached))
+    finally:
+        for name in os.listdir(cache_dir):
+            os.remove(os.path.join(cache_dir, name))
+        os.rmdir(cache_dir)
+        if tmp is not None:
+            os.remove(tmp)
+
+if __name__ == '__main__':
+    main()
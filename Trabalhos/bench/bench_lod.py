@@ -0,0 +1,60 @@
+## @file bench_lod.py
+# Level of detail chain of mesh2.py.
+#
+# Builds the simplified levels of each mesh as mesh2.loadObject does, and
+# prints the triangles and build time of each level and the level picked at
+# a few camera distances with the projection of mesh2.py. Frame times per
+# level are printed by mesh2.py itself (key 'l' cycles through the levels).
+#
+# Usage: python bench_lod.py [<obj file> ...]
+#        (without files, a synthetic grid of 1M triangles is used)
+
+import sys
+import time
+import tempfile
+import os
+import numpy as np
+sys.path.append('../lib/')
+sys.path.append('../Trabalho2/')
+import objloader as objl
+import simplify as simp
+import utils as ut
+import mesh2
+import synth
+
+def main():
+    tmp = None
+    object_files = sys.argv[1:]
+    if not object_files:
+        tmp = tempfile.NamedTemporaryFile(suffix='.obj', delete=False)
+        tmp.close()
+        synth.writeGridObj(tmp.name, 708)
+        object_files = [tmp.name]
+
+    projection = ut.matPerspective(np.radians(45.0), mesh2.win_width/mesh2.win_height, 0.1, 100.0)
+    try:
+        for object_file in object_files:
+            mesh = objl.loadObj(object_file)
+            face_indexes, normal_indexes, normals = mesh2.getIndexesFromObject(mesh)
+            vertices, indices, meta = mesh2.getObject(face_indexes, normal_indexes, mesh.positions, normals,
+                                                      shift_normals=normals is mesh.normals)
+
+            start = time.perf_counter()
+            lods = simp.lodChain(vertices[:, :3], indices.reshape(-1, 3), mesh2.lod_ratios)
+            seconds = time.perf_counter() - start
+            counts = [len(indices)//3] + [len(lod) for lod in lods]
+
+            print(object_file)
+            print("  triangles per level: %s, built in %.2f s" % (counts, seconds))
+            radius = float(np.linalg.norm(vertices[:, :3], axis=1).max())
+            for distance in (2.0, 5.0, 10.0, 20.0, 50.0, 90.0):
+                pixels = simp.projectedRadius(radius, distance, projection, mesh2.win_height)
+                level = simp.selectLod(counts, pixels, mesh2.lod_pixels_per_triangle)
+                print("  distance %5.1f: radius %7.1f px, level %d, %8d triangles"
+                      % (distance, pixels, level, counts[level]))
+    finally:
+        if tmp is not None:
+            os.remove(tmp.name)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+## @file bench_meshcache.py
+# Cold and warm start of mesh2.loadObject with the mesh cache.
+#
+# Cold start parses the OBJ, builds the vertex buffer and stores it; warm start
+# only looks the key up and memory-maps the buffer. Finally every entry is
+# evicted, which must also empty the hash index. A temporary cache directory
+# is used so the user cache is left untouched.
+#
+# Usage: python bench_meshcache.py <obj file> [<obj file> ...]
+
+import sys
+import time
+import shutil
+import tempfile
+import numpy as np
+sys.path.append('../lib/')
+sys.path.append('../Trabalho2/')
+import meshcache as mcache
+import cacheindex as ci
+import mesh2
+
+def main():
+    mcache.CACHE_DIR = tempfile.mkdtemp(prefix='meshcache-')
+    try:
+        for object_file in sys.argv[1:]:
+            start = time.perf_counter()
+            cold, cold_indices, _ = mesh2.loadObject(object_file)
+            t_cold = time.perf_counter() - start
+
+            start = time.perf_counter()
+            warm, warm_indices, _ = mesh2.loadObject(object_file)
+            t_map = time.perf_counter() - start
+            # Touch every page, as glBufferData does.
+            np.asarray(warm).sum()
+            np.asarray(warm_indices).sum()
+            t_warm = time.perf_counter() - start
+
+            print(object_file)
+            print("  buffers:           %.1f MB" % ((cold.nbytes + cold_indices.nbytes)/1e6))
+            print("  cold start:        %.3f s" % t_cold)
+            print("  warm start (map):  %.4f s" % t_map)
+            print("  warm start (read): %.4f s" % t_warm)
+            print("  identical:         ", np.array_equal(cold, warm) and np.array_equal(cold_indices, warm_indices))
+
+        mcache.evict(mcache.CACHE_DIR, 0)
+        print("hash index records after evicting every entry:", len(ci.readIndex(mcache.CACHE_DIR)))
+    finally:
+        shutil.rmtree(mcache.CACHE_DIR)
+
+if __name__ == '__main__':
+    main()
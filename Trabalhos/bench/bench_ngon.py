@@ -0,0 +1,96 @@
+## @file bench_ngon.py
+# OBJ loading of polygons of mixed sizes.
+#
+# Synthetic files with triangles up to octagons, negative indexes and every
+# corner format, then also with trailing comments, indented records and vt
+# records of one to three values, are parsed by objloader.loadObj and by a line by line reference parser, which
+# triangulates each polygon as a fan. Both results are checked to be
+# identical, also against objloader.loadObjParallel.
+#
+# Usage: python bench_ngon.py [<faces> ...]
+
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+sys.path.append('../lib/')
+import objloader as objl
+import synth
+from bench_parallel import sameMesh
+
+## Reference parser, one line at a time.
+#
+# @param object_file OBJ file name.
+# @return 0-based position, texture coordinate and normal indexes of each
+#         triangle, the last two None if some corner misses them, and the
+#         (u, v) texture coordinates, with v = 0 when a record omits it.
+def referenceFaces(object_file):
+    counts = {'v': 0, 'vt': 0, 'vn': 0}
+    texcoords = []
+    triangles = ([], [], [])
+    complete = [True, True]
+    with open(object_file) as f:
+        for line in f:
+            tokens = line.split('#')[0].split()
+            if not tokens:
+                continue
+            if tokens[0] in counts:
+                counts[tokens[0]] += 1
+                if tokens[0] == 'vt':
+                    texcoords.append([float(value) for value in (tokens[1:3] + ['0'])[:2]])
+            elif tokens[0] == 'f':
+                corners = []
+                for token in tokens[1:]:
+                    values = token.split('/') + ['', '']
+                    corner = []
+                    for value, kind in zip(values[:3], ('v', 'vt', 'vn')):
+                        index = int(value) if value else 0
+                        if index < 0:
+                            index += counts[kind] + 1
+                        corner.append(index - 1)
+                    corners.append(corner)
+                for i in range(1, len(corners) - 1):
+                    for column in range(3):
+                        triangles[column].append([corners[0][column], corners[i][column], corners[i + 1][column]])
+                for column in (1, 2):
+                    complete[column - 1] &= all(corner[column] >= 0 for corner in corners)
+
+    v, vt, vn = (np.array(t, dtype=objl.INDEX_DTYPE).reshape(-1, 3) for t in triangles)
+    return v, vt if complete[0] else None, vn if complete[1] else None, np.array(texcoords).reshape(-1, 2)
+
+def main():
+    sizes = [int(n) for n in sys.argv[1:]] or [10**4, 10**5, 10**6]
+    tmp = tempfile.NamedTemporaryFile(suffix='.obj', delete=False)
+    tmp.close()
+
+    try:
+        for formats, comments in ((('vtvn',), False), (('v', 'vt', 'vn', 'vtvn'), False),
+                                  (('v', 'vt', 'vn', 'vtvn'), True)):
+            print("corner formats: %s%s" % (', '.join(formats), ", comments and indentation" if comments else ""))
+            for n_faces in sizes:
+                synth.writeMixedObj(tmp.name, 200, n_faces, formats=formats, comments=comments, indent=comments,
+                                    short_texcoords=comments)
+
+                start = time.perf_counter()
+                v, vt, vn, texcoords = referenceFaces(tmp.name)
+                t_old = time.perf_counter() - start
+
+                start = time.perf_counter()
+                mesh = objl.loadObj(tmp.name)
+                t_new = time.perf_counter() - start
+
+                same = np.array_equal(v, mesh.face_indexes) and np.array_equal(texcoords, mesh.texcoords)
+                for reference, indexes in ((vt, mesh.texcoord_indexes), (vn, mesh.normal_indexes)):
+                    same = same and (reference is None) == (indexes is None) and \
+                           (reference is None or np.array_equal(reference, indexes))
+                parallel = objl.loadObjParallel(tmp.name, workers=4, chunk_size=1 << 20, min_bytes=0)
+
+                print("  %8d polygons, %9d triangles: loop %7.3f s, numpy %6.3f s, speedup %5.1fx, "
+                      "identical %s, parallel identical %s"
+                      % (n_faces, len(v), t_old, t_new, t_old/t_new, same, sameMesh(mesh, parallel)))
+    finally:
+        os.remove(tmp.name)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+## @file bench_normalmatrix.py
+# Normal matrix of mesh2.py, per vertex in the shader versus per draw.
+#
+# Draws a mesh (by default the bunny, repeated to a million vertices) as
+# points with the vertex shader of mesh2.py as it was, computing
+# mat3(transpose(inverse(model))) for every vertex, and as it is, reading the
+# normalMatrix uniform that display() builds with utils.matNormal. The
+# rasterizer is discarded so a draw followed by glFinish measures the vertex
+# stage, best of a few draws, on the CPU clock (PyOpenGL reads
+# GL_TIME_ELAPSED queries as 32 bits, and software drivers run the draw
+# before the query ends). Then it renders the mesh with both shaders and
+# counts the pixels that differ, and times matNormal and the upload that
+# replace the per vertex inverse.
+#
+# Usage: python bench_normalmatrix.py [<obj file>] [<vertices>] [<runs>]
+
+import sys
+import time
+import ctypes
+import numpy as np
+import OpenGL.GL as gl
+import OpenGL.GLUT as glut
+sys.path.append('../lib/')
+sys.path.append('../Trabalho2/')
+import utils as ut
+import mesh2
+
+old_vertex_code = mesh2.vertex_code.replace("normalMatrix * n", "mat3(transpose(inverse(model))) * n")
+
+## Vertex stage time of one draw.
+#
+# @param program Program to draw with.
+# @param count Number of vertices.
+# @param runs Number of draws.
+# @return Best time in seconds.
+def vertexTime(program, count, runs):
+    gl.glUseProgram(program)
+    gl.glEnable(gl.GL_RASTERIZER_DISCARD)
+    gl.glFinish()
+    best = float('inf')
+    for _ in range(runs + 1):
+        start = time.perf_counter()
+        gl.glDrawArrays(gl.GL_POINTS, 0, count)
+        gl.glFinish()
+        best = min(best, time.perf_counter() - start)
+    gl.glDisable(gl.GL_RASTERIZER_DISCARD)
+    return best
+
+## Render the mesh once.
+#
+# @param program Program to draw with.
+# @param count Number of indices.
+# @param size Window size.
+# @return Pixels (height, width, 3).
+def render(program, count, size):
+    gl.glUseProgram(program)
+    gl.glEnable(gl.GL_DEPTH_TEST)
+    gl.glClearColor(0.2, 0.3, 0.3, 1.0)
+    gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
+    gl.glDrawElements(gl.GL_TRIANGLES, count, gl.GL_UNSIGNED_INT, None)
+    pixels = gl.glReadPixels(0, 0, size[0], size[1], gl.GL_RGB, gl.GL_UNSIGNED_BYTE)
+    return np.frombuffer(pixels, dtype=np.uint8).reshape(size[1], size[0], 3)
+
+## Set the matrices of a program.
+#
+# @param program The program.
+# @param matrices Uniform names and matrices.
+def setMatrices(program, matrices):
+    gl.glUseProgram(program)
+    for name, M in matrices.items():
+        loc = gl.glGetUniformLocation(program, name)
+        if loc >= 0:
+            ut.setUniformMatrix(loc, M)
+
+def main():
+    object_file = sys.argv[1] if len(sys.argv) > 1 else '../Trabalho2/bunny.obj'
+    target = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+    runs = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    size = (640, 480)
+
+    glut.glutInit()
+    glut.glutInitContextVersion(3, 3)
+    glut.glutInitContextProfile(glut.GLUT_CORE_PROFILE)
+    glut.glutInitDisplayMode(glut.GLUT_DOUBLE | glut.GLUT_RGBA | glut.GLUT_DEPTH)
+    glut.glutInitWindowSize(*size)
+    glut.glutCreateWindow('Normal matrix')
+    gl.glViewport(0, 0, *size)
+
+    vertices, indices, meta = mesh2.loadObject(object_file)
+    vertices = np.ascontiguousarray(vertices[:, :6], dtype='float32')
+    copies = max(1, -(-target//len(vertices)))
+    count = len(vertices)*copies
+    print("%s: %d vertices, drawn %d times (%d vertices), %s"
+          % (object_file, len(vertices), copies, count, gl.glGetString(gl.GL_RENDERER).decode()))
+
+    vao = gl.glGenVertexArrays(1)
+    gl.glBindVertexArray(vao)
+    vbo, ebo = gl.glGenBuffers(2)
+    gl.glBindBuffer(gl.GL_ARRAY_BUFFER, vbo)
+    gl.glBufferData(gl.GL_ARRAY_BUFFER, np.tile(vertices, (copies, 1)), gl.GL_STATIC_DRAW)
+    gl.glEnableVertexAttribArray(0)
+    gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, gl.GL_FALSE, 24, ctypes.c_void_p(0))
+    gl.glEnableVertexAttribArray(1)
+    gl.glVertexAttribPointer(1, 3, gl.GL_FLOAT, gl.GL_FALSE, 24, ctypes.c_void_p(12))
+    gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, ebo)
+    gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, np.ascontiguousarray(indices, dtype=np.uint32), gl.GL_STATIC_DRAW)
+
+    # A rotated, non-uniformly scaled model, where the normal matrix is not the model matrix.
+    model = ut.matTranslate(0.2, -0.1, 0.0) @ ut.matRotateY(0.6) @ ut.matRotateX(0.4) @ ut.matScale(1.3, 0.8, 1.0)
+    matrices = {'model': model, 'normalMatrix': ut.matNormal(model),
+                'view': ut.matTranslate(0.0, 0.0, -3.0),
+                'projection': ut.matPerspective(np.radians(45.0), size[0]/size[1], 0.1, 100.0)}
+
+    programs = {'inverse(model) per vertex': ut.createShaderProgram(old_vertex_code, mesh2.fragment_code),
+                'normalMatrix uniform': ut.createShaderProgram(mesh2.vertex_code, mesh2.fragment_code)}
+    print("vertex stage, best of %d draws:" % runs)
+    baseline = None
+    images = []
+    for name, program in programs.items():
+        setMatrices(program, matrices)
+        seconds = vertexTime(program, count, runs)
+        baseline = baseline or seconds
+        print("  %-26s %8.2f ms, %6.2f ns per vertex (x%.2f)"
+              % (name + ":", 1000*seconds, 1e9*seconds/count, baseline/seconds))
+        images.append(render(program, len(indices), size))
+    diff = np.abs(images[0].astype(int) - images[1]).max(axis=2)
+    print("  rendered images: %d pixels differ, by at most %d" % ((diff > 0).sum(), diff.max()))
+
+    N = np.zeros((3,3), dtype='float32')
+    loc = gl.glGetUniformLocation(programs['normalMatrix uniform'], 'normalMatrix')
+    frames = 10000
+    for name, f in (("matNormal", lambda: ut.matNormal(model, out=N)),
+                    ("normalMatrix upload", lambda: ut.setUniformMatrix(loc, N))):
+        start = time.perf_counter()
+        for _ in range(frames):
+            f()
+        print("  %-20s %5.2f us per draw" % (name + ":", 1e6*(time.perf_counter() - start)/frames))
+
+    gl.glDeleteBuffers(2, [vbo, ebo])
+    gl.glDeleteVertexArrays(1, [vao])
+    for program in programs.values():
+        gl.glDeleteProgram(program)
+
+if __name__ == '__main__':
+    main()
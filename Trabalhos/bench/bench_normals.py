@@ -0,0 +1,56 @@
+## @file bench_normals.py
+# Generated vertex normals.
+#
+# Times normals.generateNormals with area and angle weighting, with and
+# without a crease angle, on wavy grids from 10k to 10M triangles, and
+# compares the result with the exact normals of the height field. Files given
+# on the command line are timed too.
+#
+# Usage: python bench_normals.py [<obj file> ...]
+
+import sys
+import time
+import numpy as np
+sys.path.append('../lib/')
+import objloader as objl
+import normals as nrm
+import synth
+
+## Time the generators on one mesh.
+#
+# @param positions Vertex positions, (N,3).
+# @param faces Position indexes of each triangle, (T,3).
+# @param exact Exact normal of each position, or None.
+def run(positions, faces, exact=None):
+    for weighting in ('area', 'angle'):
+        for crease_angle in (None, 60.0):
+            start = time.perf_counter()
+            normals, normal_indexes = nrm.generateNormals(positions, faces, weighting,
+                                                           None if crease_angle is None else np.radians(crease_angle))
+            seconds = time.perf_counter() - start
+
+            line = "    %-5s crease %-4s: %7.3f s, %9d normals" % (weighting, crease_angle, seconds, len(normals))
+            if exact is not None:
+                error = np.degrees(np.arccos(np.clip(
+                    np.einsum('ij,ij->i', normals[normal_indexes[:, 0]], exact[faces[:, 0]]), -1.0, 1.0)))
+                line += ", largest error %.3f degrees" % error.max()
+            print(line)
+            del normals, normal_indexes
+
+def main():
+    for n in (72, 225, 708, 2237):
+        positions, exact, quads = synth.gridMesh(n)
+        faces = np.concatenate((quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]), axis=1).reshape(-1, 3) - 1
+        faces = faces.astype(objl.INDEX_DTYPE)
+        del quads
+        print("grid %d x %d, %d triangles" % (n, n, len(faces)))
+        run(positions, faces, exact)
+        del positions, exact, faces
+
+    for object_file in sys.argv[1:]:
+        mesh = objl.loadObj(object_file)
+        print("%s, %d triangles" % (object_file, len(mesh.face_indexes)))
+        run(mesh.positions, mesh.face_indexes)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+## @file bench_objloader.py
+# Compares the OBJ loader with the original pywavefront path.
+#
+# Usage: python bench_objloader.py <obj file> [<obj file> ...]
+
+import sys
+import time
+import numpy as np
+sys.path.append('../lib/')
+import objloader as objl
+import legacy
+
+## Best wall time of a few runs.
+def timeit(func, *args, repeat=3):
+    best = float('inf')
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    for object_file in sys.argv[1:]:
+        t_old, (scene, face_indexes, normal_indexes, normals) = timeit(legacy.loadIndexes, object_file)
+        t_new, mesh = timeit(objl.loadObj, object_file)
+
+        same = np.array_equal(np.asarray(scene.vertices), mesh.positions) and \
+               np.array_equal(np.asarray(face_indexes), mesh.face_indexes)
+        if mesh.normal_indexes is not None:
+            same = same and np.array_equal(np.asarray(normals), mesh.normals) and \
+                   np.array_equal(np.asarray(normal_indexes), mesh.normal_indexes)
+
+        print(object_file)
+        print("  triangles:        ", len(mesh.face_indexes))
+        print("  pywavefront+read: %.3f s" % t_old)
+        print("  objloader:        %.3f s" % t_new)
+        print("  speedup:          %.1fx" % (t_old/t_new))
+        print("  same arrays:      ", same)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+## @file bench_parallel.py
+# Serial versus multi-process OBJ parsing.
+#
+# Times objloader.loadObj and objloader.loadObjParallel with an increasing
+# number of workers and checks that every run produces the same arrays.
+#
+# Usage: python bench_parallel.py [<obj file>] [<max workers>]
+#        (without a file, a synthetic grid of about 360 MB is generated)
+
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+sys.path.append('../lib/')
+import objloader as objl
+import synth
+
+NAMES = ('positions', 'normals', 'texcoords', 'face_indexes', 'normal_indexes', 'texcoord_indexes')
+
+## Compare two meshes array by array.
+def sameMesh(a, b):
+    for name in NAMES:
+        x, y = getattr(a, name), getattr(b, name)
+        if (x is None) != (y is None) or (x is not None and not np.array_equal(x, y)):
+            return False
+    return True
+
+def main():
+    tmp = None
+    if len(sys.argv) > 1 and sys.argv[1] != '-':
+        object_file = sys.argv[1]
+    else:
+        tmp = tempfile.NamedTemporaryFile(suffix='.obj', delete=False)
+        tmp.close()
+        object_file = tmp.name
+        synth.writeGridObj(object_file, 1500)
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+
+    try:
+        print("%s: %.1f MB, %d CPUs" % (object_file, os.path.getsize(object_file)/1e6, os.cpu_count()))
+        start = time.perf_counter()
+        serial = objl.loadObj(object_file)
+        t_serial = time.perf_counter() - start
+        print("  serial      %7.2f s" % t_serial)
+
+        workers = 2
+        while workers <= max_workers:
+            start = time.perf_counter()
+            mesh = objl.loadObjParallel(object_file, workers, min_bytes=0)
+            elapsed = time.perf_counter() - start
+            print("  %2d workers  %7.2f s  speedup %5.2fx  same %s"
+                  % (workers, elapsed, t_serial/elapsed, sameMesh(serial, mesh)))
+            workers *= 2
+    finally:
+        if tmp is not None:
+            os.remove(tmp.name)
+
+if __name__ == '__main__':
+    main()
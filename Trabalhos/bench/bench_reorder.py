@@ -0,0 +1,60 @@
+## @file bench_reorder.py
+# Vertex cache and overdraw reordering.
+#
+# Prints the ACMR (cache misses per triangle, FIFO cache of
+# reorder.CACHE_SIZE entries) of each mesh in file order, after Tipsify and
+# after the overdraw sort, and the time taken, then the same for the spatial
+# (Morton) order used above reorder.TIPSIFY_MAX_TRIANGLES. Without files, a grid of 1M
+# triangles in random order stands for scanned data.
+#
+# Usage: python bench_reorder.py [<obj file> ...]
+
+import sys
+import time
+import numpy as np
+sys.path.append('../lib/')
+sys.path.append('../Trabalho2/')
+import objloader as objl
+import reorder as ro
+import mesh2
+import synth
+
+## Reorder one mesh and print its statistics.
+def run(name, positions, faces):
+    start = time.perf_counter()
+    order, clusters = ro.tipsify(faces, len(positions))
+    t_tipsify = time.perf_counter() - start
+    tipsified = faces[order]
+
+    start = time.perf_counter()
+    optimized = tipsified[ro.overdrawOrder(positions, tipsified, clusters)]
+    t_overdraw = time.perf_counter() - start
+
+    print(name)
+    print("  triangles:         %d in %d clusters" % (len(faces), len(clusters)))
+    print("  ACMR file order:   %.3f" % ro.acmr(faces))
+    print("  ACMR Tipsify:      %.3f (%.2f s)" % (ro.acmr(tipsified), t_tipsify))
+    print("  ACMR overdraw:     %.3f (%.2f s)" % (ro.acmr(optimized), t_overdraw))
+
+    start = time.perf_counter()
+    order, clusters = ro.spatialOrder(positions, faces)
+    spatial = faces[order]
+    optimized = spatial[ro.overdrawOrder(positions, spatial, clusters)]
+    print("  ACMR spatial:      %.3f (%.2f s with the overdraw sort)" % (ro.acmr(optimized), time.perf_counter() - start))
+
+def main():
+    for object_file in sys.argv[1:]:
+        mesh = objl.loadObj(object_file)
+        face_indexes, normal_indexes, normals = mesh2.getIndexesFromObject(mesh)
+        vertices, indices, meta = mesh2.getObject(face_indexes, normal_indexes, mesh.positions, normals,
+                                                  shift_normals=normals is mesh.normals)
+        run(object_file, vertices[:, :3], indices.reshape(-1, 3).astype(np.int64))
+
+    if not sys.argv[1:]:
+        positions, _, quads = synth.gridMesh(708)
+        faces = np.concatenate((quads[:, [0, 1, 2]], quads[:, [0, 2, 3]]), axis=1).reshape(-1, 3) - 1
+        faces = faces[np.random.default_rng(0).permutation(len(faces))]
+        run("grid 708 x 708, random order", positions, faces)
+
+if __name__ == '__main__':
+    main()
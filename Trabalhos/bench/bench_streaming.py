@@ -0,0 +1,72 @@
+## @file bench_streaming.py
+# Peak memory of OBJ loading, whole file versus streamed chunks.
+#
+# Each configuration runs in its own process, which loads the OBJ and builds
+# the final vertex and index buffers of mesh2.py. The peak RSS above the
+# interpreter baseline is compared with the size of those GPU buffers.
+#
+# Usage: python bench_streaming.py [<obj file>]
+#        (without a file, a synthetic grid of about 200 MB is generated)
+
+import os
+import sys
+import tempfile
+import subprocess
+sys.path.append('../lib/')
+import synth
+
+CHILD = """
+import sys, time
+sys.path.append('../lib/')
+sys.path.append('../Trabalho2/')
+import numpy as np
+import objloader as objl
+import mesh2
+if sys.argv[2] != 'baseline':
+    start = time.perf_counter()
+    mesh = objl.loadObj(sys.argv[1], chunk_size=int(sys.argv[2]))
+    face_indexes, normal_indexes, normals = mesh2.getIndexesFromObject(mesh)
+    vertices, indices, meta = mesh2.getObject(face_indexes, normal_indexes, mesh.positions, normals,
+                                              shift_normals=normals is mesh.normals)
+    print(vertices.nbytes + indices.nbytes, time.perf_counter() - start)
+else:
+    print(0, 0.0)
+"""
+
+## Run a configuration, return peak RSS in bytes and the child's output.
+def run(object_file, chunk_size):
+    proc = subprocess.Popen([sys.executable, '-c', CHILD, object_file, str(chunk_size)],
+                            stdout=subprocess.PIPE)
+    out = proc.stdout.read().split()
+    proc.stdout.close()
+    # wait4 reaps the child, so Popen must not wait for it again.
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = status
+    return usage.ru_maxrss*1024, int(out[0]), float(out[1])
+
+def main():
+    tmp = None
+    if len(sys.argv) > 1:
+        object_file = sys.argv[1]
+    else:
+        tmp = tempfile.NamedTemporaryFile(suffix='.obj', delete=False)
+        tmp.close()
+        object_file = tmp.name
+        synth.writeGridObj(object_file, 1500)
+
+    try:
+        size = os.path.getsize(object_file)
+        baseline, _, _ = run(object_file, 'baseline')
+        print("%s: %.1f MB" % (object_file, size/1e6))
+        configurations = (("whole file", size + 1), ("64 MB chunks", 1 << 26),
+                          ("8 MB chunks", 1 << 23), ("1 MB chunks", 1 << 20))
+        for label, chunk_size in configurations:
+            peak, gpu_bytes, seconds = run(object_file, chunk_size)
+            print("  %-13s peak RSS %7.1f MB  GPU buffers %6.1f MB  ratio %4.1fx  %.2f s"
+                  % (label, (peak - baseline)/1e6, gpu_bytes/1e6, (peak - baseline)/gpu_bytes, seconds))
+    finally:
+        if tmp is not None:
+            os.remove(tmp.name)
+
+if __name__ == '__main__':
+    main()
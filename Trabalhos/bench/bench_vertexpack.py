@@ -0,0 +1,74 @@
+## @file bench_vertexpack.py
+# Packed vertex formats of mesh2.py.
+#
+# Packs the vertices of each mesh as mesh2.initData does, in every format, and
+# prints the bytes per vertex, the packing time and the largest decode error
+# (positions in normalized units, normals in degrees). Frame times in each
+# format are printed by mesh2.py itself, whose third argument is the format.
+#
+# Usage: python bench_vertexpack.py [<obj file> ...]
+#        (without files, a synthetic grid of 1M triangles is used)
+
+import sys
+import time
+import tempfile
+import os
+import numpy as np
+sys.path.append('../lib/')
+sys.path.append('../Trabalho2/')
+import objloader as objl
+import vertexpack as vp
+import mesh2
+import synth
+
+## Decode a packed buffer as the shader does.
+def decode(packed, normal_format, lo, hi):
+    position = packed[:, :8].copy().view(np.uint16)[:, :3]/65535.0
+    positions = lo + position*(hi - lo)
+    if normal_format == vp.OCTAHEDRAL:
+        normals = vp.octDecode(packed[:, 8:12].copy().view(np.int16))
+    else:
+        word = packed[:, 8:12].copy().view(np.uint32)[:, 0].astype(np.int64)
+        q = np.stack([(word >> shift) & 0x3ff for shift in (0, 10, 20)], axis=1)
+        normals = np.maximum(np.where(q >= 512, q - 1024, q)/511.0, -1.0)
+        normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+    return positions, normals
+
+def main():
+    tmp = None
+    object_files = sys.argv[1:]
+    if not object_files:
+        tmp = tempfile.NamedTemporaryFile(suffix='.obj', delete=False)
+        tmp.close()
+        synth.writeGridObj(tmp.name, 708)
+        object_files = [tmp.name]
+
+    try:
+        for object_file in object_files:
+            mesh = objl.loadObj(object_file)
+            face_indexes, normal_indexes, normals = mesh2.getIndexesFromObject(mesh)
+            vertices, indices, meta = mesh2.getObject(face_indexes, normal_indexes, mesh.positions, normals,
+                                                      shift_normals=normals is mesh.normals)
+            lo, hi = [(np.array(meta[corner]) - meta['center'])/meta['scale'] for corner in ('aabb_min', 'aabb_max')]
+            unit = vertices[:, 3:6]/np.linalg.norm(vertices[:, 3:6], axis=1, keepdims=True)
+
+            print(object_file)
+            print("  %d vertices, float: %d bytes per vertex, %d bytes"
+                  % (len(vertices), vertices.itemsize*vertices.shape[1], vertices.nbytes))
+            for normal_format in (vp.OCTAHEDRAL, vp.SNORM_1010102):
+                start = time.perf_counter()
+                packed, layout = vp.packVertices(vertices[:, :3], vertices[:, 3:6], lo, hi,
+                                                 normal_format=normal_format)
+                seconds = time.perf_counter() - start
+                positions, decoded = decode(packed, normal_format, lo, hi)
+                position_error = np.abs(positions - vertices[:, :3]).max()
+                angle = np.degrees(np.arccos(np.clip(np.einsum('ij,ij->i', decoded, unit), -1.0, 1.0))).max()
+                print("  %-8s %d bytes per vertex, %d bytes, packed in %.3f s, "
+                      "position error %.2e, normal error %.3f deg"
+                      % (normal_format + ':', packed.shape[1], packed.nbytes, seconds, position_error, angle))
+    finally:
+        if tmp is not None:
+            os.remove(tmp.name)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+## @file legacy.py
+# Original loading path of Trabalho2/mesh2.py.
+#
+# Kept unchanged as the reference the benchmarks compare against: pywavefront
+# parses the file and the index lists are read again line by line.
+
+import numpy as np
+import pywavefront
+
+def normalizeObject(obj, max_coord, x_medio, y_medio, z_medio):
+    for i in range(int(len(obj)/3)):
+        obj[i*3] = (obj[i*3] - x_medio) / max_coord
+        obj[i*3+1] = (obj[i*3+1] - y_medio) / max_coord
+        obj[i*3+2] = (obj[i*3+2] - z_medio) / max_coord
+    return obj
+
+def getIndexes(object_file):
+    faces = []
+    with open(object_file) as f:
+        lines = f.readlines()
+        for line in lines:
+            if line[0] == 'f':
+                space_split = line.split(' ')
+
+                faces.append([int(space_split[1]) - 1,
+                                int(space_split[2]) - 1,
+                                int(space_split[3]) - 1])
+
+                if len(space_split) == 5:
+                    faces.append([int(space_split[1].split('/')[0]) - 1,
+                                    int(space_split[3].split('/')[0]) - 1,
+                                    int(space_split[4].split('/')[0]) - 1])
+
+    return faces
+
+def getIndexesAndNormals(object_file):
+    faces = []
+    normals = []
+    with open(object_file) as f:
+        lines = f.readlines()
+        for line in lines:
+            if line[0] == 'f':
+                space_split = line.split(' ')
+
+                faces.append([int(space_split[1].split('/')[0]) - 1,
+                                int(space_split[2].split('/')[0]) - 1,
+                                int(space_split[3].split('/')[0]) - 1])
+
+                normals.append([int(space_split[1].split('/')[2]) - 1,
+                                int(space_split[2].split('/')[2]) - 1,
+                                int(space_split[3].split('/')[2]) - 1])
+
+                if len(space_split) == 5:
+                    faces.append([int(space_split[1].split('/')[0]) - 1,
+                                    int(space_split[3].split('/')[0]) - 1,
+                                    int(space_split[4].split('/')[0]) - 1])
+
+                    normals.append([int(space_split[1].split('/')[2]) - 1,
+                                    int(space_split[3].split('/')[2]) - 1,
+                                    int(space_split[4].split('/')[2]) - 1])
+    return faces, normals
+
+def getIndexesFromObject(scene, object_file):
+    normals = []
+    if scene.parser.normals != []:
+        face_indexes, normal_indexes = getIndexesAndNormals(object_file)
+        normals = scene.parser.normals
+    else:
+        face_indexes = getIndexes(object_file)
+        normal_indexes = face_indexes
+        normals = scene.vertices
+    return face_indexes, normal_indexes, normals
+
+def getObject(face_indexes, normal_indexes, scene, normals):
+    object_ = []
+    max_coord = 0
+    x_max = scene.vertices[0][0]
+    x_min = scene.vertices[0][0]
+    y_max = scene.vertices[0][1]
+    y_min = scene.vertices[0][1]
+    z_max = scene.vertices[0][2]
+    z_min = scene.vertices[0][2]
+
+    for face, normal in zip(face_indexes, normal_indexes):
+        for v_face, v_normal in zip(face, normal):
+            x, y, z = scene.vertices[v_face]
+            n1, n2, n3 = normals[v_normal]
+            object_.append(x)
+            object_.append(y)
+            object_.append(z)
+            #normal
+            object_.append(n1)
+            object_.append(n2)
+            object_.append(n3)
+
+            x_max = max(x_max, x)
+            x_min = min(x_min, x)
+            y_max = max(y_max, y)
+            y_min = min(y_min, y)
+            z_max = max(z_max, z)
+            z_min = min(z_min, z)
+
+    x_medio = (x_max + x_min)/2
+    y_medio = (y_max + y_min)/2
+    z_medio = (z_max + z_min)/2
+
+    max_coord = max(abs(x_max - x_min), abs(y_max - y_min), abs(z_max - z_min))/2
+    object_ = normalizeObject(object_, max_coord, x_medio, y_medio, z_medio)
+    return object_
+
+## Parse with pywavefront and read the index lists again.
+def loadIndexes(object_file):
+    scene = pywavefront.Wavefront(object_file, create_materials=True, collect_faces=True)
+    face_indexes, normal_indexes, normals = getIndexesFromObject(scene, object_file)
+    return scene, face_indexes, normal_indexes, normals
+
+## Full original loadObject.
+def loadObject(object_file):
+    scene, face_indexes, normal_indexes, normals = loadIndexes(object_file)
+    object_ = getObject(face_indexes, normal_indexes, scene, normals)
+    return np.array(object_, dtype='float32')
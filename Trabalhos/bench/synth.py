@@ -0,0 +1,110 @@
+## @file synth.py
+# Synthetic OBJ files for the benchmarks.
+#
+# Writes a wavy n x n grid with normals, split in triangles or kept as quads,
+# or a soup of polygons of mixed sizes written in every corner format.
+
+import numpy as np
+
+## Grid mesh.
+#
+# @param n Number of vertices per side.
+# @return Positions (n*n,3), normals (n*n,3) and quads (F,4) of 1-based indexes.
+def gridMesh(n):
+    u, v = np.meshgrid(np.linspace(-1.0, 1.0, n), np.linspace(-1.0, 1.0, n))
+    h = 0.1*np.sin(4*u)*np.cos(4*v)
+    positions = np.stack((u, v, h), axis=-1).reshape(-1, 3)
+
+    # Normal of the height field z = h(u, v).
+    dhdu = 0.4*np.cos(4*u)*np.cos(4*v)
+    dhdv = -0.4*np.sin(4*u)*np.sin(4*v)
+    normals = np.stack((-dhdu, -dhdv, np.ones_like(h)), axis=-1).reshape(-1, 3)
+    normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+
+    i, j = np.meshgrid(np.arange(n - 1), np.arange(n - 1))
+    a = (j*n + i).ravel() + 1
+    quads = np.stack((a, a + 1, a + n + 1, a + n), axis=-1)
+    return positions, normals, quads
+
+## Write grid OBJ.
+#
+# @param path Output file name.
+# @param n Number of vertices per side.
+# @param quads Keep quads instead of triangles.
+def writeGridObj(path, n, quads=False):
+    positions, normals, faces = gridMesh(n)
+    if not quads:
+        faces = np.concatenate((faces[:, [0, 1, 2]], faces[:, [0, 2, 3]]), axis=1).reshape(-1, 3)
+
+    with open(path, 'w') as f:
+        f.write("# grid %d x %d\n" % (n, n))
+        np.savetxt(f, positions, fmt='v %.6f %.6f %.6f')
+        np.savetxt(f, normals, fmt='vn %.6f %.6f %.6f')
+        corners = np.repeat(faces, 2, axis=1)
+        np.savetxt(f, corners, fmt='f' + ' %d//%d'*faces.shape[1])
+
+## Write mixed polygon OBJ.
+#
+# Writes the grid vertices with random polygons of 3 to max_corners corners.
+# Records are interleaved with the faces, which use absolute and negative
+# indexes, the v, v/vt, v//vn and v/vt/vn corner formats and irregular
+# whitespace. Optionally some records are indented, some end with a comment
+# and some vt records have one (u) or three (u v w) values.
+#
+# @param path Output file name.
+# @param n Number of vertices per side.
+# @param n_faces Number of polygons.
+# @param max_corners Largest polygon.
+# @param formats Corner formats to draw from ('v', 'vt', 'vn', 'vtvn').
+# @param seed Random seed.
+# @param comments Add comments after some records.
+# @param indent Indent some records.
+# @param short_texcoords Write some vt records with one or three values.
+def writeMixedObj(path, n, n_faces, max_corners=8, formats=('vtvn',), seed=0, comments=False, indent=False,
+                  short_texcoords=False):
+    rng = np.random.default_rng(seed)
+    positions, normals, _ = gridMesh(n)
+    texcoords = positions[:, :2]*0.5 + 0.5
+    n_vertices = len(positions)
+
+    # Faces are spread between the vertex records, using the vertices defined so far.
+    n_blocks = max(1, min(n_faces, n_vertices)//64)
+    vertex_ends = np.linspace(0, n_vertices, n_blocks + 1).astype(int)[1:]
+    face_ends = np.linspace(0, n_faces, n_blocks + 1).astype(int)[1:]
+    corner_formats = {'v': '%d', 'vt': '%d/%d', 'vn': '%d//%d', 'vtvn': '%d/%d/%d'}
+    texcoord_formats = ['vt %.6f %.6f']
+    if short_texcoords:
+        texcoord_formats += ['vt %.6f', 'vt %.6f %.6f 0.5']
+
+    def write(f, lines):
+        if comments or indent:
+            lines = ['  \t'*(indent and i % 7 == 3) + line + ' # note'*(comments and i % 5 == 1)
+                     for i, line in enumerate(lines)]
+        f.write('\n'.join(lines) + '\n')
+
+    with open(path, 'w') as f:
+        f.write("# mixed polygons\n")
+        start_vertex = start_face = 0
+        for vertex_end, face_end in zip(vertex_ends, face_ends):
+            block = slice(start_vertex, vertex_end)
+            write(f, ['v %.6f %.6f %.6f' % tuple(p) for p in positions[block].tolist()])
+            lines = []
+            for i, t in enumerate(texcoords[block].tolist(), start_vertex):
+                texcoord = texcoord_formats[i % len(texcoord_formats)]
+                lines.append(texcoord % tuple(t[:texcoord.count('%')]))
+            write(f, lines)
+            write(f, ['vn  %.6f %.6f %.6f ' % tuple(n) for n in normals[block].tolist()])
+            start_vertex = vertex_end
+
+            lines = []
+            for i in range(start_face, face_end):
+                k = rng.integers(3, max_corners + 1)
+                indexes = rng.integers(1, vertex_end + 1, k)
+                relative = rng.random(k) < 0.3
+                indexes[relative] -= vertex_end + 1
+                corner = corner_formats[formats[rng.integers(len(formats))]]
+                n_values = corner.count('%d')
+                separator = ' ' if rng.random() < 0.8 else '  \t'
+                lines.append('f ' + separator.join(corner % ((v,)*n_values) for v in indexes) + ' '*(i % 2))
+            write(f, lines)
+            start_face = face_end
@@ -0,0 +1,90 @@
+## @file cacheindex.py
+# Hash index shared by the on-disk caches.
+#
+# Cache entries are keyed by a hash of the content of their source file. The
+# hash is remembered in an index file in the cache directory, per path, size
+# and modification time, so unchanged files are not read again. Records whose
+# content has no entry left are pruned when entries are evicted. Files are
+# written atomically, through a temporary file renamed over the final one.
+
+import os
+import json
+import hashlib
+import threading
+
+## Name of the file remembering the hash of already hashed files.
+INDEX_FILE = 'index.json'
+
+## Lock of the hash index, shared by the threads of a process.
+_index_lock = threading.Lock()
+
+## Write a file atomically.
+#
+# @param path File name.
+# @param write Function writing the content to the temporary file it is given.
+def writeAtomic(path, write):
+    tmp = path + '.tmp%d-%d' % (os.getpid(), threading.get_ident())
+    write(tmp)
+    os.replace(tmp, path)
+
+## Read the hash index.
+#
+# @param cache_dir Cache directory.
+# @return Dictionary from absolute path to its stamp and hash, empty if missing.
+def readIndex(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, INDEX_FILE), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+## Write the hash index.
+def _writeIndex(cache_dir, index):
+    def write(tmp):
+        with open(tmp, 'w') as f:
+            json.dump(index, f)
+    writeAtomic(os.path.join(cache_dir, INDEX_FILE), write)
+
+## File hash.
+#
+# Hashes the content of a file, or returns the hash remembered for its path,
+# size and modification time.
+#
+# @param file_name File name.
+# @param cache_dir Cache directory holding the index.
+# @return Hex digest.
+def fileHash(file_name, cache_dir):
+    path = os.path.abspath(file_name)
+    st = os.stat(path)
+    stamp = [st.st_size, st.st_mtime_ns]
+
+    with _index_lock:
+        entry = readIndex(cache_dir).get(path)
+    if entry is not None and entry['stamp'] == stamp:
+        return entry['hash']
+
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 24), b''):
+            h.update(chunk)
+    digest = h.hexdigest()
+
+    with _index_lock:
+        index = readIndex(cache_dir)
+        index[path] = {'stamp': stamp, 'hash': digest}
+        os.makedirs(cache_dir, exist_ok=True)
+        _writeIndex(cache_dir, index)
+    return digest
+
+## Prune the hash index.
+#
+# @param cache_dir Cache directory.
+# @param digests Hashes whose records are removed.
+def pruneIndex(cache_dir, digests):
+    if not digests:
+        return
+    with _index_lock:
+        index = readIndex(cache_dir)
+        pruned = {path: entry for path, entry in index.items() if entry['hash'] not in digests}
+        if len(pruned) < len(index):
+            _writeIndex(cache_dir, pruned)
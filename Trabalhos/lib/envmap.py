@@ -0,0 +1,117 @@
+## @file envmap.py
+# Environment maps.
+#
+# Converts an equirectangular panorama (longitude along the width, latitude
+# along the height, +Y up at the first row) to the six faces of a cube map.
+# The direction of every texel of the faces is computed with array operations,
+# converted to panorama coordinates and sampled bilinearly (wrapping around in
+# longitude). Faces are independent, so they can be converted on several
+# threads (NumPy releases the GIL in the array operations). Converted faces
+# are stored in the texture cache, keyed by the panorama content and the face
+# size.
+
+import numpy as np
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+import textures as tex
+import texcache as tc
+
+## Faces in the order of the GL cube map targets (+X, -X, +Y, -Y, +Z, -Z):
+# direction of the face center, of increasing s and of increasing t (rows).
+FACE_AXES = np.array([
+    [[ 1,  0,  0], [ 0,  0, -1], [ 0, -1,  0]],
+    [[-1,  0,  0], [ 0,  0,  1], [ 0, -1,  0]],
+    [[ 0,  1,  0], [ 1,  0,  0], [ 0,  0,  1]],
+    [[ 0, -1,  0], [ 1,  0,  0], [ 0,  0, -1]],
+    [[ 0,  0,  1], [ 1,  0,  0], [ 0, -1,  0]],
+    [[ 0,  0, -1], [-1,  0,  0], [ 0, -1,  0]],
+], dtype=np.float32)
+
+## Directions of the texels of cube map faces.
+#
+# @param size Side of the faces.
+# @param faces Indexes of the faces (see FACE_AXES).
+# @return Unit directions (faces, size, size, 3), float32.
+def faceDirections(size, faces=range(6)):
+    axes = FACE_AXES[list(faces)]
+    coords = (np.arange(size, dtype=np.float32) + 0.5)*(2.0/size) - 1.0
+    directions = (axes[:, None, None, 0] + coords[None, None, :, None]*axes[:, None, None, 1]
+                  + coords[None, :, None, None]*axes[:, None, None, 2])
+    directions /= np.linalg.norm(directions, axis=-1, keepdims=True)
+    return directions
+
+## Sample a panorama.
+#
+# @param pano Pixels of the panorama (height, width, channels).
+# @param directions Unit directions (..., 3).
+# @return Bilinearly sampled pixels (..., channels), uint8.
+def sampleEquirect(pano, directions):
+    height, width = pano.shape[:2]
+    x, y, z = directions[..., 0], directions[..., 1], directions[..., 2]
+    # -Z at the center of the panorama, longitude growing towards +X.
+    u = np.arctan2(x, -z)*(0.5/np.pi) + 0.5
+    v = np.arccos(np.clip(y, -1.0, 1.0))*(1.0/np.pi)
+
+    px = u*width - 0.5
+    py = v*height - 0.5
+    x0 = np.floor(px)
+    y0 = np.floor(py)
+    fx = (px - x0)[..., None]
+    fy = (py - y0)[..., None]
+    x0 = x0.astype(np.intp) % width
+    x1 = (x0 + 1) % width
+    y1 = np.clip(y0 + 1, 0, height - 1).astype(np.intp)
+    y0 = np.clip(y0, 0, height - 1).astype(np.intp)
+
+    pano = pano.astype(np.float32) if pano.dtype != np.float32 else pano
+    top = pano[y0, x0]*(1 - fx) + pano[y0, x1]*fx
+    bottom = pano[y1, x0]*(1 - fx) + pano[y1, x1]*fx
+    return np.clip(top*(1 - fy) + bottom*fy + 0.5, 0, 255).astype(np.uint8)
+
+## Convert a panorama to a cube map.
+#
+# @param pano Pixels of the panorama (height, width, channels).
+# @param size Side of the faces, None for a quarter of the panorama width.
+# @param workers Threads, one face each; 1 converts all faces at once.
+# @return The six faces (size, size, channels), in the order of FACE_AXES.
+def equirectToCubemap(pano, size=None, workers=1):
+    size = size or max(1, pano.shape[1]//4)
+    pano = pano.astype(np.float32)
+    if workers <= 1:
+        return list(sampleEquirect(pano, faceDirections(size)))
+    with ThreadPoolExecutor(max_workers=min(workers, 6)) as pool:
+        return list(pool.map(lambda face: sampleEquirect(pano, faceDirections(size, [face])[0]), range(6)))
+
+## Face size of a panorama.
+#
+# Reads only the header.
+#
+# @param image_file Panorama file.
+# @param size Side of the faces, None for a quarter of the panorama width.
+# @return Side of the faces.
+def faceSize(image_file, size=None):
+    if size:
+        return size
+    with Image.open(image_file) as img:
+        return max(1, img.size[0]//4)
+
+## Load a panorama as a cube map.
+#
+# Returns the cached faces of an image, converting and storing them first if
+# needed.
+#
+# @param image_file Panorama file.
+# @param size Side of the faces, None for a quarter of the panorama width.
+# @param workers Threads converting the faces.
+# @param cache_dir Cache directory.
+# @return The six faces, in the order of FACE_AXES, and whether they were cached.
+def loadEquirectCubemap(image_file, size=None, workers=1, cache_dir=None):
+    size = faceSize(image_file, size)
+    key = tc.cacheKey(image_file, size, False, 'bilinear', cache_dir=cache_dir) + '-cubemap'
+    cached = tc.load(key, cache_dir)
+    if cached is not None:
+        return cached[0], True
+
+    faces = equirectToCubemap(tex.readImage(image_file), size, workers)
+    tc.store(key, faces, cache_dir)
+    return faces, False
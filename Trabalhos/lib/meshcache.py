@@ -0,0 +1,145 @@
+## @file meshcache.py
+# On-disk cache of loaded meshes.
+#
+# Stores the final buffers of a mesh (interleaved vertices, element indexes)
+# as .npy files, which are memory-mapped on load, next to a .json file with
+# their metadata (stride, attribute layout, bounding box, normalization center
+# and scale). Each entry is a directory named after its key. Entries are
+# keyed by a hash of the OBJ content, by the loader version and by the options
+# the buffers were built with, and the least recently used entries are evicted
+# when the cache grows past a size limit.
+
+import os
+import json
+import time
+import shutil
+import numpy as np
+import objloader as objl
+import cacheindex as ci
+
+## Cache format version. Changing it invalidates every entry.
+VERSION = 4
+
+## Cache directory (MESH_CACHE_DIR overrides it).
+CACHE_DIR = os.environ.get('MESH_CACHE_DIR',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'computacao-grafica', 'meshes'))
+
+## Maximum size of the cache directory in bytes.
+MAX_BYTES = 4*1024**3
+
+## Name of the metadata file of an entry.
+_META_FILE = 'meta.json'
+## Age in seconds after which an entry without metadata is taken as abandoned.
+_ORPHAN_AGE = 3600
+
+## File hash.
+#
+# @param file_name File name.
+# @param cache_dir Cache directory.
+# @return Hex digest of the content (see cacheindex.fileHash).
+def fileHash(file_name, cache_dir=None):
+    return ci.fileHash(file_name, cache_dir or CACHE_DIR)
+
+## Cache key.
+#
+# @param object_file OBJ file name.
+# @param cache_dir Cache directory.
+# @param variant Optional string naming the options the entry was built with.
+# @return Key combining the content hash with the cache and loader versions.
+def cacheKey(object_file, cache_dir=None, variant=None):
+    key = '%s-c%d-l%d' % (fileHash(object_file, cache_dir), VERSION, objl.LOADER_VERSION)
+    if variant:
+        key += '-' + ''.join(c if c.isalnum() or c in '.-' else '_' for c in str(variant))
+    return key
+
+## Load mesh.
+#
+# @param key Cache key.
+# @param cache_dir Cache directory.
+# @return Dictionary of memory-mapped arrays and metadata, or None if not cached.
+def load(key, cache_dir=None):
+    cache_dir = cache_dir or CACHE_DIR
+    entry = os.path.join(cache_dir, key)
+    try:
+        with open(os.path.join(entry, _META_FILE), 'r') as f:
+            meta = json.load(f)
+        arrays = {}
+        for name in meta['arrays']:
+            arrays[name] = np.load(os.path.join(entry, name + '.npy'), mmap_mode='r')
+    except (OSError, ValueError, KeyError):
+        return None
+
+    # Mark as recently used.
+    os.utime(os.path.join(entry, _META_FILE))
+    return arrays, meta
+
+## Store mesh.
+#
+# @param key Cache key.
+# @param arrays Dictionary of arrays to store.
+# @param meta Metadata (JSON serializable).
+# @param cache_dir Cache directory.
+# @param max_bytes Size limit of the cache directory.
+def store(key, arrays, meta, cache_dir=None, max_bytes=None):
+    cache_dir = cache_dir or CACHE_DIR
+    entry = os.path.join(cache_dir, key)
+    os.makedirs(entry, exist_ok=True)
+
+    for name, array in arrays.items():
+        def writeArray(tmp):
+            with open(tmp, 'wb') as f:
+                np.save(f, np.ascontiguousarray(array))
+        ci.writeAtomic(os.path.join(entry, name + '.npy'), writeArray)
+
+    # The arrays go first, an entry only counts once its metadata exists.
+    meta = dict(meta, arrays=list(arrays))
+    def writeMeta(tmp):
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+    ci.writeAtomic(os.path.join(entry, _META_FILE), writeMeta)
+
+    evict(cache_dir, MAX_BYTES if max_bytes is None else max_bytes)
+
+## Evict entries.
+#
+# Removes the least recently used entries until the cache fits in max_bytes,
+# and the files of the hash index whose content has no entry left. Entries
+# without metadata are skipped while a store may still be writing them.
+#
+# @param cache_dir Cache directory.
+# @param max_bytes Size limit.
+def evict(cache_dir, max_bytes):
+    entries = []
+    for name in os.listdir(cache_dir):
+        entry = os.path.join(cache_dir, name)
+        if not os.path.isdir(entry):
+            continue
+        try:
+            files = [os.path.join(entry, f) for f in os.listdir(entry)]
+            size = sum(os.path.getsize(f) for f in files)
+            if os.path.exists(os.path.join(entry, _META_FILE)):
+                used = os.stat(os.path.join(entry, _META_FILE)).st_mtime_ns
+            elif time.time() - os.stat(entry).st_mtime > _ORPHAN_AGE:
+                # Left behind by an interrupted store, removed first.
+                used = 0
+            else:
+                # Still being stored.
+                continue
+        except OSError:
+            continue
+        entries.append((used, size, entry))
+
+    total = sum(size for _, size, _ in entries)
+    evicted = set()
+    kept = set()
+    for _, size, entry in sorted(entries):
+        # Keys start with the content hash.
+        digest = os.path.basename(entry).split('-')[0]
+        if total <= max_bytes:
+            kept.add(digest)
+            continue
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+        evicted.add(digest)
+
+    ci.pruneIndex(cache_dir, evicted - kept)
@@ -0,0 +1,197 @@
+## @file normals.py
+# Smooth vertex normals for meshes without normals.
+#
+# Face normals come from a batched cross product and are accumulated per
+# vertex with np.bincount, weighted by the face area or by the angle of the
+# face at the vertex. With a crease angle, edges between faces whose normals
+# differ by more than that angle are sharp, and the faces around a vertex are
+# only averaged within the fans bounded by sharp edges.
+#
+# Coordinates are handled as (3,N) arrays, one contiguous row per axis, and
+# triangles are processed in blocks to bound memory.
+
+import numpy as np
+
+## Triangles per block.
+BLOCK_SIZE = 1 << 20
+
+## Face normals of a block, (3,T) arrays.
+#
+# @param xyz Positions, one row per axis, (3,N).
+# @param corners Position indexes, one row per triangle corner, (3,T).
+# @return Corner coordinates and cross products of the triangle edges (twice
+#         the triangle area long).
+def _faceNormals(xyz, corners):
+    p = [xyz.take(c, axis=1) for c in corners]
+    e1 = p[1] - p[0]
+    e2 = p[2] - p[0]
+    normals = np.empty_like(e1)
+    normals[0] = e1[1]*e2[2] - e1[2]*e2[1]
+    normals[1] = e1[2]*e2[0] - e1[0]*e2[2]
+    normals[2] = e1[0]*e2[1] - e1[1]*e2[0]
+    return p, normals
+
+## Face normals.
+#
+# @param positions Vertex positions, (N,3).
+# @param faces Position indexes of each triangle, (T,3).
+# @return Cross products of the triangle edges, (T,3); their length is twice
+#         the triangle area.
+def faceNormals(positions, faces):
+    xyz = np.ascontiguousarray(np.asarray(positions, dtype=np.float64).T)
+    return _faceNormals(xyz, np.ascontiguousarray(np.asarray(faces).T))[1].T
+
+## Corner weights of a block.
+#
+# Area weights are the lengths of the raw cross products. The angle at a
+# corner is atan2(|e1 x e2|, e1 . e2) of the two edges leaving it, where
+# |e1 x e2| is the same at the three corners.
+#
+# @param xyz Positions, one row per axis, (3,N).
+# @param corners Position indexes, one row per triangle corner, (3,T).
+# @param weighting 'area' or 'angle'.
+# @return Unit face normals (3,T) and the weight of each face at each of its
+#         corners (3,T).
+def _cornerWeights(xyz, corners, weighting):
+    p, normals = _faceNormals(xyz, corners)
+    lengths = np.sqrt(np.einsum('ij,ij->j', normals, normals))
+    np.divide(normals, lengths, out=normals, where=lengths > 0)
+
+    if weighting == 'area':
+        return normals, np.broadcast_to(lengths, corners.shape)
+    if weighting == 'angle':
+        angles = np.empty(corners.shape, dtype=np.float64)
+        for i in range(3):
+            a = p[(i + 1) % 3] - p[i]
+            b = p[(i + 2) % 3] - p[i]
+            angles[i] = np.arctan2(lengths, np.einsum('ij,ij->j', a, b))
+        return normals, angles
+    raise ValueError("Unknown normal weighting: " + str(weighting))
+
+## Normalize rows.
+#
+# Rows of zero length (vertices only used by degenerate faces) stay zero.
+def _normalize(vectors):
+    length = np.sqrt(np.einsum('ij,ij->i', vectors, vectors))[:, None]
+    np.divide(vectors, length, out=vectors, where=length > 0)
+    return vectors
+
+## Weighted sums.
+#
+# @param sums Sums of each group, (n_groups,3), accumulated in place.
+# @param groups Group of each triangle corner, (3,T).
+# @param normals Unit face normals, (3,T).
+# @param weights Weight of each corner, (3,T).
+def _addGroupSums(sums, groups, normals, weights):
+    groups = groups.ravel()
+    for axis in range(3):
+        sums[:, axis] += np.bincount(groups, (weights*normals[axis]).ravel(), minlength=len(sums))
+
+## Smooth normals.
+#
+# One normal per position, the weighted average of the normals of the faces
+# around it.
+#
+# @param positions Vertex positions, (N,3).
+# @param faces Position indexes of each triangle, (T,3).
+# @param weighting 'area' or 'angle'.
+# @return Unit normals, (N,3).
+def smoothNormals(positions, faces, weighting='area'):
+    xyz = np.ascontiguousarray(np.asarray(positions, dtype=np.float64).T)
+    faces = np.asarray(faces)
+    sums = np.zeros((xyz.shape[1], 3), dtype=np.float64)
+    for start in range(0, len(faces), BLOCK_SIZE):
+        corners = np.ascontiguousarray(faces[start:start + BLOCK_SIZE].T)
+        normals, weights = _cornerWeights(xyz, corners, weighting)
+        _addGroupSums(sums, corners, normals, weights)
+    return _normalize(sums)
+
+## Connected labels.
+#
+# Labels the connected components of a graph by hooking the larger label of
+# every edge to the smaller one and then compressing the label paths, until
+# no edge joins two labels.
+#
+# @param n Number of nodes.
+# @param u, v Nodes of each edge.
+# @return Smallest node of the component of each node.
+def _connectedLabels(n, u, v):
+    labels = np.arange(n)
+    while len(u) > 0:
+        lu, lv = labels[u], labels[v]
+        different = lu != lv
+        if not different.any():
+            break
+        u, v, lu, lv = u[different], v[different], lu[different], lv[different]
+        np.minimum.at(labels, np.maximum(lu, lv), np.minimum(lu, lv))
+        while True:
+            parent = labels[labels]
+            if np.array_equal(parent, labels):
+                break
+            labels = parent
+    return labels
+
+## Creased normals.
+#
+# Edges between faces whose normals differ by more than crease_angle are
+# sharp. The corners around a position are split in fans of faces joined by
+# smooth edges, and each fan gets the weighted average of the normals of its
+# faces.
+#
+# @param positions Vertex positions, (N,3).
+# @param faces Position indexes of each triangle, (T,3).
+# @param crease_angle Largest angle between smoothed faces, in radians.
+# @param weighting 'area' or 'angle'.
+# @return Unit normals (M,3) and the normal index of each corner (T,3).
+def creasedNormals(positions, faces, crease_angle, weighting='area'):
+    xyz = np.ascontiguousarray(np.asarray(positions, dtype=np.float64).T)
+    faces = np.asarray(faces, dtype=np.int64)
+    corners = np.ascontiguousarray(faces.T)
+    normals = np.empty(corners.shape, dtype=np.float64)
+    weights = np.empty(corners.shape, dtype=np.float64)
+    for start in range(0, len(faces), BLOCK_SIZE):
+        block = slice(start, start + BLOCK_SIZE)
+        normals[:, block], weights[:, block] = _cornerWeights(xyz, corners[:, block], weighting)
+
+    # Corner i of face f is number i*T + f. Half-edge i of a face goes from its
+    # corner i to its corner i + 1, and the half-edges of an edge are next to
+    # each other once sorted by edge.
+    n_faces = len(faces)
+    start_corner = np.arange(3*n_faces)
+    end_corner = np.roll(start_corner.reshape(3, -1), -1, axis=0).ravel()
+    a, b = corners.ravel(), np.roll(corners, -1, axis=0).ravel()
+    keys = np.minimum(a, b)*xyz.shape[1] + np.maximum(a, b)
+    order = np.argsort(keys)
+    same_edge = keys[order[1:]] == keys[order[:-1]]
+    h, g = order[:-1][same_edge], order[1:][same_edge]
+
+    # Smooth edges join the corners of both faces at each end of the edge.
+    fh, fg = h % n_faces, g % n_faces
+    smooth = np.einsum('ij,ij->j', normals[:, fh], normals[:, fg]) >= np.cos(crease_angle)
+    h, g = h[smooth], g[smooth]
+    flipped = a[h] != a[g]
+    g_start = np.where(flipped, end_corner[g], start_corner[g])
+    g_end = np.where(flipped, start_corner[g], end_corner[g])
+    labels = _connectedLabels(3*n_faces, np.concatenate((start_corner[h], end_corner[h])),
+                              np.concatenate((g_start, g_end)))
+
+    # Labels are corner numbers, renumbered in order.
+    used = np.bincount(labels, minlength=3*n_faces) > 0
+    rank = np.cumsum(used) - 1
+    normal_indexes = rank[labels].reshape(3, -1)
+    sums = np.zeros((int(used.sum()), 3), dtype=np.float64)
+    _addGroupSums(sums, normal_indexes, normals, weights)
+    return _normalize(sums), np.ascontiguousarray(normal_indexes.T)
+
+## Generate normals.
+#
+# @param positions Vertex positions, (N,3).
+# @param faces Position indexes of each triangle, (T,3).
+# @param weighting 'area' or 'angle'.
+# @param crease_angle Largest angle between smoothed faces in radians, None to
+#        smooth every face around a position.
+# @return Unit normals and the normal index of each corner, (T,3).
+def generateNormals(positions, faces, weighting='area', crease_angle=None):
+    if crease_angle is None:
+        return smoothNormals(positions, faces, weighting), faces
+    return creasedNormals(positions, faces, crease_angle, weighting)
@@ -0,0 +1,644 @@
+## @file objloader.py
+# Wavefront OBJ loader.
+#
+# Reads the v, vn, vt and f records of an OBJ file in a single pass straight
+# into NumPy arrays. Records are classified per line with array operations and
+# the numbers of each record type are converted by NumPy's text parser, so no
+# Python object is created per line or per value. The file is streamed in
+# fixed-size chunks into arrays that grow geometrically, so memory stays
+# bounded by the size of the parsed arrays rather than by the size of the text.
+
+import os
+import numpy as np
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
+from concurrent.futures import ProcessPoolExecutor
+
+## Loader version. Changes whenever the arrays produced for a file change.
+LOADER_VERSION = 4
+
+## Size of the chunks read from the file, in bytes.
+CHUNK_SIZE = 1 << 23
+
+## Minimum file size for loadObjParallel to use worker processes, in bytes.
+PARALLEL_MIN_BYTES = 1 << 26
+
+## Start method of the worker processes. loadObjParallel may run on a thread
+# of a program holding a GL context, and forking would copy it and the locks
+# of the other threads, so workers start from a fresh interpreter instead.
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+## Type of the index arrays.
+INDEX_DTYPE = np.int32
+
+## Whitespace lookup table (space, tab, newline, vertical tab, form feed, carriage return).
+_WHITESPACE = np.zeros(256, dtype=bool)
+_WHITESPACE[[9, 10, 11, 12, 13, 32]] = True
+
+## Line types.
+_OTHER    = 0
+_POSITION = 1
+_NORMAL   = 2
+_TEXCOORD = 3
+_FACE     = 4
+
+## OBJ mesh.
+#
+# Arrays read from an OBJ file. Indexes are 0-based and every face is already
+# split in triangles.
+class ObjMesh:
+
+    ## Constructor.
+    #
+    # @param positions Vertex positions, (N,3) float64.
+    # @param normals Vertex normals, (M,3) float64 (empty if the file has none).
+    # @param texcoords Texture coordinates, (K,2) float64 (empty if the file has none).
+    # @param face_indexes Position indexes of each triangle, (T,3) INDEX_DTYPE.
+    # @param normal_indexes Normal indexes of each triangle, (T,3) INDEX_DTYPE or None.
+    # @param texcoord_indexes Texture coordinate indexes of each triangle, (T,3) INDEX_DTYPE or None.
+    def __init__(self, positions, normals, texcoords, face_indexes, normal_indexes, texcoord_indexes):
+        self.positions = positions
+        self.normals = normals
+        self.texcoords = texcoords
+        self.face_indexes = face_indexes
+        self.normal_indexes = normal_indexes
+        self.texcoord_indexes = texcoord_indexes
+
+## Growable array.
+#
+# Array of rows that grows geometrically as rows are appended.
+class GrowableArray:
+
+    ## Constructor.
+    #
+    # @param columns Number of columns.
+    # @param dtype Type of the values.
+    # @param capacity Initial number of rows.
+    def __init__(self, columns, dtype, capacity=1024):
+        self._data = np.empty((capacity, columns), dtype=dtype)
+        self._size = 0
+
+    ## Append rows.
+    #
+    # @param rows (n, columns) array.
+    def append(self, rows):
+        size = self._size + len(rows)
+        if size > len(self._data):
+            grown = np.empty((max(size, 2*len(self._data)), self._data.shape[1]), dtype=self._data.dtype)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+        self._data[self._size:size] = rows
+        self._size = size
+
+    ## Number of rows.
+    def __len__(self):
+        return self._size
+
+    ## Rows appended so far. The unused capacity is released.
+    def array(self):
+        if len(self._data) != self._size:
+            self._data = self._data[:self._size].copy()
+        return self._data
+
+## Tokens.
+#
+# Finds the whitespace separated tokens of a buffer.
+#
+# @param b Buffer as uint8 array, where every line ends with a newline.
+# @return First byte of each token and the line it belongs to.
+def _tokens(b):
+    ws = _WHITESPACE[b]
+    starts = ~ws
+    starts[1:] &= ws[:-1]
+    starts = np.flatnonzero(starts)
+    return starts, np.searchsorted(np.flatnonzero(b == 10), starts)
+
+## Token count.
+#
+# Counts the whitespace separated tokens of each line of a buffer.
+#
+# @param buf Bytes where every line ends with a newline.
+# @param n_lines Number of lines in buf.
+# @return Number of tokens per line.
+def _tokenCounts(buf, n_lines):
+    _, line_of = _tokens(np.frombuffer(buf, dtype=np.uint8))
+    return np.bincount(line_of, minlength=n_lines)
+
+## Numbers of a text buffer.
+#
+# @param text Bytes with whitespace separated numbers.
+# @param dtype Type of the numbers.
+# @return 1-D array.
+def _fromText(text, dtype):
+    try:
+        return np.fromstring(text, dtype=dtype, sep=' ')
+    except ValueError:
+        raise ValueError("Malformed OBJ records") from None
+
+## Blank comments.
+#
+# Replaces everything from a '#' to the end of its line with spaces.
+#
+# @param buf Writable buffer as uint8 array, where every line ends with a newline.
+# @param ends Position of the newline of each line.
+def _blankComments(buf, ends):
+    hashes = np.flatnonzero(buf == ord('#'))
+    # First '#' of each line.
+    line_of = np.searchsorted(ends, hashes)
+    first = np.ones(len(hashes), dtype=bool)
+    first[1:] = line_of[1:] != line_of[:-1]
+    hashes = hashes[first]
+    counts = ends[line_of[first]] - hashes
+    total = int(counts.sum())
+    offsets = np.repeat(hashes - (np.cumsum(counts) - counts), counts) + np.arange(total)
+    buf[offsets] = 32
+
+## Select records.
+#
+# Gathers the lines of a given type, with their keyword blanked, into a new buffer.
+#
+# @param buf Buffer as uint8 array.
+# @param lengths Length of each line, newline included.
+# @param indents Whitespace before the keyword of each line.
+# @param line_types Type of each line.
+# @param line_type Type to select.
+# @param keyword_len Length of the record keyword.
+# @return Bytes with the selected lines and the number of lines.
+def _selectRecords(buf, lengths, indents, line_types, line_type, keyword_len):
+    selected = line_types == line_type
+    n_lines = int(np.count_nonzero(selected))
+    if n_lines == 0:
+        return b'', 0
+
+    records = buf[np.repeat(selected, lengths)]
+    lengths = lengths[selected]
+    offsets = np.cumsum(lengths) - lengths + indents[selected]
+    for i in range(keyword_len):
+        records[offsets + i] = 32
+
+    return records.tobytes(), n_lines
+
+## Parse values.
+#
+# Converts the numbers of a set of records and keeps the first columns of each
+# one. Records with fewer values than columns, but at least min_columns, are
+# padded with zeros.
+#
+# @param records Bytes with one record per line.
+# @param n_lines Number of records.
+# @param columns Number of values to keep per record.
+# @param dtype Type of the values.
+# @param min_columns Fewest values a record may have (default columns).
+# @return (n_lines, columns) array.
+def _parseValues(records, n_lines, columns, dtype, min_columns=None):
+    if n_lines == 0:
+        return np.zeros((0, columns), dtype=dtype)
+
+    values = _fromText(records, dtype)
+    counts = _tokenCounts(records, n_lines)
+    if min_columns is None:
+        min_columns = columns
+    if values.size != counts.sum() or counts.min() < min_columns:
+        raise ValueError("Malformed OBJ records")
+
+    if values.size == n_lines*columns and counts.min() == columns:
+        return values.reshape(n_lines, columns)
+
+    offsets = np.cumsum(counts) - counts
+    if counts.min() >= columns:
+        return values[offsets[:, None] + np.arange(columns)]
+
+    present = np.arange(columns) < counts[:, None]
+    result = np.zeros((n_lines, columns), dtype=dtype)
+    result[present] = values[(offsets[:, None] + np.arange(columns))[present]]
+    return result
+
+## Fan triangles.
+#
+# Splits polygons in triangle fans, (0,1,2), (0,2,3), ..., (0,k-2,k-1). Faces
+# are grouped by number of corners and the triangles of each group are written
+# to their place in face order, so no sort is needed.
+#
+# @param counts Number of corners of each face.
+# @return (T,3) indexes of the corners of each triangle.
+def _fanTriangles(counts):
+    n_triangles = np.maximum(counts - 2, 0)
+    offsets = np.cumsum(counts) - counts
+    first = np.cumsum(n_triangles) - n_triangles
+
+    triangles = np.empty((int(n_triangles.sum()), 3), dtype=np.int64)
+    for k in np.unique(counts[counts >= 3]):
+        faces = np.flatnonzero(counts == k)
+        j = np.arange(k - 2)
+        fan = np.stack((np.zeros_like(j), j + 1, j + 2), axis=-1)
+        triangles[first[faces][:, None] + j] = offsets[faces][:, None, None] + fan
+    return triangles
+
+## Parse faces.
+#
+# Converts face records into triangles of corner indexes. Faces of any number
+# of corners are split in triangle fans (faces with less than three corners
+# are dropped). Every corner may be written as v, v/vt, v//vn or v/vt/vn, and
+# negative indexes are relative to the records defined before the face.
+#
+# @param records Bytes with one face record per line.
+# @param n_lines Number of faces.
+# @param before (n_lines,3) number of positions, texture coordinates and normals
+#        defined before each face.
+# @return Position, texture coordinate and normal indexes, (T,3) each and 1-based,
+#         (None when some corner misses them) and, for each of the three, the flat
+#         positions of the indexes that were relative.
+def _parseFaces(records, n_lines, before):
+    empty = np.zeros(0, dtype=np.int64)
+    if n_lines == 0:
+        return np.zeros((0, 3), dtype=np.int64), None, None, (empty, empty, empty)
+
+    # An empty texture coordinate becomes 0, every corner then has 1, 2 or 3 values.
+    records = records.replace(b'//', b'/0/')
+    b = np.frombuffer(records, dtype=np.uint8)
+    token_starts, corner_face = _tokens(b)
+    counts = np.bincount(corner_face, minlength=n_lines)
+
+    slash_corner = np.searchsorted(token_starts, np.flatnonzero(b == ord('/')), 'right') - 1
+    n_values = np.bincount(slash_corner, minlength=len(token_starts)) + 1
+
+    values = _fromText(records.replace(b'/', b' '), np.int64)
+    if values.size != n_values.sum() or n_values.max() > 3:
+        raise ValueError("Malformed OBJ face records")
+
+    offsets = np.cumsum(n_values) - n_values
+    last = len(values) - 1
+    columns = [values[offsets],
+               np.where(n_values >= 2, values[np.minimum(offsets + 1, last)], 0),
+               np.where(n_values == 3, values[np.minimum(offsets + 2, last)], 0)]
+    if not columns[0].all():
+        raise ValueError("Malformed OBJ face records")
+
+    triangles = _fanTriangles(counts)
+    result = []
+    relative = []
+    for column, base in zip(columns, before.T):
+        if not column.all():
+            result.append(None)
+            relative.append(empty)
+            continue
+        is_relative = column < 0
+        column = np.where(is_relative, base[corner_face] + column + 1, column)
+        result.append(column[triangles])
+        relative.append(np.flatnonzero(is_relative[triangles]))
+
+    v, vt, vn = result
+    return v, vt, vn, tuple(relative)
+
+## Parse OBJ buffer.
+#
+# Parses the v, vn, vt and f records of an OBJ buffer. Other records are
+# ignored, comments (from '#' to the end of the line) are skipped and records
+# may be indented.
+#
+# @param data Bytes with the OBJ content.
+# @param bases Number of positions, texture coordinates and normals defined
+#        before the buffer, used to resolve relative face indexes.
+# @return Positions, normals, texture coordinates, the face index arrays and
+#         the positions of the relative indexes (see _parseFaces).
+def parseObjBuffer(data, bases=(0, 0, 0)):
+    if not data.endswith(b'\n'):
+        data = data + b'\n'
+    buf = np.frombuffer(data, dtype=np.uint8)
+
+    ends = np.flatnonzero(buf == 10)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts + 1
+
+    if b'#' in data:
+        buf = buf.copy()
+        _blankComments(buf, ends)
+
+    # First non-whitespace character of each line, stepping over the
+    # indentation of the few lines that have it.
+    first = starts.copy()
+    indented = np.flatnonzero(_WHITESPACE[buf[first]] & (first < ends))
+    while indented.size:
+        first[indented] += 1
+        indented = indented[_WHITESPACE[buf[first[indented]]] & (first[indented] < ends[indented])]
+    indents = first - starts
+
+    # First three characters of each line (newline past the end of short lines).
+    c0 = buf[first]
+    c1 = buf[np.minimum(first + 1, ends)]
+    c2 = buf[np.minimum(first + 2, ends)]
+
+    line_types = np.full(len(starts), _OTHER, dtype=np.uint8)
+    line_types[(c0 == ord('v')) & _WHITESPACE[c1]] = _POSITION
+    line_types[(c0 == ord('v')) & (c1 == ord('n')) & _WHITESPACE[c2]] = _NORMAL
+    line_types[(c0 == ord('v')) & (c1 == ord('t')) & _WHITESPACE[c2]] = _TEXCOORD
+    line_types[(c0 == ord('f')) & _WHITESPACE[c1]] = _FACE
+
+    records, n = _selectRecords(buf, lengths, indents, line_types, _POSITION, 1)
+    positions = _parseValues(records, n, 3, np.float64)
+    records, n = _selectRecords(buf, lengths, indents, line_types, _NORMAL, 2)
+    normals = _parseValues(records, n, 3, np.float64)
+    records, n = _selectRecords(buf, lengths, indents, line_types, _TEXCOORD, 2)
+    # vt records have u and optional v and w values; w is dropped.
+    texcoords = _parseValues(records, n, 2, np.float64, min_columns=1)
+
+    # Records of each kind defined before every face.
+    face_lines = np.flatnonzero(line_types == _FACE)
+    before = np.empty((len(face_lines), 3), dtype=np.int64)
+    for i, line_type in enumerate((_POSITION, _TEXCOORD, _NORMAL)):
+        before[:, i] = np.cumsum(line_types == line_type)[face_lines] + bases[i]
+
+    records, n = _selectRecords(buf, lengths, indents, line_types, _FACE, 1)
+    v, vt, vn, relative = _parseFaces(records, n, before)
+
+    return positions, normals, texcoords, v, vt, vn, relative
+
+## Read chunks.
+#
+# Reads a file, or a byte range of it, in chunks that end at a line break.
+#
+# @param object_file File name.
+# @param chunk_size Approximate size of the chunks in bytes.
+# @param start First byte to read (must start a line).
+# @param end Byte after the last one to read (must end a line), None for the end of the file.
+# @return Iterator over the chunks.
+def readChunks(object_file, chunk_size=CHUNK_SIZE, start=0, end=None):
+    rest = b''
+    with open(object_file, 'rb') as f:
+        f.seek(start)
+        remaining = -1 if end is None else end - start
+        while remaining != 0:
+            block = f.read(chunk_size if remaining < 0 else min(chunk_size, remaining))
+            if not block:
+                break
+            if remaining > 0:
+                remaining -= len(block)
+            if rest:
+                block = rest + block
+            cut = block.rfind(b'\n') + 1
+            rest = block[cut:]
+            if cut > 0:
+                yield block[:cut]
+    if rest:
+        yield rest
+
+## Split ranges.
+#
+# Splits a file in byte ranges of about the same size that start and end at
+# line breaks.
+#
+# @param object_file File name.
+# @param n Number of ranges.
+# @return List of (start, end) pairs.
+def splitRanges(object_file, n):
+    size = os.path.getsize(object_file)
+    bounds = [0]
+    with open(object_file, 'rb') as f:
+        for i in range(1, n):
+            f.seek(max(bounds[-1], size*i//n))
+            f.readline()
+            bounds.append(f.tell())
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+## Load range.
+#
+# Parses a byte range of an OBJ file chunk by chunk, appending the results to
+# growable arrays. Relative face indexes are resolved against the records of
+# the range, the positions of those indexes are returned so a range that does
+# not start the file can be rebased.
+#
+# @param object_file OBJ file name.
+# @param chunk_size Size of the chunks read from the file in bytes.
+# @param start First byte of the range.
+# @param end Byte after the range, None for the end of the file.
+# @param progress Optional function called with the number of bytes parsed so far.
+# @return Dictionary with the positions, normals, texcoords, faces, face_normals
+#         and face_texcoords arrays of the range (the last two are None when some
+#         face corner misses them) and the flat positions of the relative indexes
+#         in faces, face_texcoords and face_normals (relative_faces,
+#         relative_texcoords, relative_normals).
+def _loadRange(object_file, chunk_size=CHUNK_SIZE, start=0, end=None, progress=None):
+    positions = GrowableArray(3, np.float64)
+    normals = GrowableArray(3, np.float64)
+    texcoords = GrowableArray(2, np.float64)
+    faces = GrowableArray(3, INDEX_DTYPE)
+    face_texcoords = GrowableArray(3, INDEX_DTYPE)
+    face_normals = GrowableArray(3, INDEX_DTYPE)
+    relative = [GrowableArray(1, np.int64) for _ in range(3)]
+
+    parsed = 0
+    for chunk in readChunks(object_file, chunk_size, start, end):
+        bases = (len(positions), len(texcoords), len(normals))
+        p, n, t, v, vt, vn, chunk_relative = parseObjBuffer(chunk, bases)
+
+        if len(v) > 0:
+            if v.max() > np.iinfo(INDEX_DTYPE).max:
+                raise ValueError("Too many vertices for " + np.dtype(INDEX_DTYPE).name + " indexes")
+
+            # Texture coordinates and normals are only kept if every corner has them.
+            offset = 3*len(faces)
+            if vt is None:
+                face_texcoords = None
+            if vn is None:
+                face_normals = None
+            for i, (indexes, array) in enumerate(((v, faces), (vt, face_texcoords), (vn, face_normals))):
+                if array is not None:
+                    array.append(indexes - 1)
+                    relative[i].append((chunk_relative[i] + offset)[:, None])
+
+        positions.append(p)
+        normals.append(n)
+        texcoords.append(t)
+
+        parsed += len(chunk)
+        if progress is not None:
+            progress(parsed)
+
+    return {
+        'positions': positions.array(),
+        'normals': normals.array(),
+        'texcoords': texcoords.array(),
+        'faces': faces.array(),
+        'face_normals': None if face_normals is None else face_normals.array(),
+        'face_texcoords': None if face_texcoords is None else face_texcoords.array(),
+        'relative_faces': relative[0].array().ravel(),
+        'relative_texcoords': relative[1].array().ravel(),
+        'relative_normals': relative[2].array().ravel(),
+    }
+
+## Mesh from the arrays returned by _loadRange.
+def _toMesh(arrays):
+    face_normals = arrays['face_normals']
+    face_texcoords = arrays['face_texcoords']
+    if face_normals is not None and len(arrays['normals']) == 0:
+        face_normals = None
+    if len(arrays['faces']) == 0:
+        face_normals = face_texcoords = None
+
+    # Relative indexes pointing before the first record end up negative,
+    # absolute ones may point past the last record.
+    for indexes, records in ((arrays['faces'], arrays['positions']), (face_normals, arrays['normals']),
+                             (face_texcoords, arrays['texcoords'])):
+        if indexes is not None and (indexes.min(initial=0) < 0 or indexes.max(initial=-1) >= len(records)):
+            raise ValueError("Face indexes out of range")
+
+    return ObjMesh(arrays['positions'], arrays['normals'], arrays['texcoords'],
+                   arrays['faces'], face_normals, face_texcoords)
+
+## Load OBJ.
+#
+# Reads an OBJ file into a mesh with 0-based triangle index arrays. The file is
+# parsed chunk by chunk and the results are appended to growable arrays.
+#
+# @param object_file OBJ file name.
+# @param chunk_size Size of the chunks read from the file in bytes.
+# @param progress Optional function called with the number of bytes parsed so far.
+# @return ObjMesh.
+def loadObj(object_file, chunk_size=CHUNK_SIZE, progress=None):
+    return _toMesh(_loadRange(object_file, chunk_size, progress=progress))
+
+## Copy an array to a new shared memory block.
+#
+# The block is owned by the parent process from then on, so it is removed from
+# the worker's resource tracker, which would otherwise unlink it at exit.
+#
+# @return Block name, shape and type.
+def _share(array):
+    shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    shm.close()
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm.name, array.shape, array.dtype.str
+
+## Parse a byte range in a worker process, returning its arrays in shared memory.
+def _loadRangeShared(object_file, chunk_size, start, end):
+    arrays = _loadRange(object_file, chunk_size, start, end)
+    return {name: None if array is None else _share(array) for name, array in arrays.items()}
+
+## Gather ranges.
+#
+# Copies the arrays of every range, in file order, to the final arrays,
+# rebases the relative face indexes of each range on the records of the ranges
+# before it and releases the shared memory blocks.
+#
+# @param parts Dictionaries returned by _loadRangeShared.
+# @return Dictionary in the format of _loadRange.
+def _gatherRanges(parts):
+    blocks = {}
+    try:
+        for part in parts:
+            for desc in part.values():
+                if desc is not None:
+                    blocks[desc[0]] = shared_memory.SharedMemory(name=desc[0])
+
+        def view(desc):
+            return np.ndarray(desc[1], dtype=np.dtype(desc[2]), buffer=blocks[desc[0]].buf)
+
+        # Ranges without faces do not tell which index arrays exist.
+        with_faces = [part for part in parts if part['faces'][1][0] > 0]
+        arrays = {}
+        for name in ('positions', 'normals', 'texcoords', 'faces', 'face_texcoords', 'face_normals'):
+            descs = [part[name] for part in parts]
+            if name.startswith('face_'):
+                if not with_faces or any(part[name] is None for part in with_faces):
+                    arrays[name] = None
+                    continue
+                descs = [desc for desc in descs if desc is not None]
+
+            # Each range goes right after the rows of the previous ones.
+            shape, dtype = descs[0][1], np.dtype(descs[0][2])
+            offsets = np.cumsum([0] + [desc[1][0] for desc in descs])
+            out = np.empty((offsets[-1],) + tuple(shape[1:]), dtype=dtype)
+            for desc, offset in zip(descs, offsets):
+                out[offset:offset + desc[1][0]] = view(desc)
+            arrays[name] = out
+
+        # Relative indexes were resolved against the records of their own range.
+        face_offset = 0
+        bases = {'positions': 0, 'texcoords': 0, 'normals': 0}
+        for part in parts:
+            for name, records, relative in (('faces', 'positions', 'relative_faces'),
+                                            ('face_texcoords', 'texcoords', 'relative_texcoords'),
+                                            ('face_normals', 'normals', 'relative_normals')):
+                if arrays[name] is not None and part[name] is not None and bases[records] > 0:
+                    flat = arrays[name].reshape(-1)
+                    flat[3*face_offset + view(part[relative])] += bases[records]
+                bases[records] += part[records][1][0]
+            face_offset += part['faces'][1][0]
+        return arrays
+    finally:
+        for shm in blocks.values():
+            shm.close()
+            shm.unlink()
+
+## Load OBJ in parallel.
+#
+# Splits the file in line-aligned byte ranges parsed by a pool of processes
+# (started with START_METHOD). The result is the same as loadObj. Small files
+# are parsed in this process.
+#
+# @param object_file OBJ file name.
+# @param workers Number of processes (default: number of CPUs).
+# @param chunk_size Size of the chunks read by each process in bytes.
+# @param min_bytes Files smaller than this are parsed by loadObj.
+# @return ObjMesh.
+def loadObjParallel(object_file, workers=None, chunk_size=CHUNK_SIZE, min_bytes=PARALLEL_MIN_BYTES):
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or os.path.getsize(object_file) < min_bytes:
+        return loadObj(object_file, chunk_size)
+
+    ranges = splitRanges(object_file, workers)
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(START_METHOD)) as pool:
+        futures = [pool.submit(_loadRangeShared, object_file, chunk_size, start, end)
+                   for start, end in ranges]
+        parts = []
+        try:
+            for future in futures:
+                parts.append(future.result())
+        except BaseException:
+            # Release the blocks of the ranges already done.
+            for future in futures:
+                if not future.cancel() and future.exception() is None:
+                    for desc in future.result().values():
+                        if desc is not None:
+                            shm = shared_memory.SharedMemory(name=desc[0])
+                            shm.close()
+                            shm.unlink()
+            raise
+
+    return _toMesh(_gatherRanges(parts))
+
+## Index vertices.
+#
+# Deduplicates the (position index, normal index) pairs of the triangle corners.
+# Unique vertices are numbered in order of first use, except when every corner
+# uses the same position and normal index, where no sort is needed and the
+# used positions keep their file order.
+#
+# @param face_indexes Position indexes of each triangle, (T,3).
+# @param normal_indexes Normal indexes of each triangle, (T,3).
+# @return Position and normal index of each unique vertex and the element
+#         indexes of the triangle corners, (T*3,).
+def indexVertices(face_indexes, normal_indexes):
+    if np.array_equal(face_indexes, normal_indexes):
+        face_indexes = np.asarray(face_indexes).ravel()
+        used = np.bincount(face_indexes) > 0
+        vertices = np.flatnonzero(used)
+        rank = np.cumsum(used) - 1
+        return vertices, vertices, rank[face_indexes]
+
+    face_indexes = np.asarray(face_indexes, dtype=np.int64).ravel()
+    normal_indexes = np.asarray(normal_indexes, dtype=np.int64).ravel()
+
+    keys = face_indexes*(int(normal_indexes.max(initial=0)) + 1) + normal_indexes
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+
+    first = first[order]
+    return face_indexes[first], normal_indexes[first], rank[inverse.ravel()]
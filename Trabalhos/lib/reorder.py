@@ -0,0 +1,227 @@
+## @file reorder.py
+# Triangle and vertex order for the GPU caches.
+#
+# Triangles are reordered for the post-transform vertex cache with Tipsify
+# (Sander, Nehab and Barczak, "Fast Triangle Reordering for Vertex Locality
+# and Reduced Overdraw", 2007), which fans around one vertex at a time and
+# keeps the next vertices among the ones still in the cache. The clusters
+# Tipsify produces between cache misses are then sorted so the ones facing
+# out of the mesh are drawn first, which cuts overdraw. Finally vertices are
+# renumbered in order of first use, so vertex fetches read memory forward.
+#
+# Tipsify and the cache simulation are sequential by nature and run as
+# Python loops over plain lists, about a minute per million triangles. Above
+# TIPSIFY_MAX_TRIANGLES, triangles are sorted along a Morton curve through
+# their centers instead, which is vectorized and keeps neighbouring triangles
+# together, when that beats the file order on a sample, and the overdraw sort
+# uses fixed clusters of the order kept.
+
+import numpy as np
+
+## Size of the vertex cache assumed by the optimizer and the statistics.
+CACHE_SIZE = 16
+## Largest mesh reordered with Tipsify, in triangles.
+TIPSIFY_MAX_TRIANGLES = 1 << 18
+## Triangles per cluster of the Morton order.
+SPATIAL_CLUSTER = 64
+
+## Average cache miss ratio.
+#
+# Simulates a FIFO post-transform cache.
+#
+# @param indices Element indexes, three per triangle.
+# @param cache_size Number of entries in the cache.
+# @param max_triangles Estimate it from the first triangles only, None for all.
+# @return Cache misses per triangle (ACMR).
+def acmr(indices, cache_size=CACHE_SIZE, max_triangles=None):
+    indices = np.asarray(indices).ravel()
+    if max_triangles is not None:
+        indices = indices[:3*max_triangles]
+    if len(indices) == 0:
+        return 0.0
+    # Position of each vertex in the stream of misses, -inf if never loaded.
+    loaded = {}
+    misses = 0
+    for v in indices.tolist():
+        if misses - loaded.get(v, -cache_size - 1) > cache_size:
+            loaded[v] = misses
+            misses += 1
+    return 3.0*misses/len(indices)
+
+## Vertex to triangle adjacency.
+#
+# @param faces Triangles, (T,3).
+# @param n_vertices Number of vertices.
+# @return Offsets (n_vertices+1) and triangles of each vertex, as lists.
+def _adjacency(faces, n_vertices):
+    corners = faces.ravel()
+    order = np.argsort(corners, kind='stable')
+    offsets = np.zeros(n_vertices + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(corners, minlength=n_vertices))
+    return offsets.tolist(), (order//3).tolist()
+
+## Tipsify.
+#
+# @param faces Triangles, (T,3).
+# @param n_vertices Number of vertices.
+# @param cache_size Number of entries in the cache.
+# @return New order of the triangles and the first position of each cluster
+#         (a new cluster starts where the fan jumps to a vertex out of the cache).
+def tipsify(faces, n_vertices, cache_size=CACHE_SIZE):
+    faces = np.asarray(faces).reshape(-1, 3)
+    offsets, adjacent = _adjacency(faces, n_vertices)
+    triangles = faces.tolist()
+    live = np.diff(offsets).tolist()
+    stamp = [0]*n_vertices
+    emitted = [False]*len(triangles)
+    dead_end = []
+    order = []
+    clusters = [0]
+
+    time = cache_size + 1
+    cursor = 0
+    fan = 0
+    while fan >= 0:
+        candidates = []
+        for t in adjacent[offsets[fan]:offsets[fan + 1]]:
+            if emitted[t]:
+                continue
+            emitted[t] = True
+            order.append(t)
+            for v in triangles[t]:
+                dead_end.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                if time - stamp[v] > cache_size:
+                    stamp[v] = time
+                    time += 1
+
+        # Next fan: the candidate in the cache with the most use left.
+        fan = -1
+        best = -1
+        for v in candidates:
+            if live[v] > 0:
+                priority = 0
+                if time - stamp[v] + 2*live[v] <= cache_size:
+                    priority = time - stamp[v]
+                if priority > best:
+                    best = priority
+                    fan = v
+        if fan >= 0:
+            continue
+
+        # Dead end: the most recent vertex with triangles left, else the next one in order.
+        if len(order) < len(triangles):
+            clusters.append(len(order))
+        while dead_end:
+            v = dead_end.pop()
+            if live[v] > 0:
+                fan = v
+                break
+        while fan < 0 and cursor < n_vertices:
+            if live[cursor] > 0:
+                fan = cursor
+            cursor += 1
+
+    return np.array(order, dtype=np.int64), np.array(clusters[:-1] if clusters[-1] == len(order) else clusters,
+                                                     dtype=np.int64)
+
+## Spread the 10 low bits of integers to every third bit.
+def _spreadBits(x):
+    x = x.astype(np.uint64) & 0x3ff
+    x = (x | (x << np.uint64(16))) & np.uint64(0x030000ff)
+    x = (x | (x << np.uint64(8))) & np.uint64(0x0300f00f)
+    x = (x | (x << np.uint64(4))) & np.uint64(0x030c30c3)
+    x = (x | (x << np.uint64(2))) & np.uint64(0x09249249)
+    return x
+
+## Spatial order.
+#
+# Sorts triangles by the Morton code of their centers on a 1024^3 grid over
+# the bounding box, and cuts the order in clusters of SPATIAL_CLUSTER triangles.
+#
+# @param positions Vertex positions, (N,3).
+# @param faces Triangles, (T,3).
+# @return New order of the triangles and the first position of each cluster.
+def spatialOrder(positions, faces):
+    centers = np.asarray(positions, dtype=np.float64)[faces].mean(axis=1)
+    low = centers.min(axis=0)
+    extent = np.maximum(centers.max(axis=0) - low, 1e-30)
+    cells = ((centers - low)/extent*1023).astype(np.int64)
+    codes = _spreadBits(cells[:, 0]) | (_spreadBits(cells[:, 1]) << np.uint64(1)) \
+        | (_spreadBits(cells[:, 2]) << np.uint64(2))
+    return np.argsort(codes, kind='stable'), np.arange(0, len(faces), SPATIAL_CLUSTER)
+
+## Overdraw order.
+#
+# Sorts clusters of triangles by how much they face out of the mesh, the dot
+# product of the cluster normal with the direction from the mesh center to the
+# cluster center. Outward clusters are drawn first and hide the others.
+#
+# @param positions Vertex positions, (N,3).
+# @param faces Triangles, (T,3).
+# @param clusters First triangle of each cluster.
+# @return New order of the triangles.
+def overdrawOrder(positions, faces, clusters):
+    positions = np.asarray(positions, dtype=np.float64)
+    p = positions[faces]
+    normals = np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+    areas = np.linalg.norm(normals, axis=1)
+    centers = p.mean(axis=1)
+
+    cluster_of = np.zeros(len(faces), dtype=np.int64)
+    cluster_of[clusters[1:]] = 1
+    cluster_of = np.cumsum(cluster_of)
+    n_clusters = len(clusters)
+
+    total = np.maximum(np.bincount(cluster_of, areas, minlength=n_clusters), 1e-30)
+    cluster_center = np.stack([np.bincount(cluster_of, centers[:, i]*areas, minlength=n_clusters)
+                               for i in range(3)], axis=1)/total[:, None]
+    cluster_normal = np.stack([np.bincount(cluster_of, normals[:, i], minlength=n_clusters)
+                               for i in range(3)], axis=1)
+    length = np.linalg.norm(cluster_normal, axis=1, keepdims=True)
+    cluster_normal = np.divide(cluster_normal, length, out=np.zeros_like(cluster_normal), where=length > 0)
+    mesh_center = (centers*areas[:, None]).sum(axis=0)/max(areas.sum(), 1e-30)
+    facing = np.einsum('ij,ij->i', cluster_center - mesh_center, cluster_normal)
+
+    # Whole clusters, outward first, each keeping its own order.
+    rank = np.empty(n_clusters, dtype=np.int64)
+    rank[np.argsort(-facing, kind='stable')] = np.arange(n_clusters)
+    return np.argsort(rank[cluster_of], kind='stable')
+
+## Optimize triangle order.
+#
+# @param positions Vertex positions, (N,3).
+# @param faces Triangles, (T,3).
+# @param cache_size Number of entries in the cache.
+# @param max_triangles Largest mesh reordered with Tipsify, larger ones use
+#        the spatial order.
+# @return Reordered triangles.
+def optimizeFaces(positions, faces, cache_size=CACHE_SIZE, max_triangles=TIPSIFY_MAX_TRIANGLES):
+    faces = np.asarray(faces).reshape(-1, 3)
+    if len(faces) == 0:
+        return faces
+    if len(faces) > max_triangles:
+        order, clusters = spatialOrder(positions, faces)
+        # Scanned data gains a lot, files already in a good order may lose.
+        if acmr(faces[order], cache_size, TIPSIFY_MAX_TRIANGLES) >= acmr(faces, cache_size, TIPSIFY_MAX_TRIANGLES):
+            order = np.arange(len(faces))
+    else:
+        order, clusters = tipsify(faces, len(positions), cache_size)
+    faces = faces[order]
+    return faces[overdrawOrder(positions, faces, clusters)]
+
+## Vertex fetch order.
+#
+# @param indices Element indexes.
+# @param n_vertices Number of vertices.
+# @return Vertex of each new position (vertices in order of first use, unused
+#         ones last) and the new number of each old vertex.
+def fetchOrder(indices, n_vertices):
+    indices = np.asarray(indices).ravel()
+    first = np.full(n_vertices, len(indices), dtype=np.int64)
+    np.minimum.at(first, indices, np.arange(len(indices)))
+    order = np.argsort(first, kind='stable')
+    remap = np.empty(n_vertices, dtype=np.int64)
+    remap[order] = np.arange(n_vertices)
+    return order, remap
@@ -0,0 +1,107 @@
+## @file residency.py
+# Texture residency.
+#
+# Keeps the textures of a scene within a video memory budget. Each texture is
+# registered with a function that creates it (normally from the texture
+# cache, so reloading does not decode the images again) and an estimate of its
+# size. Textures are created the first time they are bound, and when one does
+# not fit in the budget the least recently bound ones are deleted. Hits,
+# misses and evictions are counted.
+
+from collections import OrderedDict
+import OpenGL.GL as gl
+
+## Estimated size of a texture.
+#
+# Drivers usually store RGB texels padded to 4 bytes, so they are counted as
+# RGBA.
+#
+# @param width, height Size of the first level.
+# @param channels Channels per texel, ignored when bytes_per_block is given.
+# @param mipmaps Whether the texture has the whole mip chain.
+# @param faces 6 for a cube map.
+# @param bytes_per_block Bytes of a 4x4 block of a compressed format (8 for
+#        BC1, 16 for BC3), None for uncompressed texels.
+# @return Bytes.
+def estimateBytes(width, height, channels=4, mipmaps=False, faces=1, bytes_per_block=None):
+    total = 0
+    while True:
+        if bytes_per_block:
+            total += ((width + 3)//4)*((height + 3)//4)*bytes_per_block
+        else:
+            total += width*height*(4 if channels == 3 else channels)
+        if not mipmaps or (width == 1 and height == 1):
+            break
+        width, height = max(1, width//2), max(1, height//2)
+    return total*faces
+
+## Texture manager.
+class TextureManager:
+    ## Create the manager.
+    #
+    # @param budget Bytes the resident textures may use.
+    def __init__(self, budget=256*1024**2):
+        self.budget = budget
+        ## Bytes of the resident textures.
+        self.used = 0
+        ## Load function and estimated bytes of each texture, by name.
+        self.entries = {}
+        ## Resident textures by name, least recently bound first.
+        self.resident = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    ## Register a texture.
+    #
+    # @param name Name of the texture.
+    # @param load Function creating the texture and returning its GL name.
+    # @param nbytes Estimated size (see estimateBytes).
+    def add(self, name, load, nbytes):
+        self.entries[name] = (load, nbytes)
+
+    ## Bind a texture, creating it if it is not resident.
+    #
+    # A texture larger than the budget is still created, after evicting every
+    # other one.
+    #
+    # @param name Name of the texture.
+    # @param target Texture target.
+    # @return GL name of the texture.
+    def bind(self, name, target=gl.GL_TEXTURE_2D):
+        texture = self.resident.get(name)
+        if texture is not None:
+            self.hits += 1
+            self.resident.move_to_end(name)
+        else:
+            self.misses += 1
+            load, nbytes = self.entries[name]
+            while self.resident and self.used + nbytes > self.budget:
+                self.evict(next(iter(self.resident)))
+            texture = load()
+            self.resident[name] = texture
+            self.used += nbytes
+        gl.glBindTexture(target, texture)
+        return texture
+
+    ## Delete a resident texture (it is created again when bound).
+    #
+    # @param name Name of the texture.
+    def evict(self, name):
+        texture = self.resident.pop(name, None)
+        if texture is None:
+            return
+        gl.glDeleteTextures([texture])
+        self.used -= self.entries[name][1]
+        self.evictions += 1
+
+    ## Delete every resident texture.
+    def clear(self):
+        for name in list(self.resident):
+            self.evict(name)
+
+    ## Statistics.
+    def stats(self):
+        return ("textures: %d of %d resident, %.1f of %.1f MB, %d hits, %d misses, %d evictions"
+                % (len(self.resident), len(self.entries), self.used/2**20, self.budget/2**20,
+                   self.hits, self.misses, self.evictions))
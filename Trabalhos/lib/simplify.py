@@ -0,0 +1,279 @@
+## @file simplify.py
+# Mesh simplification with quadric error metrics and levels of detail.
+#
+# Every vertex carries the quadric of the planes of its faces (Garland and
+# Heckbert), plus planes perpendicular to the boundary edges so borders are
+# kept. Edges are collapsed in batches instead of one at a time from a
+# priority queue: in each pass every vertex picks its cheapest edge, the
+# edges picked by both of their vertices (among the cheapest ones overall)
+# are collapsed together, after dropping those that would share a triangle
+# or flip one.
+#
+# Collapses are half-edge collapses, one vertex moves onto the other, so the
+# simplified triangles only use vertices of the original mesh and every level
+# of detail can index the same vertex buffer.
+
+import numpy as np
+
+## Fraction of the cheapest edges that may be collapsed in each pass.
+CANDIDATE_FRACTION = 0.25
+## Rounds of choices in each collapse pass.
+MAX_ROUNDS = 8
+## Weight of the planes that keep boundary edges in place.
+BOUNDARY_WEIGHT = 100.0
+## Smallest cosine between a triangle normal before and after a collapse.
+MIN_NORMAL_COS = 0.2
+
+## Planes.
+#
+# @param points Points on the planes, (K,3).
+# @param normals Plane normals, (K,3), normalized here.
+# @param weights Weight of each plane, (K,).
+# @return Quadrics of the planes as 10 coefficients (a², ab, ac, ad, b², bc,
+#         bd, c², cd, d²), (K,10).
+def _planeQuadrics(points, normals, weights):
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    n = np.divide(normals, length, out=np.zeros_like(normals), where=length > 0)
+    a, b, c = n[:, 0], n[:, 1], n[:, 2]
+    d = -np.einsum('ij,ij->i', n, points)
+    return weights[:, None]*np.stack((a*a, a*b, a*c, a*d, b*b, b*c, b*d, c*c, c*d, d*d), axis=1)
+
+## Quadric error.
+#
+# @param q Quadrics, (K,10).
+# @param p Points, (K,3).
+# @return Error v^T Q v of each point, with v = (x, y, z, 1).
+def _quadricError(q, p):
+    x, y, z = p[:, 0], p[:, 1], p[:, 2]
+    return (q[:, 0]*x*x + 2*q[:, 1]*x*y + 2*q[:, 2]*x*z + 2*q[:, 3]*x
+            + q[:, 4]*y*y + 2*q[:, 5]*y*z + 2*q[:, 6]*y
+            + q[:, 7]*z*z + 2*q[:, 8]*z + q[:, 9])
+
+## Edges of a triangle mesh.
+#
+# @param faces Triangles, (T,3).
+# @param n_vertices Number of vertices.
+# @return Vertices of each edge (E,2), smaller index first, and the number of
+#         triangles around it (E,).
+def meshEdges(faces, n_vertices):
+    a = faces.ravel()
+    b = faces[:, [1, 2, 0]].ravel()
+    keys = np.minimum(a, b).astype(np.int64)*n_vertices + np.maximum(a, b)
+    keys, counts = np.unique(keys, return_counts=True)
+    return np.stack((keys // n_vertices, keys % n_vertices), axis=1), counts
+
+## Vertex quadrics.
+#
+# @param positions Vertex positions, (N,3).
+# @param faces Triangles, (T,3).
+# @return Sum of the area weighted quadrics of the faces around each vertex
+#         and of the boundary planes at each vertex, (N,10).
+def vertexQuadrics(positions, faces):
+    p = positions[faces]
+    normals = np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+    areas = 0.5*np.linalg.norm(normals, axis=1)
+    face_q = _planeQuadrics(p[:, 0], normals, areas)
+
+    q = np.zeros((len(positions), 10), dtype=np.float64)
+    for i in range(3):
+        for k in range(10):
+            q[:, k] += np.bincount(faces[:, i], face_q[:, k], minlength=len(positions))
+
+    # Half-edges whose edge has a single triangle, with the plane through the
+    # edge perpendicular to that triangle.
+    a = faces.ravel()
+    b = faces[:, [1, 2, 0]].ravel()
+    keys = np.minimum(a, b).astype(np.int64)*len(positions) + np.maximum(a, b)
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    boundary = np.flatnonzero(counts[inverse] == 1)
+    if len(boundary) > 0:
+        edge = positions[b[boundary]] - positions[a[boundary]]
+        plane_normals = np.cross(edge, np.repeat(normals, 3, axis=0)[boundary])
+        boundary_q = _planeQuadrics(positions[a[boundary]], plane_normals,
+                                    BOUNDARY_WEIGHT*np.einsum('ij,ij->i', edge, edge))
+        for vertex in (a[boundary], b[boundary]):
+            for k in range(10):
+                q[:, k] += np.bincount(vertex, boundary_q[:, k], minlength=len(positions))
+    return q
+
+## Valid collapses.
+#
+# @param positions Vertex positions, (N,3).
+# @param faces Triangles, (T,3).
+# @param moved Vertex each vertex moves to, -1 if it stays, updated in place.
+# @param source_rank Rank of the collapse of each moved vertex.
+def _dropInvalid(positions, faces, moved, source_rank):
+    # A triangle may lose at most one vertex, the one of the cheapest collapse.
+    corner_rank = np.where(moved[faces] >= 0, source_rank[faces], np.iinfo(np.int64).max)
+    conflict = (moved[faces] >= 0) & (corner_rank > corner_rank.min(axis=1, keepdims=True))
+    moved[faces[conflict]] = -1
+
+    # Triangles that keep their area must not flip.
+    corner_moved = moved[faces]
+    changed = np.flatnonzero((corner_moved >= 0).any(axis=1))
+    old = faces[changed]
+    new = np.where(corner_moved[changed] >= 0, corner_moved[changed], old)
+    survives = (new[:, 0] != new[:, 1]) & (new[:, 1] != new[:, 2]) & (new[:, 2] != new[:, 0])
+    old, new = old[survives], new[survives]
+    p_old, p_new = positions[old], positions[new]
+    n_old = np.cross(p_old[:, 1] - p_old[:, 0], p_old[:, 2] - p_old[:, 0])
+    n_new = np.cross(p_new[:, 1] - p_new[:, 0], p_new[:, 2] - p_new[:, 0])
+    cos = np.einsum('ij,ij->i', n_old, n_new)
+    flipped = cos <= MIN_NORMAL_COS*np.linalg.norm(n_old, axis=1)*np.linalg.norm(n_new, axis=1)
+    corners = old[flipped]
+    moved[corners[moved[corners] >= 0]] = -1
+
+## Collapse pass.
+#
+# Chooses a batch of independent half-edge collapses among the cheapest
+# edges. The choice is repeated a few times: edges whose collapse turned out
+# invalid are left out, and so are the vertices of the triangles already
+# changed by the pass.
+#
+# @param positions Vertex positions, (N,3).
+# @param faces Triangles, (T,3).
+# @param quadrics Vertex quadrics, (N,10).
+# @param max_collapses Largest number of collapses.
+# @return Removed vertices and the vertices they move to.
+def _collapsePass(positions, faces, quadrics, max_collapses):
+    n_vertices = len(positions)
+    edges, _ = meshEdges(faces, n_vertices)
+    u, v = edges[:, 0], edges[:, 1]
+
+    # Cheapest direction of each edge.
+    q = quadrics[u] + quadrics[v]
+    cost_uv = _quadricError(q, positions[v])
+    cost_vu = _quadricError(q, positions[u])
+    source = np.where(cost_uv <= cost_vu, u, v)
+    target = np.where(cost_uv <= cost_vu, v, u)
+    rank = np.empty(len(edges), dtype=np.int64)
+    rank[np.argsort(np.minimum(cost_uv, cost_vu), kind='stable')] = np.arange(len(edges))
+
+    candidates = rank < max(1, int(CANDIDATE_FRACTION*len(edges)))
+    moved = np.full(n_vertices, -1, dtype=np.int64)
+    source_rank = np.zeros(n_vertices, dtype=np.int64)
+    free = np.ones(n_vertices, dtype=bool)
+    for _ in range(MAX_ROUNDS):
+        # Edges that are the cheapest of both of their vertices.
+        candidates &= free[u] & free[v]
+        open_rank = np.where(candidates, rank, len(edges))
+        best = np.full(n_vertices, len(edges), dtype=np.int64)
+        np.minimum.at(best, u, open_rank)
+        np.minimum.at(best, v, open_rank)
+        chosen = np.flatnonzero(candidates & (best[u] == rank) & (best[v] == rank))
+        if len(chosen) == 0:
+            break
+
+        round_moved = np.full(n_vertices, -1, dtype=np.int64)
+        round_moved[source[chosen]] = target[chosen]
+        source_rank[source[chosen]] = rank[chosen]
+        _dropInvalid(positions, faces, round_moved, source_rank)
+        candidates[chosen] = False
+
+        accepted = round_moved >= 0
+        moved[accepted] = round_moved[accepted]
+        free[faces[accepted[faces].any(axis=1)]] = False
+        if np.count_nonzero(moved >= 0) >= max_collapses:
+            break
+
+    # The cheapest of the valid collapses.
+    removed = np.flatnonzero(moved >= 0)
+    removed = removed[np.argsort(source_rank[removed])][:max_collapses]
+    return removed, moved[removed]
+
+## Simplify.
+#
+# @param positions Vertex positions, (N,3).
+# @param faces Triangles, (T,3).
+# @param target_faces Number of triangles to stop at.
+# @param quadrics Vertex quadrics (default: computed from the faces), updated
+#        in place.
+# @return Simplified triangles, using the same vertices, and the index of each
+#         of them in faces.
+def simplify(positions, faces, target_faces, quadrics=None):
+    positions = np.asarray(positions, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+    if quadrics is None:
+        quadrics = vertexQuadrics(positions, faces)
+
+    survivors = np.arange(len(faces))
+    while len(faces) > target_faces:
+        # Each collapse removes about two triangles.
+        removed, kept = _collapsePass(positions, faces, quadrics, (len(faces) - target_faces)//2 + 1)
+        if len(removed) == 0:
+            break
+        np.add.at(quadrics, kept, quadrics[removed])
+        remap = np.arange(len(positions))
+        remap[removed] = kept
+        faces = remap[faces]
+        valid = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])
+        faces, survivors = faces[valid], survivors[valid]
+    return faces, survivors
+
+## Weld vertices.
+#
+# @param positions Vertex positions, (V,3).
+# @return Position number of each vertex and the first vertex of each position.
+def weldVertices(positions):
+    positions = np.ascontiguousarray(positions)
+    rows = positions.view(np.dtype((np.void, positions.dtype.itemsize*positions.shape[1]))).ravel()
+    _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+    return inverse.ravel(), first
+
+## Level of detail chain.
+#
+# Each level is simplified from the previous one. Vertices that share a
+# position (because of different normals) are simplified as one: corners that
+# did not move keep their vertex, corners that moved take the first vertex at
+# their new position.
+#
+# @param positions Vertex positions, (V,3).
+# @param faces Triangles, (T,3).
+# @param ratios Fraction of the triangles of each level, () or None for none.
+# @return Triangles of each level, (T_i,3) indexes into the same vertices.
+def lodChain(positions, faces, ratios=(0.5, 0.25, 0.1, 0.02)):
+    if not ratios:
+        return []
+    corners = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    welded, first = weldVertices(positions)
+    welded_positions = np.asarray(positions, dtype=np.float64)[first]
+    level = welded[corners]
+    quadrics = vertexQuadrics(welded_positions, level)
+
+    lods = []
+    n_faces = len(corners)
+    for ratio in ratios:
+        level, survivors = simplify(welded_positions, level, int(ratio*n_faces), quadrics)
+        corners = corners[survivors]
+        corners = np.where(welded[corners] == level, corners, first[level])
+        lods.append(corners)
+    return lods
+
+## Projected radius.
+#
+# @param radius Bounding sphere radius.
+# @param distance Distance from the camera to the sphere center along the view direction.
+# @param projection Perspective matrix (see utils.matPerspective).
+# @param height Viewport height in pixels.
+# @return Radius of the sphere on the screen in pixels (infinite when the camera
+#         is inside the sphere).
+def projectedRadius(radius, distance, projection, height):
+    if distance <= radius:
+        return float('inf')
+    return radius*projection[1, 1]/distance*height/2
+
+## Select level of detail.
+#
+# Picks the coarsest level that still has a triangle for every
+# pixels_per_triangle pixels of the projected bounding sphere.
+#
+# @param triangle_counts Triangles of each level, finest first.
+# @param radius Projected radius in pixels.
+# @param pixels_per_triangle Screen area per triangle.
+# @return Level index.
+def selectLod(triangle_counts, radius, pixels_per_triangle=8.0):
+    needed = np.pi*radius*radius/pixels_per_triangle
+    for level in range(len(triangle_counts) - 1, 0, -1):
+        if triangle_counts[level] >= needed:
+            return level
+    return 0
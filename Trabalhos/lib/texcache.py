@@ -0,0 +1,243 @@
+## @file texcache.py
+# On-disk cache of decoded textures.
+#
+# Stores the pixels of an image, optionally resized, with its whole mip chain
+# in one uint8 .npy file (levels one after the other, memory-mapped on load)
+# next to a .json file with the shape and offset of each level. Entries are
+# keyed by a hash of the image content and by the settings the levels were
+# built with, and the least recently used entries are evicted when the cache
+# grows past a size limit. A cached texture is uploaded level by level with
+# glTexImage2D, without decoding or glGenerateMipmap. Entries may also hold
+# the levels block-compressed (see bcn.py), uploaded with
+# glCompressedTexImage2D.
+
+import os
+import json
+import numpy as np
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+import textures as tex
+import bcn
+import cacheindex as ci
+
+## Cache format version. Changing it invalidates every entry.
+VERSION = 1
+
+## Cache directory (TEXTURE_CACHE_DIR overrides it).
+CACHE_DIR = os.environ.get('TEXTURE_CACHE_DIR',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'computacao-grafica', 'textures'))
+
+## Maximum size of the cache directory in bytes.
+MAX_BYTES = 2*1024**3
+
+## Resampling filters for resizing and mip levels.
+FILTERS = {'box': Image.BOX, 'bilinear': Image.BILINEAR, 'lanczos': Image.LANCZOS}
+
+## File hash.
+#
+# @param file_name File name.
+# @param cache_dir Cache directory.
+# @return Hex digest of the content (see cacheindex.fileHash).
+def fileHash(file_name, cache_dir=None):
+    return ci.fileHash(file_name, cache_dir or CACHE_DIR)
+
+## Cache key.
+#
+# @param image_file Image file name.
+# @param max_size Largest side of the first level, None keeps the image size.
+# @param mipmaps Whether the entry holds the mip chain.
+# @param filter Resampling filter name (see FILTERS).
+# @param compression Block format of the levels ('bc1', 'bc3'), None for pixels.
+# @param cache_dir Cache directory.
+# @return Key combining the content hash with the settings.
+def cacheKey(image_file, max_size=None, mipmaps=True, filter='box', compression=None, cache_dir=None):
+    key = '%s-t%d-s%s-m%d-%s' % (fileHash(image_file, cache_dir), VERSION, max_size or 0, int(mipmaps), filter)
+    return key + '-' + compression if compression else key
+
+## Resize.
+#
+# @param data Pixels (height, width, channels).
+# @param width, height New size.
+# @param filter Resampling filter name.
+# @return Resized pixels.
+def _resize(data, width, height, filter):
+    img = Image.fromarray(data)
+    return np.asarray(img.resize((width, height), FILTERS[filter]))
+
+## Mip chain.
+#
+# Halves the image (rounding down, as OpenGL does) down to 1x1.
+#
+# @param data Pixels of the first level (height, width, channels).
+# @param filter Resampling filter name.
+# @return List of levels, the first one being data.
+def mipChain(data, filter='box'):
+    levels = [data]
+    while levels[-1].shape[0] > 1 or levels[-1].shape[1] > 1:
+        height, width = levels[-1].shape[:2]
+        levels.append(_resize(levels[-1], max(1, width//2), max(1, height//2), filter))
+    return levels
+
+## Load entry.
+#
+# @param key Cache key.
+# @param cache_dir Cache directory.
+# @return List of memory-mapped levels and the metadata, or None if not cached.
+def load(key, cache_dir=None):
+    cache_dir = cache_dir or CACHE_DIR
+    path = os.path.join(cache_dir, key)
+    try:
+        with open(path + '.json', 'r') as f:
+            meta = json.load(f)
+        data = np.load(path + '.npy', mmap_mode='r')
+        levels = [data[offset:offset + int(np.prod(shape))].reshape(shape) for offset, shape in meta['levels']]
+    except (OSError, ValueError, KeyError):
+        return None
+
+    # Mark as recently used.
+    os.utime(path + '.json')
+    return levels, meta
+
+## Store entry.
+#
+# @param key Cache key.
+# @param levels List of levels (uint8 arrays).
+# @param cache_dir Cache directory.
+# @param max_bytes Size limit of the cache directory.
+# @param meta Additional metadata (JSON serializable).
+def store(key, levels, cache_dir=None, max_bytes=None, meta=None):
+    cache_dir = cache_dir or CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, key)
+
+    offsets = np.cumsum([0] + [level.size for level in levels]).tolist()
+    data = np.empty(offsets[-1], dtype=np.uint8)
+    for offset, level in zip(offsets, levels):
+        data[offset:offset + level.size] = level.ravel()
+    def writeData(tmp):
+        with open(tmp, 'wb') as f:
+            np.save(f, data)
+    ci.writeAtomic(path + '.npy', writeData)
+
+    # The pixels go first, an entry only counts once its metadata exists.
+    meta = dict(meta or {}, levels=[[offset, list(level.shape)] for offset, level in zip(offsets, levels)])
+    def writeMeta(tmp):
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+    ci.writeAtomic(path + '.json', writeMeta)
+
+    evict(cache_dir, MAX_BYTES if max_bytes is None else max_bytes)
+
+## Evict entries.
+#
+# Removes the least recently used entries until the cache fits in max_bytes,
+# and the files of the hash index whose content has no entry left.
+#
+# @param cache_dir Cache directory.
+# @param max_bytes Size limit.
+def evict(cache_dir, max_bytes):
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(cache_dir, name[:-len('.json')])
+        try:
+            size = os.path.getsize(path + '.npy') + os.path.getsize(path + '.json')
+            used = os.stat(path + '.json').st_mtime_ns
+        except OSError:
+            continue
+        entries.append((used, size, path))
+
+    total = sum(size for _, size, _ in entries)
+    evicted = set()
+    kept = set()
+    for _, size, path in sorted(entries):
+        # Keys start with the content hash.
+        digest = os.path.basename(path).split('-')[0]
+        if total <= max_bytes:
+            kept.add(digest)
+            continue
+        for suffix in ('.json', '.npy'):
+            try:
+                os.remove(path + suffix)
+            except OSError:
+                pass
+        total -= size
+        evicted.add(digest)
+
+    ci.pruneIndex(cache_dir, evicted - kept)
+
+## Load levels.
+#
+# @return Levels, metadata and whether they were cached (see loadTexture).
+def _loadLevels(image_file, max_size, mipmaps, filter, compression, workers, cache_dir):
+    key = cacheKey(image_file, max_size, mipmaps, filter, compression, cache_dir)
+    cached = load(key, cache_dir)
+    if cached is not None:
+        return cached + (True,)
+
+    data = tex.readImage(image_file)
+    height, width = data.shape[:2]
+    if max_size is not None and max(width, height) > max_size:
+        ratio = max_size/max(width, height)
+        data = _resize(data, max(1, round(width*ratio)), max(1, round(height*ratio)), filter)
+    levels = mipChain(data, filter) if mipmaps else [data]
+    meta = {'sizes': [[level.shape[1], level.shape[0]] for level in levels]}
+    if compression:
+        levels = [bcn.compress(level, compression, workers) for level in levels]
+        meta['format'] = compression
+    store(key, levels, cache_dir, meta=meta)
+    return levels, meta, False
+
+## Load texture.
+#
+# Returns the cached levels of an image, decoding and storing them first if
+# needed.
+#
+# @param image_file Image file name.
+# @param max_size Largest side of the first level, None keeps the image size.
+# @param mipmaps Whether to build the mip chain.
+# @param filter Resampling filter name (see FILTERS).
+# @param cache_dir Cache directory.
+# @return List of levels (height, width, channels) and whether they were cached.
+def loadTexture(image_file, max_size=None, mipmaps=True, filter='box', cache_dir=None):
+    levels, meta, cached = _loadLevels(image_file, max_size, mipmaps, filter, None, 1, cache_dir)
+    return levels, cached
+
+## Load compressed texture.
+#
+# Same as loadTexture, with the levels block-compressed before being stored.
+#
+# @param image_file Image file name.
+# @param compression Block format ('bc1', 'bc3').
+# @param workers Processes encoding the blocks.
+# @return List of levels (encoded blocks), (width, height) of each level and
+#         whether they were cached.
+def loadCompressedTexture(image_file, compression='bc1', max_size=None, mipmaps=True, filter='box',
+                          workers=1, cache_dir=None):
+    levels, meta, cached = _loadLevels(image_file, max_size, mipmaps, filter, compression, workers, cache_dir)
+    return levels, [tuple(size) for size in meta['sizes']], cached
+
+## Load textures.
+#
+# @param image_files Image file names.
+# @param workers Threads, 1 loads them in order on the calling thread.
+# @param kwargs Options of loadTexture.
+# @return List of (levels, cached) of each file.
+def loadTextures(image_files, workers=None, **kwargs):
+    image_files = list(image_files)
+    workers = len(image_files) if workers is None else workers
+    if workers <= 1 or len(image_files) <= 1:
+        return [loadTexture(image_file, **kwargs) for image_file in image_files]
+    with ThreadPoolExecutor(max_workers=min(workers, len(image_files))) as pool:
+        return list(pool.map(lambda image_file: loadTexture(image_file, **kwargs), image_files))
+
+## Upload levels.
+#
+# Calls glTexImage2D for every level of the texture bound to the target.
+#
+# @param target Texture target (GL_TEXTURE_2D or a cube map face).
+# @param levels List of levels.
+def texImageLevels(target, levels):
+    for level, data in enumerate(levels):
+        tex.texImage2D(target, data, level)
@@ -81,13 +81,58 @@ def createShaderProgram(vertex_code, fragment_code):
 
     return program
 
+## Frame timing.
+#
+# Timing a frame or an upload needs glFinish, a CPU-GPU sync that stalls the
+# pipeline, so the examples only time them when FRAME_TIMING=1.
+#
+# @return Whether to time frames and uploads.
+def frameTiming():
+    return os.environ.get('FRAME_TIMING') == '1'
+
+## Upload matrix.
+#
+# Sends a row-major (4,4) or (3,3) float32 matrix to a mat4 or mat3 uniform
+# of the program in use. Passing GL_TRUE lets OpenGL transpose it, so no
+# transposed copy is made (M.transpose() is not contiguous and PyOpenGL
+# copies it).
+#
+# @param location Uniform location.
+# @param M The matrix.
+def setUniformMatrix(location, M):
+    if M.shape[0] == 3:
+        gl.glUniformMatrix3fv(location, 1, gl.GL_TRUE, M)
+    else:
+        gl.glUniformMatrix4fv(location, 1, gl.GL_TRUE, M)
+
+## Identity matrix copied into out= arrays.
+_IDENTITY = np.identity(4, dtype='float32')
+
+## Matrix to fill.
+#
+# The matrix constructors accept an out= (4,4) float32 array to write into
+# instead of allocating a new one, so a frame can reuse its matrices.
+#
+# @param out Array to fill or None.
+# @param identity Start from the identity instead of zeros.
+# @return out reset, or a new matrix.
+def _matOut(out, identity=True):
+    if out is None:
+        return np.identity(4, dtype='float32') if identity else np.zeros((4,4), dtype='float32')
+    if identity:
+        np.copyto(out, _IDENTITY)
+    else:
+        out.fill(0.0)
+    return out
+
 ## Identity matrix.
 #
 # Creates a identity matrix.
 #
+# @param out Matrix to write into (see _matOut).
 # @return The matrix.
-def matIdentity():
-    I = np.identity(4, dtype='float32')
+def matIdentity(out=None):
+    I = _matOut(out)
     
     return I
 
@@ -98,9 +143,10 @@ def matIdentity():
 # @param x Displacement along x-axis. 
 # @param y Displacement along y-axis. 
 # @param z Displacement along z-axis. 
+# @param out Matrix to write into (see _matOut).
 # @return The matrix.
-def matTranslate(x, y, z):
-    T =  np.identity(4, dtype='float32')
+def matTranslate(x, y, z, out=None):
+    T = _matOut(out)
 
     T[0,3] = x
     T[1,3] = y
@@ -115,9 +161,10 @@ def matTranslate(x, y, z):
 # @param x Scale factor along x-axis. 
 # @param y Scale factor along y-axis. 
 # @param z Scale factor along z-axis. 
+# @param out Matrix to write into (see _matOut).
 # @return The matrix.
-def matScale(x, y, z):
-    T =  np.identity(4, dtype='float32')
+def matScale(x, y, z, out=None):
+    T = _matOut(out)
 
     T[0,0] = x
     T[1,1] = y
@@ -130,9 +177,10 @@ def matScale(x, y, z):
 # Creates a rotation matrix for the x-axis.
 #
 # @param angle Rotation angle in radians. 
+# @param out Matrix to write into (see _matOut).
 # @return The matrix.
-def matRotateX(angle):
-    R =  np.identity(4, dtype='float32')
+def matRotateX(angle, out=None):
+    R = _matOut(out)
 
     acos = math.cos(angle)
     asin = math.sin(angle)
@@ -149,9 +197,10 @@ def matRotateX(angle):
 # Creates a rotation matrix for the y-axis.
 #
 # @param angle Rotation angle in radians. 
+# @param out Matrix to write into (see _matOut).
 # @return The matrix.
-def matRotateY(angle):
-    R =  np.identity(4, dtype='float32')
+def matRotateY(angle, out=None):
+    R = _matOut(out)
 
     acos = math.cos(angle)
     asin = math.sin(angle)
@@ -168,9 +217,10 @@ def matRotateY(angle):
 # Creates a rotation matrix for the z-axis.
 #
 # @param angle Rotation angle in radians. 
+# @param out Matrix to write into (see _matOut).
 # @return The matrix.
-def matRotateZ(angle):
-    R =  np.identity(4, dtype='float32')
+def matRotateZ(angle, out=None):
+    R = _matOut(out)
 
     acos = math.cos(angle)
     asin = math.sin(angle)
@@ -190,10 +240,11 @@ def matRotateZ(angle):
 # @param aspect aspect. 
 # @param n near plane. 
 # @param f far plane. 
+# @param out Matrix to write into (see _matOut).
 # @return The matrix.
-def matPerspective(fovy, aspect, n, f):
+def matPerspective(fovy, aspect, n, f, out=None):
 
-    P = np.zeros((4,4), dtype='float32')
+    P = _matOut(out, False)
     
     rad = fovy
     tan = math.tan(rad/2.0)
@@ -216,10 +267,11 @@ def matPerspective(fovy, aspect, n, f):
 # @param u top. 
 # @param n near plane. 
 # @param f far plane. 
+# @param out Matrix to write into (see _matOut).
 # @return The matrix.
-def matFrustum(l, r, b, t, n, f):
+def matFrustum(l, r, b, t, n, f, out=None):
     
-    F = np.zeros((4,4), dtype='float32')
+    F = _matOut(out, False)
 
     F[0,0] = (2.0*n)/(r-l)
     F[0,2] = (r+l)/(r-l)
@@ -241,10 +293,11 @@ def matFrustum(l, r, b, t, n, f):
 # @param u top. 
 # @param n near plane. 
 # @param f far plane. 
+# @param out Matrix to write into (see _matOut).
 # @return The matrix.
-def matOrtho(l, r, b, t, n, f):
+def matOrtho(l, r, b, t, n, f, out=None):
 
-    F = np.zeros((4,4), dtype='float32')
+    F = _matOut(out, False)
 
     F[0,0] = 2.0/(r-l)
     F[0,3] = -(r+l)/(r-l)
@@ -255,3 +308,195 @@ def matOrtho(l, r, b, t, n, f):
     F[3,3] = 1.0
 
     return F
+
+## Identity matrices.
+#
+# @param n Number of matrices.
+# @return Contiguous (n,4,4) float32 stack.
+def matIdentityBatch(n):
+    M = np.zeros((n, 4, 4), dtype='float32')
+    M[:, [0, 1, 2, 3], [0, 1, 2, 3]] = 1.0
+
+    return M
+
+## Translation matrices.
+#
+# Parameters are arrays (or scalars) broadcast against each other.
+#
+# @param x Displacements along x-axis.
+# @param y Displacements along y-axis.
+# @param z Displacements along z-axis.
+# @return Contiguous (n,4,4) float32 stack.
+def matTranslateBatch(x, y, z):
+    x, y, z = (a.ravel() for a in np.broadcast_arrays(x, y, z))
+    T = matIdentityBatch(len(x))
+
+    T[:,0,3] = x
+    T[:,1,3] = y
+    T[:,2,3] = z
+
+    return T
+
+## Scale matrices.
+#
+# @param x Scale factors along x-axis.
+# @param y Scale factors along y-axis.
+# @param z Scale factors along z-axis.
+# @return Contiguous (n,4,4) float32 stack.
+def matScaleBatch(x, y, z):
+    x, y, z = (a.ravel() for a in np.broadcast_arrays(x, y, z))
+    T = np.zeros((len(x), 4, 4), dtype='float32')
+
+    T[:,0,0] = x
+    T[:,1,1] = y
+    T[:,2,2] = z
+    T[:,3,3] = 1.0
+
+    return T
+
+## Rotation matrices about one axis.
+#
+# @param angle Rotation angles in radians.
+# @param i, j Rows and columns of the cosines (the other ones keep the identity).
+# @return Contiguous (n,4,4) float32 stack.
+def _matRotateBatch(angle, i, j):
+    angle = np.ravel(angle)
+    R = matIdentityBatch(len(angle))
+
+    acos = np.cos(angle)
+    asin = np.sin(angle)
+
+    R[:,i,i] =  acos
+    R[:,i,j] = -asin
+    R[:,j,i] =  asin
+    R[:,j,j] =  acos
+
+    return R
+
+## X Rotation matrices.
+#
+# @param angle Rotation angles in radians.
+# @return Contiguous (n,4,4) float32 stack.
+def matRotateXBatch(angle):
+    return _matRotateBatch(angle, 1, 2)
+
+## Y Rotation matrices.
+#
+# @param angle Rotation angles in radians.
+# @return Contiguous (n,4,4) float32 stack.
+def matRotateYBatch(angle):
+    return _matRotateBatch(angle, 2, 0)
+
+## Z Rotation matrices.
+#
+# @param angle Rotation angles in radians.
+# @return Contiguous (n,4,4) float32 stack.
+def matRotateZBatch(angle):
+    return _matRotateBatch(angle, 0, 1)
+
+## Compose matrices.
+#
+# Multiplies the matrices in order (the last one is applied first), each
+# being a (4,4) matrix or an (n,4,4) stack. np.matmul broadcasts the (4,4)
+# ones and is several times faster than the same product with np.einsum.
+#
+# @param mats Matrices or stacks.
+# @return Contiguous (n,4,4) float32 stack.
+def matComposeBatch(*mats):
+    M = np.asarray(mats[0], dtype='float32')
+    for A in mats[1:]:
+        M = np.matmul(M, np.asarray(A, dtype='float32'))
+    M = np.ascontiguousarray(M.reshape(-1, 4, 4))
+
+    return M
+
+## Instance data.
+#
+# Matrices laid out as OpenGL reads mat4 vertex attributes (column-major),
+# for a buffer with one matrix per instance (four vec4 attributes with
+# glVertexAttribDivisor 1).
+#
+# @param M (n,4,4) stack.
+# @return Contiguous (n,16) float32 array.
+def matInstanceData(M):
+    return np.ascontiguousarray(np.swapaxes(M, 1, 2), dtype='float32').reshape(-1, 16)
+
+## Determinant, relative to the largest one rows of the same lengths can
+# have, below which the linear part of a matrix is taken as singular.
+SINGULAR_EPSILON = 1e-6
+
+## Cofactors of the linear part of an affine matrix.
+#
+# The columns of the cofactor matrix are cross products of the columns of
+# the 3x3 part, and its determinant is a dot product with them. By
+# Hadamard's inequality the determinant is at most the product of the row
+# lengths; below SINGULAR_EPSILON times that (a zero scale, or rows nearly
+# linearly dependent), it is returned as 0.
+#
+# @param M Affine (4,4) matrix.
+# @return Rows of the cofactor matrix and the determinant, as floats.
+def _cofactors(M):
+    (a00, a01, a02, _), (a10, a11, a12, _), (a20, a21, a22, _) = M[:3].tolist()
+    c00 = a11*a22 - a12*a21
+    c01 = a12*a20 - a10*a22
+    c02 = a10*a21 - a11*a20
+    c10 = a02*a21 - a01*a22
+    c11 = a00*a22 - a02*a20
+    c12 = a01*a20 - a00*a21
+    c20 = a01*a12 - a02*a11
+    c21 = a02*a10 - a00*a12
+    c22 = a00*a11 - a01*a10
+    det = a00*c00 + a01*c01 + a02*c02
+    bound = math.sqrt((a00*a00 + a01*a01 + a02*a02)*(a10*a10 + a11*a11 + a12*a12)*(a20*a20 + a21*a21 + a22*a22))
+    if abs(det) <= SINGULAR_EPSILON*bound:
+        det = 0.0
+    return ((c00, c01, c02), (c10, c11, c12), (c20, c21, c22)), det
+
+## Normal matrix.
+#
+# Transposed inverse of the linear part of a model matrix, which takes
+# normals to world space. Computed once per draw on the CPU, in closed form
+# (cofactors over the determinant), instead of inverse() per vertex in the
+# shader. A singular model matrix has no inverse and gives the identity.
+#
+# @param M Affine (4,4) model matrix.
+# @param out (3,3) float32 matrix to write into.
+# @return The (3,3) matrix.
+def matNormal(M, out=None):
+    (r0, r1, r2), det = _cofactors(M)
+    N = np.empty((3,3), dtype='float32') if out is None else out
+    if det == 0.0:
+        N[...] = _IDENTITY[:3, :3]
+        return N
+
+    N[...] = ((r0[0]/det, r0[1]/det, r0[2]/det),
+              (r1[0]/det, r1[1]/det, r1[2]/det),
+              (r2[0]/det, r2[1]/det, r2[2]/det))
+
+    return N
+
+## Affine inverse.
+#
+# Inverse of a matrix whose last row is (0, 0, 0, 1): the inverse of the
+# linear part (transposed cofactors over the determinant) and the
+# translation taken back through it. A singular matrix gives the identity.
+#
+# @param M Affine (4,4) matrix.
+# @param out Matrix to write into (see _matOut).
+# @return The inverse.
+def matAffineInverse(M, out=None):
+    (r0, r1, r2), det = _cofactors(M)
+    tx, ty, tz = M[:3, 3].tolist()
+    I = _matOut(out)
+    if det == 0.0:
+        return I
+
+    # The inverse of the linear part is the transposed cofactor matrix over det.
+    i00, i01, i02 = r0[0]/det, r1[0]/det, r2[0]/det
+    i10, i11, i12 = r0[1]/det, r1[1]/det, r2[1]/det
+    i20, i21, i22 = r0[2]/det, r1[2]/det, r2[2]/det
+    I[:3] = ((i00, i01, i02, -(i00*tx + i01*ty + i02*tz)),
+             (i10, i11, i12, -(i10*tx + i11*ty + i12*tz)),
+             (i20, i21, i22, -(i20*tx + i21*ty + i22*tz)))
+
+    return I